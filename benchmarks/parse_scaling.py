@@ -0,0 +1,134 @@
+"""J1939DA parse scaling on synthetic workbooks, with pass/fail thresholds.
+
+    python benchmarks/parse_scaling.py [--rows N [N ...]] [--max-us-per-row US] [--max-scaling RATIO]
+                                       [--max-rss-mb MB] [--max-load-ms MS] [--output FILE]
+
+For each size, in SPN rows, a synthetic workbook covering the J1939DA field varieties is written, then parsed
+in a new process so that sizes do not share memory or warm caches. Measured:
+- parse s, us/row: wall time of parse_J1939DA with its cache file.
+- peak RSS MB: of the parsing process, or of a normalization worker process if larger.
+- load ms: what starting with an already parsed J1939DA costs, checking that the cache is up to date
+  and loading LOAD_PGNS PGNs from the store.
+
+Fails, with exit status 1, if a size exceeds a threshold, if us/row of the largest size exceeds that of the
+smallest by more than --max-scaling, or if the parsed PGN and SPN counts do not match the workbook.
+"""
+import argparse
+import json
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import synthetic_J1939DA
+
+ROWS = [10_000, 30_000, 100_000]
+LOAD_PGNS = 20  # configured PGNs loaded from the store on start, spread over the store
+MAX_US_PER_ROW = 1000
+MAX_SCALING = 2.0  # us/row of the largest size / us/row of the smallest
+MAX_RSS_MB = 750
+MAX_LOAD_MS = 250
+
+
+def _peak_rss_mb():
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    max_rss = max(resource.getrusage(who).ru_maxrss for who in (resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN))
+    return round(max_rss / (1_000_000 if sys.platform == 'darwin' else 1000), 1)  # bytes on macOS, KB elsewhere
+
+
+def measure(J1939DA_dir: Path, config: dict) -> dict:
+    """Parse the workbook and load it back, run in a new process per size."""
+    from akrocansim import J1939DA
+    from akrocansim.rules import Rules
+    from akrocansim.specstore import SpecStore
+
+    paths = {'J1939DA_config': config, 'J1939DA_dir': J1939DA_dir, 'J1939DA_store': J1939DA_dir / 'J1939DA.sqlite'}
+    started = time.perf_counter()
+    result = J1939DA.parse_J1939DA(**paths, J1939DA_cache=J1939DA_dir / 'J1939DA_cache.pkl')
+    parse_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    outdated = J1939DA.cache_outdated(**paths, rules=Rules())
+    J1939 = SpecStore(paths['J1939DA_store'])
+    pgns = list(J1939)
+    loaded_spns = sum(len(J1939[pgn]['SPNs']) for pgn in pgns[::max(1, len(pgns) // LOAD_PGNS)][:LOAD_PGNS])
+    load_seconds = time.perf_counter() - started
+    return {'result': result, 'outdated': outdated, 'parse s': round(parse_seconds, 3),
+            'load ms': round(load_seconds * 1000, 1), 'loaded SPNs': loaded_spns, 'peak RSS MB': _peak_rss_mb()}
+
+
+def bench(rows: int) -> dict:
+    n_pgns = rows // len(synthetic_J1939DA._SPN_FORMATS)
+    with tempfile.TemporaryDirectory() as tmp:
+        J1939DA_dir = Path(tmp)
+        started = time.perf_counter()
+        config = synthetic_J1939DA.build_workbook(J1939DA_dir, n_pgns)
+        build_seconds = time.perf_counter() - started
+        rows = config['SPNs_to_parse']['last_row'] - config['SPNs_to_parse']['first_row'] + 1
+        child = subprocess.run([sys.executable, __file__, '--measure', tmp, json.dumps(config)],
+                               capture_output=True, text=True, check=True)
+        measured = json.loads(child.stdout.splitlines()[-1])
+        workbook_MB = (J1939DA_dir / config['filename']).stat().st_size / 1_000_000
+    expected = f'processed {n_pgns} PGNs and {rows} SPNs'
+    if measured['result'] != expected or measured['outdated'] is not None:
+        raise RuntimeError(f"expected '{expected}' and an up to date cache, "
+                           f"got '{measured['result']}', {measured['outdated']}")
+    return {'rows': rows, 'PGNs': n_pgns, 'workbook MB': round(workbook_MB, 1), 'build s': round(build_seconds, 3),
+            'parse s': measured['parse s'], 'us/row': round(measured['parse s'] / rows * 1_000_000, 1),
+            'peak RSS MB': measured['peak RSS MB'], 'load ms': measured['load ms']}
+
+
+def check(results: list[dict], args) -> list[str]:
+    """Threshold failures of the results."""
+    failures = []
+    for result in results:
+        for metric, threshold in (('us/row', args.max_us_per_row), ('peak RSS MB', args.max_rss_mb),
+                                  ('load ms', args.max_load_ms)):
+            if result[metric] is not None and result[metric] > threshold:
+                failures.append(f"{result['rows']} rows: {metric} {result[metric]} > {threshold}")
+    if len(results) > 1:
+        smallest, largest = min(results, key=lambda r: r['rows']), max(results, key=lambda r: r['rows'])
+        scaling = largest['us/row'] / smallest['us/row']
+        if scaling > args.max_scaling:
+            failures.append(f"us/row of {largest['rows']} rows is {scaling:.2f} times that of {smallest['rows']} "
+                            f"rows > {args.max_scaling}")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description='J1939DA parse scaling on synthetic workbooks')
+    parser.add_argument('--rows', type=int, nargs='+', default=ROWS, help='workbook sizes in SPN rows')
+    parser.add_argument('--max-us-per-row', type=float, default=MAX_US_PER_ROW, help='parse time threshold')
+    parser.add_argument('--max-scaling', type=float, default=MAX_SCALING,
+                        help='threshold of us/row of the largest size / us/row of the smallest')
+    parser.add_argument('--max-rss-mb', type=float, default=MAX_RSS_MB, help='peak RSS threshold')
+    parser.add_argument('--max-load-ms', type=float, default=MAX_LOAD_MS, help='load time threshold')
+    parser.add_argument('--output', type=Path, help='results JSON file')
+    parser.add_argument('--measure', nargs=2, help=argparse.SUPPRESS)  # J1939DA dir, config JSON: child process
+    args = parser.parse_args()
+
+    if args.measure is not None:
+        J1939DA_dir, config = args.measure
+        print(json.dumps(measure(Path(J1939DA_dir), json.loads(config))))
+        return
+
+    results = []
+    for rows in args.rows:
+        results.append(bench(rows))
+        print(', '.join(f'{key}: {value}' for key, value in results[-1].items()), flush=True)
+    failures = check(results, args)
+    if args.output is not None:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(json.dumps({'results': results, 'failures': failures}, indent=4), encoding='utf-8')
+    for failure in failures:
+        print(f'FAIL: {failure}')
+    print('FAIL' if failures else 'PASS')
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
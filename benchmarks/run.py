@@ -0,0 +1,250 @@
+"""akrocansim benchmarks on the python-can virtual bus.
+
+    python benchmarks/run.py [--quick] [--output FILE] [--compare FILE]
+
+Cases:
+- transmit: Transmitter sending N synthetic PGNs at a tx rate, counted by a receiver thread on a second
+  virtual bus. Achieved frames/s, period error, jitter percentiles, late/missed deadlines, CPU per frame
+  and memory.
+- modify_pgn_data, set_values: SPN updates per second.
+- signaltools: encode, decode, pack and unpack calls per second.
+- parse_J1939DA: parsing time of a synthetic J1939DA workbook. benchmarks/parse_scaling.py checks parsing of
+  10k to 100k row workbooks against thresholds.
+
+Results are saved as JSON, by default in benchmarks/results, named after the akrocansim version.
+Use --compare with an earlier results file to see the ratio of each metric.
+"""
+import argparse
+import datetime
+import json
+import platform
+import sys
+import tempfile
+import threading
+import time
+import timeit
+import tracemalloc
+from pathlib import Path
+
+import can
+
+import akrocansim
+from akrocansim import signaltools
+from akrocansim.telemetry import JITTER_BINS, histogram_percentiles
+from akrocansim.transmitter import Transmitter, _STATS
+
+import synthetic_J1939DA
+
+RESULTS_DIR = Path(__file__).parent / 'results'
+
+# metrics compared by --compare, and whether higher is better
+METRICS = {
+    'achieved frames/s': True,
+    'period error ms': False,
+    'jitter p50 ms': False,
+    'jitter p99 ms': False,
+    'CPU us/frame': False,
+    'register memory KB': False,
+    'ops/s': True,
+    'rows/s': True,
+}
+
+
+def _max_rss_mb():
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(max_rss / (1_000_000 if sys.platform == 'darwin' else 1000), 1)  # bytes on macOS, KB elsewhere
+
+
+def _count_frames(bus: can.BusABC, counts: list, stop: threading.Event):
+    while not stop.is_set():
+        if bus.recv(0.05) is not None:
+            counts[0] += 1
+
+
+def bench_transmit(n_pgns: int, tx_rate_ms: int, duration: float) -> dict:
+    J1939 = synthetic_J1939DA.J1939_spec(n_pgns)
+    channel = f'akrocansim_bench_{n_pgns}_{tx_rate_ms}'
+    tx_bus = can.Bus(interface='virtual', channel=channel)
+    rx_bus = can.Bus(interface='virtual', channel=channel)
+
+    tracemalloc.start()
+    transmitter = Transmitter(J1939)
+    for pgn, pgn_spec in J1939.items():
+        transmitter.register_tx_PGN(pgn=pgn, priority=pgn_spec['Default Priority'], source_address=0,
+                                    tx_rate_ms=tx_rate_ms)
+    register_memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    received, stop = [0], threading.Event()
+    counter = threading.Thread(target=_count_frames, args=(rx_bus, received, stop))
+    counter.start()
+    transmitter.bus = tx_bus
+
+    cpu_started, started = time.process_time(), time.perf_counter()
+    transmitter.set_tx_mode_continuous()
+    time.sleep(duration)
+    transmitter.set_tx_mode_stop()
+    elapsed, cpu = time.perf_counter() - started, time.process_time() - cpu_started
+
+    time.sleep(0.2)  # let the receiver thread drain the virtual bus
+    stop.set()
+    counter.join()
+    transmitter.shutdown()
+    tx_bus.shutdown()
+    rx_bus.shutdown()
+
+    stats = [signal_spec[_STATS] for signal_spec in transmitter.tx_CAN_IDs.values()]
+    frames_sent = sum(s.frames_sent for s in stats)
+    period_errors = [s.period_sum / s.period_count - tx_rate_ms / 1000 for s in stats if s.period_count]
+    jitter = [sum(s.jitter_histogram[i] for s in stats) for i in range(JITTER_BINS)]
+    jitter_max = max((s.jitter_max for s in stats if s.period_count), default=None)
+    jitter_p50, jitter_p95, jitter_p99 = histogram_percentiles(jitter, (50, 95, 99), jitter_max)
+
+    def ms(value):
+        return None if value is None else round(value * 1000, 3)
+
+    return {
+        'case': 'transmit',
+        'PGNs': n_pgns,
+        'tx rate ms': tx_rate_ms,
+        'nominal frames/s': round(n_pgns * 1000 / tx_rate_ms),
+        'achieved frames/s': round(received[0] / elapsed),
+        'frames sent': frames_sent,
+        'frames received': received[0],
+        'period error ms': ms(sum(period_errors) / len(period_errors)) if period_errors else None,
+        'jitter p50 ms': ms(jitter_p50),
+        'jitter p95 ms': ms(jitter_p95),
+        'jitter p99 ms': ms(jitter_p99),
+        'jitter max ms': ms(jitter_max),
+        'late': sum(s.late for s in stats),
+        'missed': sum(s.missed for s in stats),
+        'CPU us/frame': round(cpu / frames_sent * 1_000_000, 2) if frames_sent else None,
+        'register memory KB': round(register_memory / 1000),
+        'max RSS MB': _max_rss_mb(),
+    }
+
+
+def _ops(case: str, stmt, number: int) -> dict:
+    seconds = min(timeit.repeat(stmt, number=number, repeat=5))
+    return {'case': case, 'ops/s': round(number / seconds), 'us/op': round(seconds / number * 1_000_000, 3)}
+
+
+def bench_updates() -> list[dict]:
+    J1939 = synthetic_J1939DA.J1939_spec(100)
+    transmitter = Transmitter(J1939)
+    for pgn in J1939:
+        transmitter.register_tx_PGN(pgn=pgn, priority=6, source_address=0, tx_rate_ms=1000)
+    pgn = next(iter(J1939))
+    spns = list(J1939[pgn]['SPNs'])
+    whole_pgn = {spn: 1 for spn in spns}
+    results = [
+        _ops('modify_pgn_data', lambda: transmitter.modify_pgn_data(pgn, spns[3], 12000), 20_000),
+        _ops(f'set_values, {len(spns)} SPNs', lambda: transmitter.set_values({pgn: whole_pgn}), 10_000),
+    ]
+    transmitter.shutdown()
+    return results
+
+
+def bench_signaltools() -> list[dict]:
+    spn_spec = synthetic_J1939DA.J1939_spec(1)[synthetic_J1939DA.pgns(1)[0]]['SPNs'][100_004]  # 2 bytes, rpm
+    data = bytearray(8)
+    return [
+        _ops('signaltools.encode', lambda: signaltools.encode(decoded_value=1500.0, scale=0.125, offset=0), 200_000),
+        _ops('signaltools.decode', lambda: signaltools.decode(raw_value=12000, scale=0.125, offset=0), 200_000),
+        _ops('signaltools.pack', lambda: signaltools.pack(data=data, signal_spec=spn_spec, raw_value=12000), 200_000),
+        _ops('signaltools.unpack', lambda: signaltools.unpack(data=data, signal_spec=spn_spec), 200_000),
+    ]
+
+
+def bench_parse_J1939DA(n_pgns: int) -> dict:
+    from akrocansim import J1939DA
+
+    with tempfile.TemporaryDirectory() as tmp:
+        J1939DA_dir = Path(tmp)
+        config = synthetic_J1939DA.build_workbook(J1939DA_dir, n_pgns)
+        rows = config['SPNs_to_parse']['last_row'] - config['SPNs_to_parse']['first_row'] + 1
+        started = time.perf_counter()
+        J1939DA.parse_J1939DA(J1939DA_config=config, J1939DA_dir=J1939DA_dir,
+                              J1939DA_store=J1939DA_dir / 'J1939DA.sqlite')
+        seconds = time.perf_counter() - started
+    return {'case': 'parse_J1939DA', 'PGNs': n_pgns, 'rows': rows, 'seconds': round(seconds, 3),
+            'rows/s': round(rows / seconds)}
+
+
+def _key(result: dict) -> tuple:
+    return tuple((k, v) for k, v in result.items() if k in ('case', 'PGNs', 'tx rate ms'))
+
+
+def compare(results: list[dict], baseline: dict):
+    """Print the ratio current / baseline of each metric of the cases present in both."""
+    baseline_results = {_key(result): result for result in baseline['results']}
+    print(f"\ncompared with akrocansim {baseline['akrocansim']} ({baseline['date']}):")
+    for result in results:
+        old = baseline_results.get(_key(result))
+        if old is None:
+            continue
+        ratios = []
+        for metric, higher_is_better in METRICS.items():
+            if result.get(metric) and old.get(metric):
+                ratio = abs(result[metric] / old[metric])
+                worse = ratio < 0.9 if higher_is_better else ratio > 1.1
+                ratios.append(f"{metric} x{ratio:.2f}{' (worse)' if worse else ''}")
+        print(f"{', '.join(f'{k}: {v}' for k, v in _key(result))} - {', '.join(ratios)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='akrocansim benchmarks on the python-can virtual bus')
+    parser.add_argument('--quick', action='store_true', help='fewer and shorter cases')
+    parser.add_argument('--pgn-counts', type=int, nargs='+', help='transmit: PGN counts to sweep')
+    parser.add_argument('--tx-rates', type=int, nargs='+', help='transmit: tx rates in ms to sweep')
+    parser.add_argument('--duration', type=float, help='transmit: seconds per case')
+    parser.add_argument('--parse-pgn-counts', type=int, nargs='*', help='parse_J1939DA: workbook sizes in PGNs')
+    parser.add_argument('--output', type=Path, help='results JSON file, default: benchmarks/results/<version>_<date>.json')
+    parser.add_argument('--compare', type=Path, help='earlier results JSON file')
+    args = parser.parse_args()
+
+    pgn_counts = args.pgn_counts or ([10, 100, 1000] if args.quick else [10, 100, 1000, 5000])
+    tx_rates = args.tx_rates or ([100] if args.quick else [10, 100])
+    duration = args.duration or (0.5 if args.quick else 3)
+    parse_pgn_counts = args.parse_pgn_counts if args.parse_pgn_counts is not None \
+        else ([100] if args.quick else [100, 1000])
+
+    results = []
+
+    def add(result):
+        results.append(result)
+        print(', '.join(f'{key}: {value}' for key, value in result.items()), flush=True)
+
+    for n_pgns in pgn_counts:
+        for tx_rate_ms in tx_rates:
+            add(bench_transmit(n_pgns, tx_rate_ms, duration))
+    for result in bench_updates() + bench_signaltools():
+        add(result)
+    for n_pgns in parse_pgn_counts:
+        add(bench_parse_J1939DA(n_pgns))
+
+    now = datetime.datetime.now()
+    report = {
+        'akrocansim': akrocansim.__version__,
+        'python-can': can.__version__,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'processor': platform.processor() or platform.machine(),
+        'date': now.isoformat(timespec='seconds'),
+        'results': results,
+    }
+    output = args.output or RESULTS_DIR / f"{akrocansim.__version__}_{now.strftime('%Y%m%d_%H%M%S')}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=4), encoding='utf-8')
+    print(f'\nresults saved: {output}')
+
+    if args.compare is not None:
+        compare(results, json.loads(args.compare.read_text(encoding='utf-8')))
+
+
+if __name__ == '__main__':
+    main()
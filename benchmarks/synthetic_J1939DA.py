@@ -0,0 +1,196 @@
+"""Synthetic J1939 Digital Annex data for benchmarks and tests, as a workbook in the layout of the default
+configuration or as an already parsed J1939 dict.
+
+PGNs cycle through layouts of 8 SPNs each. The first layout has the common fixed position formats, the others
+the varieties of the J1939DA that the parser and the normalization rules handle: fractional, ASCII, binary and
+bit-mapped resolutions, 4 byte SPNs, positions spanning bytes, variable length PGNs with lettered positions,
+operational ranges, comma separated thousands and long transmission rate texts."""
+import tomllib
+from pathlib import Path
+
+from akrocansim.config import default_config_toml
+
+# (SPN Position in PGN, SPN Length, Resolution, Offset, Data Range, Operational Range, Units), 8 bytes per layout
+_SPN_FORMATS = [
+    ('1.1', '4 bits', '16 states/4 bit', '0', '0 to 15', None, 'bit'),
+    ('1.5', '4 bits', '1 count/bit', '0', '0 to 15', None, 'count'),
+    ('2', '1 byte', '1 %/bit', '-125 %', '-125 to 125 %', None, '%'),
+    ('3-4', '2 bytes', '0.125 rpm/bit', '0 rpm', '0 to 8,031.875 rpm', None, 'rpm'),
+    ('5', '1 byte', '0.4 %/bit', '0 %', '0 to 100 %', None, '%'),
+    ('6-7', '2 bytes', '0.03125 deg C/bit', '-273 deg C', '-273 to 1,734.96875 deg C', None, 'deg C'),
+    ('8.1', '2 bits', '4 states/2 bit', '0', '0 to 3', None, 'bit'),
+    ('8.3', '6 bits', '1 count/bit', '0', '0 to 63', None, 'count'),
+]
+_VARIED_LAYOUTS = [
+    [
+        ('1-2', '2 bytes', '1/256 km/h per bit', '0 km/h', '0 to 250.996 km/h', '0 to 250 km/h', 'km/h'),
+        ('3.1', '2 bits', '4 states/2 bit', '0', '0 to 3', None, 'bit'),
+        ('3.3', '6 bits', 'bit-mapped', '0', 'bit-mapped', None, 'bit-mapped'),
+        ('4-7', '4 bytes', '0.125 km/bit', '0 km', '0 to 526,385,151.9 km', None, 'km'),
+        ('8.1', '1 bit', '2 states/1 bit', '0', '0 to 1', None, 'bit'),
+        ('8.2', '1 bit', '2 states/1 bit', '0', '0 to 1', None, 'bit'),
+        ('8.3', '2 bits', 'Binary', '0', '0 to 3', None, 'binary'),
+        ('8.5', '4 bits', '1 count/bit', '0', '0 to 15', '0 to 7 and 15 exclusively', 'count'),
+    ],
+    [
+        ('1', '1 byte', '1 %/bit', '-125 %', '-125 to 125 %',
+         '0 to 125% engine torque requests, -125% to 0% for retarder torque requests', '%'),
+        ('2.1', '3 bits', '8 states/3 bit', '0', '0 to 7', None, 'bit'),
+        ('2.4-4', '21 bits', '1 count/bit', '0', '0 to 2,097,151', None, 'count'),
+        ('5-6', '2 bytes', '1 Nm/bit', '-32,000 Nm', '-32,000 to 32,255 Nm', '-10,000 to 10,000 Nm', 'Nm'),
+        ('7.1', '6 bits', '1 count/bit', '0', '0 to 63', None, 'count'),
+        ('7.7-8.1', '3 bits', '8 states/3 bit', '0', '0 to 7', None, 'bit'),
+        ('8.2', '3 bits', '0.5 V/bit', '0 V', '0 to 3.5 V', None, 'V'),
+        ('8.5', '4 bits', '16 states/4 bit', '0', '0 to 15', None, 'bit'),
+    ],
+    [  # variable length
+        ('1', '1 byte', '1 count/bit', '0', '0 to 250', '1-4', 'count'),
+        ('2-N', 'Variable', 'ASCII', '0', '0 to 255 per byte', None, 'ASCII'),
+        ('a', 'Variable - up to 5 bytes followed by an "*" delimiter', 'ASCII', '0', '0 to 255 per byte', None,
+         'ASCII'),
+        ('b', 'Variable - up to 200 bytes followed by an "*" delimiter', 'ASCII', '0', '0 to 255 per byte', None,
+         'ASCII'),
+        ('c', 'Variable - up to 200 bytes followed by an "*" delimiter', 'ASCII', '0', '0 to 255 per byte', None,
+         'ASCII'),
+        ('d', 'Variable - up to 200 bytes followed by an "*" delimiter', 'ASCII', '0', '0 to 255 per byte', None,
+         'ASCII'),
+        ('e', '4 bytes', '1 s/bit', '0 s', '0 to 4,211,081,215 s', None, 's'),
+        ('f', '2 bytes', '0.05 L/bit', '0 L', '0 to 3,212.75 L', None, 'L'),
+    ],
+]
+_LAYOUTS = [_SPN_FORMATS] + _VARIED_LAYOUTS
+_TX_RATES = ['10 ms', '20 ms', '50 ms', '100 ms', '1 s']
+_VARIED_TX_RATES = _TX_RATES + [
+    '250 ms', 'On request', 'Engine speed dependent', 'Every 100 ms and on change but no faster than 20 ms',
+    'Every 10 s and on change of state, but not faster than every 1 s.', 'As required but no faster than once every 100 ms.',
+]
+_DISCRETE_LABELS = ['Off', 'On', 'Error', 'Not available']
+_DESCRIPTION = ('Synthetic parameter {}, of the length and wording of a J1939DA description. '
+                'The value is transmitted by the controller that measures it, '
+                'and is set to not available by controllers that do not support it.')
+
+# PDU2 (broadcast) PGNs of the four data pages, 4096 per page
+_PDU2_PAGES = (0x0F000, 0x1F000, 0x2F000, 0x3F000)
+MAX_PGNS = 4 * 4096
+
+
+def pgns(n_pgns: int) -> list[int]:
+    if n_pgns > MAX_PGNS:
+        raise ValueError(f'at most {MAX_PGNS} synthetic PGNs')
+    return [_PDU2_PAGES[i // 4096] + i % 4096 for i in range(n_pgns)]
+
+
+def _discrete_description(length: str) -> str:
+    """Value per line as in the J1939DA, e.g. '01 = On', the last value being not available."""
+    n_bits = int(length.split(' ')[0])
+    values = [(value, _DISCRETE_LABELS[value]) for value in range(min(2 ** n_bits, 4) - 1)]
+    values.append((2 ** n_bits - 1, _DISCRETE_LABELS[-1]))
+    return '_x000D_\n'.join(f'{value:0{n_bits}b} = {label}' for value, label in values)
+
+
+def spn_rows(n_pgns: int, spns_per_pgn: int = len(_SPN_FORMATS), varied: bool = False):
+    """Rows of the SPNs & PGNs sheet as {column name: value}, one per SPN.
+    varied: PGNs cycle through all layouts and transmission rate texts rather than the first layout only."""
+    layouts = _LAYOUTS if varied else [_SPN_FORMATS]
+    tx_rates = _VARIED_TX_RATES if varied else _TX_RATES
+    spn = 100_000
+    for i, pgn in enumerate(pgns(n_pgns)):
+        layout = layouts[i % len(layouts)]
+        data_length = 'Variable' if layout is _VARIED_LAYOUTS[-1] else 8
+        for j in range(spns_per_pgn):
+            position, length, resolution, offset, data_range, operational_range, units = layout[j % len(layout)]
+            spn += 1
+            yield {
+                'PGN': pgn,
+                'Parameter Group Label': f'Synthetic PG {i}',
+                'Acronym': f'SYN{i}',
+                'PGN Description': f'Synthetic parameter group {i}',
+                'PGN Data Length': data_length,
+                'Default Priority': 6,
+                'Transmission Rate': tx_rates[i % len(tx_rates)],
+                'SPN': spn,
+                'SPN Name': f'Synthetic SPN {spn}',
+                'SPN Description': (_discrete_description(length) if units in ('bit', 'bit-mapped')
+                                    else _DESCRIPTION.format(spn)),
+                'SPN Position in PGN': position,
+                'SPN Length': length,
+                'Resolution': resolution,
+                'Offset': offset,
+                'Data Range': data_range,
+                'Operational Range': operational_range,
+                'Units': units,
+            }
+
+
+def J1939DA_config() -> dict:
+    """[J1939DA] table of the default configuration, for a workbook built by build_workbook()."""
+    config = tomllib.loads(default_config_toml)['J1939DA']
+    return config | {'filename': 'J1939DA_SYNTHETIC.xlsx',
+                     'SPNs_to_parse': config['SPNs_to_parse'] | {'last_row': None}}
+
+
+def build_workbook(J1939DA_dir: Path, n_pgns: int, spns_per_pgn: int = len(_SPN_FORMATS),
+                   varied: bool = True) -> dict:
+    """Write a synthetic J1939DA workbook of n_pgns * spns_per_pgn SPN rows to J1939DA_dir.
+    Returns the matching [J1939DA] configuration table."""
+    from openpyxl import Workbook
+    from openpyxl.utils import column_index_from_string
+
+    config = J1939DA_config()
+    columns = {name: column_index_from_string(column) - 1
+               for name, column in config['SPNs_and_PGNs_sheet_columns'].items()}
+    width = max(columns.values()) + 1
+    first_row = config['SPNs_to_parse']['first_row']
+
+    # write-only: rows are streamed to the file, so 100k rows take little memory
+    wb = Workbook(write_only=True)
+    sheet = wb.create_sheet(config['SPNs_and_PGNs_sheet'])
+    for _ in range(first_row - 2):
+        sheet.append([])
+    header = [None] * width
+    for name, column in columns.items():
+        header[column] = name
+    sheet.append(header)
+    n = first_row - 1
+    for n, row in enumerate(spn_rows(n_pgns, spns_per_pgn, varied), start=first_row):
+        values = [None] * width
+        for name, value in row.items():
+            values[columns[name]] = value
+        sheet.append(values)
+    J1939DA_dir.mkdir(parents=True, exist_ok=True)
+    wb.save(J1939DA_dir / config['filename'])
+    config['SPNs_to_parse']['last_row'] = n
+    return config
+
+
+def J1939_spec(n_pgns: int, spns_per_pgn: int = len(_SPN_FORMATS)) -> dict:
+    """Parsed J1939 dict of the synthetic PGNs of the first layout, without going through a workbook."""
+    from akrocansim import J1939DA
+    from akrocansim.rules import Rules
+
+    rules = Rules()
+    J1939 = {}
+    for row in spn_rows(n_pgns, spns_per_pgn):
+        pgn_spec = J1939.setdefault(row['PGN'], {
+            'Parameter Group Label': row['Parameter Group Label'],
+            'Acronym': row['Acronym'],
+            'PGN Data Length': row['PGN Data Length'],
+            'Default Priority': row['Default Priority'],
+            'transmission_rate_ms': rules.normalize('Transmission Rate', row['Transmission Rate']),
+            'SPNs': {}
+        })
+        start_byte, start_bit = rules.normalize('SPN Position in PGN', row['SPN Position in PGN'])
+        scale = J1939DA._map_resolution(row['Resolution'])
+        min_value, max_value = J1939DA._map_data_range(row['Data Range'])
+        pgn_spec['SPNs'][row['SPN']] = {
+            'SPN Name': row['SPN Name'],
+            'start_byte': start_byte,
+            'start_bit': start_bit,
+            'length_bits': J1939DA._map_spn_length(row['SPN Length']),
+            'scale': scale,
+            'offset': J1939DA._map_offset(row['Offset']),
+            'min_value': min_value,
+            'max_value': max_value,
+            'unit': J1939DA._map_units(row['Units']),
+        }
+    return J1939
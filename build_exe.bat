@@ -2,5 +2,6 @@ pyinstaller src\akrocansim_main.py ^
             --onefile --noconsole ^
             --add-data="src/akrocansim/resources/akrocansim.ico:akrocansim/resources" ^
             --add-data="src/akrocansim/resources/akrocansim_logo_dark.png:akrocansim/resources" ^
+            --add-data="src/akrocansim/resources/J1939DA_rules.toml:akrocansim/resources" ^
             --icon src/akrocansim/resources/akrocansim.ico ^
             --name akrocansim
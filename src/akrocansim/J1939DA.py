@@ -3,297 +3,26 @@
 # spn for lat, long max,scale problem
 # all bit mapped SPNs need GUI support
 # resolution: 8 bit bit-mapped
+import hashlib
+import multiprocessing
+import os
 import pickle
 import json
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from openpyxl import load_workbook
+
+from . import specstore
+from .rules import Rules
+from .__init__ import __version__
 
 
 bit_mapped_spns = [3344, 3345, 3346, 3347, 3348]
 ignore_discrete_value_spns = [4180, 4181, 7750, 7757]
 
 
-def _map_transmission_rate(rate):
-    if rate is None:
-        tx_rate_ms = None
-    else:
-        match rate:
-            case 'To engine: Control Purpose dependent or 10 ms_x000D_\nTo retarder: 50 ms':
-                tx_rate_ms = 50
-            case 'When active; 50 ms to transmission and axles':
-                tx_rate_ms = 50
-            case 'When active: 20 ms; else 200 ms':
-                tx_rate_ms = 20
-            case '100 ms':
-                tx_rate_ms = 100
-            case 'Manufacturer defined, not faster than 20 ms':
-                tx_rate_ms = 50
-            case 'Every 100 ms and on change but no faster than 20 ms':
-                tx_rate_ms = 100
-            case 'Every 50ms and if SPN 5681 \"Driver activation demand for Advanced Emergency Braking System\" has changed but no faster than every 10 ms':
-                tx_rate_ms = 50
-            case '50 ms':
-                tx_rate_ms = 50
-            case '20 ms':
-                tx_rate_ms = 20
-            case 'Every 100 ms and on change of state but no faster than every 10 ms.':
-                tx_rate_ms = 100
-            case 'Engine speed dependent':
-                tx_rate_ms = 50
-            case '200 ms':
-                tx_rate_ms = 200
-            case 'As required':
-                tx_rate_ms = 5000
-            case '1 s':
-                tx_rate_ms = 1000
-            case 'Every 10 s and on change but no faster than 100 ms.':
-                tx_rate_ms = 10000
-            case 'On request':
-                tx_rate_ms = 5000
-            case 'Every 1 s and on change but no faster than 100 ms':
-                tx_rate_ms = 1000
-            case 'Every 1 s and on change of state but no faster than every 100 ms.':
-                tx_rate_ms = 1000
-            case 'As needed':
-                tx_rate_ms = 5000
-            case 'As required but no faster than once every 100 ms.':
-                tx_rate_ms = 5000
-            case 'Every 10 s and on change but no faster than 1 s.':
-                tx_rate_ms = 10000
-            case 'On powerup and on request':
-                tx_rate_ms = 5000
-            case 'As required but no more often than 500 ms':
-                tx_rate_ms = 5000
-            case 'Every 10 s and on change of state, but not faster than 1 s.  Every second when in tuning mode.':
-                tx_rate_ms = 10000
-            case 'Every 10 s and on change of state, but not faster than every 1 s.':
-                tx_rate_ms = 10000
-            case 'manufacturer defined, not faster than 100 ms':
-                tx_rate_ms = 5000
-            case 'Manufacturer defined, not faster than 100 ms':
-                tx_rate_ms = 5000
-            case 'On event':
-                tx_rate_ms = 5000
-            case '5 s':
-                tx_rate_ms = 5000
-            case 'Every 5 s and on change of state but no faster than every 100 ms':
-                tx_rate_ms = 5000
-            case '100 ms when active':
-                tx_rate_ms = 100
-            case 'This message is transmitted in response to an Anti-Theft Request message. This message is also sent when the component has an abnormal power interruption.  In this situation the Anti-Theft Status Report is sent without the Anti-Theft Request.':
-                tx_rate_ms = 5000
-            case 'Transmission of this message is interrupt driven.  This message is also transmitted upon power-up of the interfacing device sending this message.':
-                tx_rate_ms = 5000
-            case 'When needed':
-                tx_rate_ms = 5000
-            case '10 ms':
-                tx_rate_ms = 10
-            case '50 ms (preferred) or Engine Speed Dependent (if required by application)':
-                tx_rate_ms = 50
-            case '500 ms':
-                tx_rate_ms = 500
-            case '50 ms (only when active)':
-                tx_rate_ms = 50
-            case '20 ms when torque converter unlocked, 100 ms when torque converter locked':
-                tx_rate_ms = 20
-            case 'Engine speed dependent when there is no combustion, once every 5 s otherwise.':
-                tx_rate_ms = 50
-            case 'Engine speed dependent when knock present, once every 5 s otherwise.':
-                tx_rate_ms = 50
-            case 'Transmitted only after requested.  After request, broadcast rate is engine speed dependent.  Update stopped after key switch cycle.':
-                tx_rate_ms = 50
-            case 'Transmitted every 20 ms for the first 100 ms and then broadcast every 1 s for 10 s in case of a crash event':
-                tx_rate_ms = 20
-            case '10 ms (default) or 20 ms':
-                tx_rate_ms = 10
-            case 'Every 50ms and on change of \"AEBS state\" or change of \"Collision warning level\" but no faster than every 10 ms':
-                tx_rate_ms = 50
-            case '100 ms or on change, but no faster than 20 ms.':
-                tx_rate_ms = 100
-            case 'Engine Speed Dependent when active, otherwise every 1 s.':
-                tx_rate_ms = 50
-            case 'Engine Speed Dependent':
-                tx_rate_ms = 50
-            case 'Default broadcast rate of 20 ms unless the sending device has received Engine Start Control Message Rate (SPN 7752) from the engine start arbitrator indicating a switch to 250 ms or on change, but no faster than 20 ms.':
-                tx_rate_ms = 20
-            case 'Default broadcast rate of 20 ms unless the arbitrator is transmitting Engine Start Control Message Rate (SPN 7752) indicating a switch to 250 ms or on change, but no faster than 20 ms.':
-                tx_rate_ms = 20
-            case '10 sec':
-                tx_rate_ms = 10000
-            case '30 sec':
-                tx_rate_ms = 30000
-            case '250 ms (preferred) or Engine Speed Dependent (if required by application)':
-                tx_rate_ms = 250
-            case 'Every 1 s and on change of any parameter but no faster than 100 ms.':
-                tx_rate_ms = 1000
-            case 'Every 1s and on change in any door command but no faster than 100 ms':
-                tx_rate_ms = 1000
-            case 'Every 1s and on change in any door latch status but no faster than 100 ms':
-                tx_rate_ms = 1000
-            case '10 s':
-                tx_rate_ms = 10000
-            case '250 ms':
-                tx_rate_ms = 250
-            case 'Transmitted only after requested.  After request, broadcast rate is 1 s.  Update stopped after key switch cycle.':
-                tx_rate_ms = 1000
-            case 'Every 10 s and on change, but no faster than 1 s.':
-                tx_rate_ms = 10000
-            case 'Every 500 ms and on change but no faster than 50 ms.':
-                tx_rate_ms = 500
-            case 'Every 500 ms and on change but no faster than 20 ms':
-                tx_rate_ms = 500
-            case '1 s and on change of any switched power output status but no faster than once every 25 ms.':
-                tx_rate_ms = 1000
-            case '1 s and on change of any fused power output status but no faster than once every 25 ms.':
-                tx_rate_ms = 1000
-            case '1 s_x000D_\n_x000D_\nNote: Systems developed to the standard published before June, 2014 might not be transmitted at a 1 s rate, but be transmitted on request.':
-                tx_rate_ms = 1000
-            case '1 s._x000D_\n_x000D_\nNote: Systems developed to the standard published before June, 2015 might not be transmitted at a 1 s rate, but be transmitted on request.':
-                tx_rate_ms = 1000
-            case '30 s':
-                tx_rate_ms = 30000
-            case 'Every 5 s and on change of torque/speed points of more than 10% since last transmission but no faster than every 500 ms':
-                tx_rate_ms = 5000
-            case 'Every 1 s and on change of state but no faster than every 100 ms':
-                tx_rate_ms = 1000
-            case 'On start-up, and every 1 s until the dewpoint signal state = 1 (SPN 3240) has been received by the transmitter':
-                tx_rate_ms = 1000
-            case 'On start-up, and every 1 s until the dewpoint signal state = 1 (SPN 3239) has been received by the transmitter':
-                tx_rate_ms = 1000
-            case 'On start-up, and every 1 s until the dewpoint signal state = 1 (SPN 3238) has been received by the transmitter':
-                tx_rate_ms = 1000
-            case 'On start-up, and every 1 s until the dewpoint signal state = 1 (SPN 3237) has been received by the transmitter':
-                tx_rate_ms = 1000
-            case 'Transmitted every 5 s and on change of PGN 64791 but no faster than every 250 ms':
-                tx_rate_ms = 5000
-            case 'Every 100 ms and on change of state, but no faster than every 20 ms.  Grandfathered definition for systems that implemented this message prior to July, 2010: Every 100 ms or on change of state, but no faster than every 20 ms':
-                tx_rate_ms = 100
-            case 'Every 100 ms and on change of state, but no faster than every 20 ms. Grandfathered definition for systems that implemented this message prior to July, 2010: Every 100 ms or on change of state, but no faster than every 20 ms':
-                tx_rate_ms = 100
-            case 'On request.  Upon request, will be broadcast as many times as required to transmit all available axle groups.':
-                tx_rate_ms = 5000
-            case 'As needed.  Broadcast whenever an axle group equipped with an on-board scale joined or left the on-board scale subset.':
-                tx_rate_ms = 5000
-            case 'Every 1 s while active and on change of state but no faster than every 100 ms.  Grandfathered definition for systems that implemented this message prior to July, 2010:  1 s when active and on change of state':
-                tx_rate_ms = 1000
-            case 'Every 1 s and on change of state but no faster than every 100 ms.  Grandfathered definition for systems that implemented this message prior to July, 2010:  1 s and on change':
-                tx_rate_ms = 1000
-            case 'Every 1 s and on change of state but no faster than every 100 ms.  Grandfathered definition for systems that implemented this message prior to July, 2010:  1 s or on change':
-                tx_rate_ms = 1000
-            case '250 ms or on change of any state-based parameter but no faster than 20 ms':
-                tx_rate_ms = 250
-            case '100 ms (preferred) or Engine Speed Dependent (if required by application)':
-                tx_rate_ms = 100
-            case 'On Request':
-                tx_rate_ms = 5000
-            case '0.5 s':
-                tx_rate_ms = 500
-            case 'Every 1 s and on change of switch state but no faster than every 100 ms':
-                tx_rate_ms = 1000
-            case 'Every 10 s and on change of state but no faster than every 100 ms.  Grandfathered definition for systems that implemented this message prior to July, 2010: On change or every 10 s':
-                tx_rate_ms = 10000
-            case 'Every 100 ms and on change of state but no faster than every 20 ms.  Grandfathered definition for systems that implemented this message prior to July, 2010: 100 ms or on change, not to exceed 20 ms':
-                tx_rate_ms = 100
-            case '1 s or on change of state-based parameters but no faster than 100 ms.':
-                tx_rate_ms = 1000
-            case '1 s, when active':
-                tx_rate_ms = 1000
-            case 'As requested.':
-                tx_rate_ms = 5000
-            case 'On request or sender may transmit every 5 s until acknowledged by reception of the engine configuration message PGN 65251 SPN 7828.':
-                tx_rate_ms = 5000
-            case '500 ms or upon state change, but not faster than 100 ms.':
-                tx_rate_ms = 500
-            case '100ms':
-                tx_rate_ms = 100
-            case '100 ms_x000D_\n_x000D_\nNote: Systems developed to the standard published before January, 2015 transmit at a 1s rate.':
-                tx_rate_ms = 100
-            case '100ms or upon state change, but not faster than 20 ms.':
-                tx_rate_ms = 100
-            case '1s':
-                tx_rate_ms = 1000
-            case 'Every 1 s and on change of state but no faster than every 100 ms._x000D_\n_x000D_\nGrandfathered definition for systems that implemented this message prior to July, 2010: 1 s when active; or on change of state':
-                tx_rate_ms = 1000
-            case '1 s_x000D_\n_x000D_\nNote: Systems developed to the standard published before June, 2015 might not be transmitted at a 1 s rate, but be transmitted on request.':
-                tx_rate_ms = 1000
-            case '1 s_x000D_\n_x000D_\nNote: Systems developed to the standard published before SEP2015 transmit at a 5s rate.':
-                tx_rate_ms = 5000
-            case '10 s or on change but no more often than 1s':
-                tx_rate_ms = 1000
-            case _:
-                tx_rate_ms = None
-    return tx_rate_ms
-
-def _map_spn_position(pos):
-    if pos is None:
-        start_byte = None
-        start_bit = None
-    else:
-        match pos, len(pos), len(pos.split('.')), len(pos.split('-')):
-            case [char, 1, 1, 1] if char.isalpha():
-                start_byte = None
-                start_bit = None
-            case ['1-2.1', _, _, _]:
-                start_byte = 0
-                start_bit = 0
-            case ['1.7-2' | '1.7-2.1', _, _, _]:
-                start_byte = 0
-                start_bit = 7
-            case ['2.4-4', _, _, _]:
-                start_byte = 1
-                start_bit = 3
-            case ['2.8-3.1', _, _, _]:
-                start_byte = 1
-                start_bit = 7
-            case ['3.7-4', _, _, _]:
-                start_byte = 2
-                start_bit = 6
-            case ['4.7-5.1', _, _, _]:
-                start_byte = 3
-                start_bit = 6
-            case ['5.7-6', _, _, _]:
-                start_byte = 4
-                start_bit = 6
-            case ['5.8-6.1', _, _, _]:
-                start_byte = 4
-                start_bit = 7
-            case ['6,7.1', _, _, _]:
-                start_byte = 5
-                start_bit = 0
-            case ['7.6-8.1', _, _, _]:
-                start_byte = 6
-                start_bit = 5
-            case ['7.7-8.1', _, _, _]:
-                start_byte = 6
-                start_bit = 6
-            case ['1-N', _, _, _]:
-                start_byte = 0
-                start_bit = 0
-            case ['2-n' | '2-N' | '2 to n', _, _, _]:
-                start_byte = 1
-                start_bit = 0
-            case ['4 to n', _, _, _]:
-                start_byte = 3
-                start_bit = 0
-            case ['5 to A', _, _, _]:
-                start_byte = 4
-                start_bit = 0
-            case [_, 1 | 2, 1, 1]:
-                start_byte = int(pos) - 1
-                start_bit = 0
-            case [_, 3 | 4, 2, 1]:
-                start_byte, start_bit = pos.split('.')
-                start_byte = int(start_byte) - 1
-                start_bit = int(start_bit) - 1
-            case [_, 3 | 4 | 5 | 7, 1, 2]:
-                start_byte, start_bit = pos.split('-')
-                start_byte = int(start_byte) - 1
-                start_bit = 0
-            case _:
-                start_byte = None
-                start_bit = None
-    return start_byte, start_bit
-
 def _map_spn_length(length):
     if length is None:
         length_bits = None
@@ -372,80 +101,6 @@ def _map_data_range(data_range):
                 max_value = None
     return min_value, max_value
 
-def _map_operational_range(op_range):
-    operational_min_value = None
-    operational_max_value = None
-    if op_range is not None:
-        match op_range:
-            case '0 to 125% engine torque requests, -125% to 0% for retarder torque requests':
-                operational_min_value = -125
-                operational_max_value = 125
-            case '0 to 7 and 15 exclusively':
-                operational_min_value = 0
-                operational_max_value = 15
-            case '0 is used to indicate that a maximum vehicle speed is not selected.  1 through 7 are valid selectable speed limits. 8 through 250 are not allowed.':
-                operational_min_value = 0
-                operational_max_value = 7
-            case '-125 to +125, negative values are reverse gears, positive values are forward gears, zero is neutral. 251 (0xFB) is park.':
-                operational_min_value = -125
-                operational_max_value = 251
-            case '0 to 250 km/h.  251 (0xFB) is used to indicate that a maximum vehicle speed limit is not selected.':
-                operational_min_value = 0
-                operational_max_value = 251
-            case '0xFF = no vehicle detected':
-                operational_min_value = 0
-                operational_max_value = 255
-            case '–3200 to +3200 mm, negative values are below setpoint, positive values are above setpoint, zero is on grade.':
-                operational_min_value = -3200
-                operational_max_value = 3200
-            case '0 to 200%, 0 to 99% indicates target is left of center, 101 to 200% indicates  target is right of center, 100% indicates target is centered, 0xFF indicates previous pass mode and thus no horizontal deviation':
-                operational_min_value = 0
-                operational_max_value = 255
-            case '1-4':
-                operational_min_value = 1
-                operational_max_value = 4
-            case '(upper byte resolution = 32 rpm/bit)':
-                operational_min_value = 0
-                operational_max_value = None
-            case '0: continuous control,1 On/Off control, 2 to 250: Number of steps':
-                operational_min_value = 0
-                operational_max_value = 250
-            case '0 to 25 sec, 0 = no override of high idle allowed, 255 = not applicable (no time restriction)':
-                operational_min_value = 0
-                operational_max_value = 255
-            case '-200 deg (DECENT) to +301.992 deg (ASCENT)':
-                operational_min_value = -200
-                operational_max_value = 301.992
-            case '-210 deg (SOUTH) to +211.1081215 deg (NORTH)':
-                operational_min_value = -210
-                operational_max_value = 211.1081215
-            case '-210 deg (WEST) to +211.1081215 deg (EAST)':
-                operational_min_value = 210
-                operational_max_value = 211.1081215
-            case 'Up to 63 Characters':
-                operational_min_value = None
-                operational_max_value = None
-            case '0.1 s to 25 s':
-                operational_min_value = 1
-                operational_max_value = 25
-            case '-209.7152m to 209.7152m':
-                operational_min_value = -209.7152
-                operational_max_value = 209.7152
-            case _:
-                opr = op_range.replace(' %', '')
-                opr = opr.replace('%', '')
-                opr = opr.replace(',', '')
-                min, _, max, *_ = opr.split(' ')
-                try:
-                    operational_min_value = int(min)
-                except ValueError:
-                    operational_min_value = float(min)
-                try:
-                    operational_max_value = int(max)
-                except ValueError:
-                    operational_max_value = float(max)
-    return operational_min_value, operational_max_value
-
 def _map_units(unit):
     _unit = None
     if unit is not None:
@@ -503,12 +158,187 @@ def _parse_discrete_value_label(spn, spn_description):
 
     return value_label_dict
 
-def parse_J1939DA(*, J1939DA_config: dict, J1939DA_dir: Path, J1939DA_pickle: Path) -> str:
+def _map_discrete_values(spn_and_description):
+    return _parse_discrete_value_label(*spn_and_description)
+
+
+# Normalization of the raw SPN fields: pure functions of the cell values, which the J1939DA repeats many times
+_FIELD_NORMALIZERS = {
+    'SPN Length': _map_spn_length,
+    'Resolution': _map_resolution,
+    'Offset': _map_offset,
+    'Data Range': _map_data_range,
+    'Units': _map_units,
+}
+_RULE_FIELDS = ('SPN Position in PGN', 'Operational Range')  # normalized by the rules, see rules.py
+_DISCRETE_VALUES = 'discrete_values'  # (SPN, SPN Description) of bit and bit-mapped SPNs
+_NORMALIZERS = _FIELD_NORMALIZERS | {_DISCRETE_VALUES: _map_discrete_values}
+NORMALIZE_CHUNK_SIZE = 1000
+NORMALIZE_MIN_PARALLEL = 10_000  # fewer distinct values are normalized in this process, faster than starting a pool
+
+
+def _normalize_chunk(chunk: list, rules: Rules) -> list:
+    """Normalized values of (normalizer, raw value) pairs, run in the worker processes."""
+    return [rules.normalize(normalizer, raw_value) if normalizer in _RULE_FIELDS
+            else _NORMALIZERS[normalizer](raw_value) for normalizer, raw_value in chunk]
+
+
+def _normalize(J1939: dict, rules: Rules, workers: int = None, known: dict = None) -> dict:
+    """{(normalizer, type of raw value, raw value): normalized value} of the distinct raw values of the SPNs of J1939,
+    typed since e.g. 0 and 0.0 are equal but may be normalized differently.
+    Values in known, e.g. from the cache of a previous parse, are not normalized again.
+    Many distinct values are normalized in chunks across a pool of worker processes (default: one per CPU).
+    Results are merged in the order of the values, so the outcome does not depend on the workers."""
+    known = known or {}
+    keys = {}  # ordered set
+    for pgn_spec in J1939.values():
+        for spn, spn_spec in pgn_spec['SPNs'].items():
+            for field in (*_FIELD_NORMALIZERS, *_RULE_FIELDS):
+                keys[(field, type(spn_spec[field]), spn_spec[field])] = None
+            if spn_spec['Units'] in ['bit', 'bit-mapped'] and spn not in ignore_discrete_value_spns:
+                keys[(_DISCRETE_VALUES, tuple, (spn, spn_spec['SPN Description']))] = None
+    normalized = {key: known[key] for key in keys if key in known}
+    keys = [key for key in keys if key not in normalized]
+    pairs = [(normalizer, raw_value) for normalizer, _, raw_value in keys]
+
+    if workers is None:
+        workers = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count() or 1
+    if workers == 1 or len(pairs) < NORMALIZE_MIN_PARALLEL:
+        return normalized | dict(zip(keys, _normalize_chunk(pairs, rules)))
+    chunks = [pairs[i:i + NORMALIZE_CHUNK_SIZE] for i in range(0, len(pairs), NORMALIZE_CHUNK_SIZE)]
+    # spawn rather than fork: the GUI process has threads
+    with ProcessPoolExecutor(max_workers=min(workers, len(chunks)),
+                             mp_context=multiprocessing.get_context('spawn')) as executor:
+        results = [value for chunk_values in executor.map(_normalize_chunk, chunks, [rules] * len(chunks))
+                   for value in chunk_values]
+    return normalized | dict(zip(keys, results))
+
+
+def _sheet_rows(sheet, first_row: int, last_row: int, max_col: int):
+    """Value tuples of the rows first_row to last_row of a read-only worksheet, in a single pass.
+    Rows missing from the sheet, including those after its last row, are given as rows of None."""
+    n = first_row - 1
+    for n, row in enumerate(sheet.iter_rows(min_row=first_row, max_row=last_row, max_col=max_col,
+                                            values_only=True), start=first_row):
+        yield row
+    empty_row = (None,) * max_col
+    for _ in range(n + 1, last_row + 1):
+        yield empty_row
+
+
+class InspectionExport:
+    """Background writing of the files for inspecting parsing correctness, next to the workbook: the parsed
+    definitions and the mapping of each raw field value to its parsed value, as JSON Lines of [key, value].
+    Each file is streamed one line at a time. Progress messages are queued in messages, e.g. for the GUI log."""
+    def __init__(self):
+        self.messages = deque()
+        self.files = []  # paths of the files written
+        self._thread = None
+
+    def start(self, base_path: Path, contents: dict):
+        """contents: {filename suffix: dict}, written to <base_path><suffix>.jsonl"""
+        self._thread = threading.Thread(target=self._run, args=(base_path, contents), name='akrocansim-inspection')
+        self._thread.start()  # not a daemon, the files are completed before the interpreter exits
+
+    def join(self, timeout: float = None) -> bool:
+        """True once all files have been written."""
+        if self._thread is not None:
+            self._thread.join(timeout)
+        return self.done
+
+    @property
+    def done(self) -> bool:
+        return self._thread is not None and not self._thread.is_alive()
+
+    def _run(self, base_path: Path, contents: dict):
+        started = time.perf_counter()
+        for n, (suffix, content) in enumerate(contents.items(), start=1):
+            path = base_path.with_name(f'{base_path.name}{suffix}.jsonl')
+            try:
+                with path.open('w', encoding='utf-8') as f:
+                    f.writelines(json.dumps([key, value], ensure_ascii=False) + '\n' for key, value in content.items())
+            except (OSError, TypeError, ValueError) as e:
+                self.messages.append(f'ERROR: inspection file {path.name} - {e}')
+                continue
+            self.files.append(path)
+            self.messages.append(f'INFO: inspection file {n} of {len(contents)} written: {path.name}')
+        self.messages.append(f'INFO: inspection files written in {time.perf_counter() - started:.1f} s: '
+                             f'{base_path.parent}')
+
+
+def cache_key(*, J1939DA_config: dict, J1939DA_dir: Path, rules: Rules) -> dict:
+    """What a parse depends on: the akrocansim version, the normalization rules, the content of the workbook and
+    the [J1939DA] table."""
+    with (J1939DA_dir / J1939DA_config['filename']).open('rb') as f:
+        workbook_sha256 = hashlib.file_digest(f, 'sha256').hexdigest()
+    return {'version': __version__, 'rules_sha256': rules.sha256, 'workbook_sha256': workbook_sha256,
+            'J1939DA': J1939DA_config}
+
+
+def load_cache(J1939DA_cache: Path) -> dict:
+    """{'key': cache_key() of the last parse, 'normalized': its normalized field values}, empty if not available.
+    Only read by a parse: whether the store is up to date is checked from the key kept in the store."""
+    try:
+        with J1939DA_cache.open('rb') as f:
+            return pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+        return {}
+
+
+def save_cache(J1939DA_cache: Path, *, key: dict, normalized: dict):
+    with J1939DA_cache.open('wb') as f:
+        pickle.dump({'key': key, 'normalized': normalized}, f)
+
+
+def cache_outdated(*, J1939DA_config: dict, J1939DA_dir: Path, J1939DA_store: Path, rules: Rules) -> str:
+    """Why J1939DA_store does not match the workbook and configuration, None if it does."""
+    if not J1939DA_store.exists():
+        return f'{J1939DA_store.name} not found'
+    cached_key = specstore.read_meta(J1939DA_store).get('cache_key')
+    if cached_key is None:
+        return f'{J1939DA_store.name} has no cache key or is unreadable'
+    key = cache_key(J1939DA_config=J1939DA_config, J1939DA_dir=J1939DA_dir, rules=rules)
+    if cached_key['version'] != key['version']:
+        return f"parsed by akrocansim {cached_key['version']}"
+    if cached_key.get('rules_sha256') != key['rules_sha256']:
+        return 'normalization rules have changed'
+    if cached_key['workbook_sha256'] != key['workbook_sha256']:
+        return f"{J1939DA_config['filename']} has changed"
+    if cached_key['J1939DA'] != key['J1939DA']:
+        return '[J1939DA] configuration has changed'
+    return None
+
+
+def parse_J1939DA(*, J1939DA_config: dict, J1939DA_dir: Path, J1939DA_store: Path, J1939DA_cache: Path = None,
+                  rules: Rules = None, workers: int = None, inspection: 'InspectionExport' = None) -> str:
+    """The cache key is saved in J1939DA_store, for cache_outdated().
+    J1939DA_cache: the normalized field values are saved to this file. The normalized values of a cache of the
+    same akrocansim version and rules are reused, so only changed rows are normalized again.
+    rules: normalization rules, default: the bundled rules. Their hits and unmatched texts are counted.
+    workers: processes normalizing the SPN fields, default: one per CPU.
+    inspection: started with the parsed definitions, to write the inspection files in the background."""
+    # imported here rather than by the normalization worker processes
+    from openpyxl import load_workbook
+    from openpyxl.utils import column_index_from_string
+
+    if rules is None:
+        rules = Rules()
     J1939_file = J1939DA_dir / J1939DA_config['filename']
-    J1939_wb = load_workbook(filename=J1939_file)
+    key = cache_key(J1939DA_config=J1939DA_config, J1939DA_dir=J1939DA_dir, rules=rules)
+    if J1939DA_cache is not None:
+        cache = load_cache(J1939DA_cache)
+        cached_key = cache.get('key', {})
+        same_rules = (cached_key.get('version'), cached_key.get('rules_sha256')) == (__version__, rules.sha256)
+        known = cache['normalized'] if same_rules else {}
+    else:
+        known = {}
+    # read-only: rows are streamed from the file rather than loaded as cell objects
+    J1939_wb = load_workbook(filename=J1939_file, read_only=True)
     J1939_sheet = J1939_wb[J1939DA_config['SPNs_and_PGNs_sheet']]
     spn_rows = J1939DA_config['SPNs_to_parse']
-    cols = J1939DA_config['SPNs_and_PGNs_sheet_columns']
+    # column letters resolved once to 0-based indices into the row tuples
+    cols = {name: column_index_from_string(column) - 1
+            for name, column in J1939DA_config['SPNs_and_PGNs_sheet_columns'].items()}
 
     J1939 = {}
     J1939_transmission_rates_dict = {}  # Mapping of [Transmission Rate] values to J1939...['tx_rate_ms']
@@ -521,48 +351,58 @@ def parse_J1939DA(*, J1939DA_config: dict, J1939DA_dir: Path, J1939DA_pickle: Pa
     J1939_unit_dict = {}  # Mapping of [Units] values to J1939...['unit']
     J1939_discrete_values_dict = {}  # Parsing of [SPN Description] values to identify J1939...['discrete_values']
 
-
-    for n in range(spn_rows['first_row'], spn_rows['last_row'] + 1):
-        try:
-            _ = J1939[J1939_sheet[f"{cols['PGN']}{n}"].value]
-        except KeyError:
-
-            pgn_description = J1939_sheet[f"{cols['PGN Description']}{n}"].value
-            if pgn_description is not None:
-                pgn_description = pgn_description.replace('_x000D_', '')
-
-            transmission_rate_ms = _map_transmission_rate(J1939_sheet[f"{cols['Transmission Rate']}{n}"].value)
-            J1939_transmission_rates_dict[J1939_sheet[f"{cols['Transmission Rate']}{n}"].value] = transmission_rate_ms
-
-            J1939[J1939_sheet[f"{cols['PGN']}{n}"].value] = {
-                'Parameter Group Label': J1939_sheet[f"{cols['Parameter Group Label']}{n}"].value,
-                'Acronym': J1939_sheet[f"{cols['Acronym']}{n}"].value,
-                'PGN Description': pgn_description,
-                'PGN Data Length': J1939_sheet[f"{cols['PGN Data Length']}{n}"].value \
-                    if J1939_sheet[f"{cols['PGN Data Length']}{n}"].value != 'Variable' else 8,
-                'Default Priority': J1939_sheet[f"{cols['Default Priority']}{n}"].value,
-                'Transmission Rate': J1939_sheet[f"{cols['Transmission Rate']}{n}"].value,
-                'transmission_rate_ms': transmission_rate_ms,
-                'SPNs': {}
+    try:
+        for row in _sheet_rows(J1939_sheet, spn_rows['first_row'], spn_rows['last_row'], max(cols.values()) + 1):
+            pgn = row[cols['PGN']]
+            if pgn not in J1939:  # the PGN fields are taken from the first row of each PGN
+
+                pgn_description = row[cols['PGN Description']]
+                if pgn_description is not None:
+                    pgn_description = pgn_description.replace('_x000D_', '')
+
+                transmission_rate = row[cols['Transmission Rate']]
+                transmission_rate_ms = rules.normalize('Transmission Rate', transmission_rate)
+                J1939_transmission_rates_dict[transmission_rate] = transmission_rate_ms
+
+                pgn_data_length = row[cols['PGN Data Length']]
+                J1939[pgn] = {
+                    'Parameter Group Label': row[cols['Parameter Group Label']],
+                    'Acronym': row[cols['Acronym']],
+                    'PGN Description': pgn_description,
+                    'PGN Data Length': pgn_data_length if pgn_data_length != 'Variable' else 8,
+                    'Default Priority': row[cols['Default Priority']],
+                    'Transmission Rate': transmission_rate,
+                    'transmission_rate_ms': transmission_rate_ms,
+                    'SPNs': {}
+                }
+
+            spn_description = row[cols['SPN Description']]
+            if spn_description is not None:
+                spn_description = spn_description.replace('_x000D_', '')
+
+            J1939[pgn]['SPNs'][row[cols['SPN']]] = {
+                'SPN Name': row[cols['SPN Name']],
+                'SPN Description': spn_description,
+                'SPN Position in PGN': row[cols['SPN Position in PGN']],
+                'SPN Length': row[cols['SPN Length']],
+                'Resolution': row[cols['Resolution']],
+                'Offset': row[cols['Offset']],
+                'Data Range': row[cols['Data Range']],
+                'Operational Range': row[cols['Operational Range']],
+                'Units': row[cols['Units']]
             }
+    finally:
+        J1939_wb.close()  # read-only workbooks keep the file open
 
-    for n in range(spn_rows['first_row'], spn_rows['last_row'] + 1):
-
-        spn_description = J1939_sheet[f"{cols['SPN Description']}{n}"].value
-        if spn_description is not None:
-            spn_description = spn_description.replace('_x000D_', '')
+    rules.count({
+        'Transmission Rate': Counter(pgn_spec['Transmission Rate'] for pgn_spec in J1939.values()),
+        **{field: Counter(spn_spec[field] for pgn_spec in J1939.values() for spn_spec in pgn_spec['SPNs'].values())
+           for field in _RULE_FIELDS}
+    })
+    normalized = _normalize(J1939, rules, workers, known)
 
-        J1939[J1939_sheet[f"{cols['PGN']}{n}"].value]['SPNs'][J1939_sheet[f"{cols['SPN']}{n}"].value] = {
-            'SPN Name': J1939_sheet[f"{cols['SPN Name']}{n}"].value,
-            'SPN Description': spn_description,
-            'SPN Position in PGN': J1939_sheet[f"{cols['SPN Position in PGN']}{n}"].value,
-            'SPN Length': J1939_sheet[f"{cols['SPN Length']}{n}"].value,
-            'Resolution': J1939_sheet[f"{cols['Resolution']}{n}"].value,
-            'Offset': J1939_sheet[f"{cols['Offset']}{n}"].value,
-            'Data Range': J1939_sheet[f"{cols['Data Range']}{n}"].value,
-            'Operational Range': J1939_sheet[f"{cols['Operational Range']}{n}"].value,
-            'Units': J1939_sheet[f"{cols['Units']}{n}"].value
-        }
+    def normalize(normalizer, raw_value):
+        return normalized[(normalizer, type(raw_value), raw_value)]
 
     pgn_count = 0
     spn_count = 0
@@ -571,28 +411,28 @@ def parse_J1939DA(*, J1939DA_config: dict, J1939DA_dir: Path, J1939DA_pickle: Pa
         for spn, spn_spec in pgn_spec['SPNs'].items():
             spn_count += 1
 
-            start_byte, start_bit = _map_spn_position(spn_spec['SPN Position in PGN'])
+            start_byte, start_bit = normalize('SPN Position in PGN', spn_spec['SPN Position in PGN'])
             spn_spec['start_byte'], spn_spec['start_bit'] = start_byte, start_bit
             J1939_spn_positions_dict[spn_spec['SPN Position in PGN']] = {
                 'start_byte': start_byte, 'start_bit': start_bit
             }
 
-            length_bits = _map_spn_length(spn_spec['SPN Length'])
+            length_bits = normalize('SPN Length', spn_spec['SPN Length'])
             spn_spec['length_bits'] = length_bits
             J1939_spn_length_dict[spn_spec['SPN Length']] = length_bits
 
-            scale = _map_resolution(spn_spec['Resolution'])
+            scale = normalize('Resolution', spn_spec['Resolution'])
             spn_spec['scale'] = scale
             J1939_resolution_dict[spn_spec['Resolution']] = scale
 
             spn_spec['n_decimals'] = len(str(scale).split('.')[-1]) if str(scale).count('.') else 0
 
-            offset = _map_offset(spn_spec['Offset'])
+            offset = normalize('Offset', spn_spec['Offset'])
             spn_spec['offset'] = offset
             J1939_offset_dict[spn_spec['Offset']] = offset
 
-            min_value, max_value = _map_data_range(spn_spec['Data Range'])
-            op_min_value, op_max_value = _map_operational_range(spn_spec['Operational Range'])
+            min_value, max_value = normalize('Data Range', spn_spec['Data Range'])
+            op_min_value, op_max_value = normalize('Operational Range', spn_spec['Operational Range'])
             spn_spec['min_value'] = min_value if op_min_value is None else op_min_value
             if length_bits == 32 and scale not in ['ASCII']:
                 spn_spec['max_value'] = 100_000 / scale
@@ -604,12 +444,12 @@ def parse_J1939DA(*, J1939DA_config: dict, J1939DA_dir: Path, J1939DA_pickle: Pa
                 'min_value': op_min_value, 'max_value': op_max_value
             }
 
-            unit = _map_units(spn_spec['Units'])
+            unit = normalize('Units', spn_spec['Units'])
             spn_spec['unit'] = unit
             J1939_unit_dict[spn_spec['Units']] = unit
 
             if spn_spec['Units'] in ['bit', 'bit-mapped'] and spn not in ignore_discrete_value_spns:
-                value_label_dict = _parse_discrete_value_label(spn, spn_spec['SPN Description'])
+                value_label_dict = normalize(_DISCRETE_VALUES, (spn, spn_spec['SPN Description']))
 
                 J1939_discrete_values_dict[spn] = {'scale': scale} | dict.fromkeys(range(2 ** spn_spec['length_bits']))
 
@@ -623,24 +463,25 @@ def parse_J1939DA(*, J1939DA_config: dict, J1939DA_dir: Path, J1939DA_pickle: Pa
                     spn_spec['discrete_values'][value] = labels
                     J1939_discrete_values_dict[spn][value] = labels
 
-
-    def save_json(file: Path, J1939_dict: dict):
-        with file.open('w', encoding='utf-8') as f:
-            json.dump(J1939_dict, f, indent=4, ensure_ascii=False)
-
-    base_filename = J1939DA_config['filename'].removesuffix('.xlsx')
-    save_json(J1939DA_dir / f'{base_filename}.json', J1939)
-    save_json(J1939DA_dir / f'{base_filename}_transmission_rates.json', J1939_transmission_rates_dict)
-    save_json(J1939DA_dir / f'{base_filename}_spn_positions.json', J1939_spn_positions_dict)
-    save_json(J1939DA_dir / f'{base_filename}_spn_lengths.json', J1939_spn_length_dict)
-    save_json(J1939DA_dir / f'{base_filename}_resolutions.json', J1939_resolution_dict)
-    save_json(J1939DA_dir / f'{base_filename}_offsets.json', J1939_offset_dict)
-    save_json(J1939DA_dir / f'{base_filename}_data_ranges.json', J1939_data_range_dict)
-    save_json(J1939DA_dir / f'{base_filename}_operational_ranges.json', J1939_operational_range_dict)
-    save_json(J1939DA_dir / f'{base_filename}_units.json', J1939_unit_dict)
-    save_json(J1939DA_dir / f'{base_filename}_discrete_values.json', J1939_discrete_values_dict)
-
-    with J1939DA_pickle.open('wb') as f:
-        pickle.dump(J1939, f)
-
-    return f'processed {pgn_count} PGNs and {spn_count} SPNs'
+    if inspection is not None:  # written while the store and the cache are written
+        inspection.start(J1939DA_dir / J1939DA_config['filename'].removesuffix('.xlsx'), {
+            '': J1939,
+            '_transmission_rates': J1939_transmission_rates_dict,
+            '_spn_positions': J1939_spn_positions_dict,
+            '_spn_lengths': J1939_spn_length_dict,
+            '_resolutions': J1939_resolution_dict,
+            '_offsets': J1939_offset_dict,
+            '_data_ranges': J1939_data_range_dict,
+            '_operational_ranges': J1939_operational_range_dict,
+            '_units': J1939_unit_dict,
+            '_discrete_values': J1939_discrete_values_dict,
+        })
+
+    specstore.write(J1939DA_store, J1939, meta={'cache_key': key})
+    if J1939DA_cache is not None:
+        save_cache(J1939DA_cache, key=key, normalized=normalized)
+
+    result = f'processed {pgn_count} PGNs and {spn_count} SPNs'
+    if known:
+        result += f', {len(normalized.keys() - known.keys())} of {len(normalized)} distinct field values normalized'
+    return result
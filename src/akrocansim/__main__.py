@@ -1,3 +1,41 @@
-from . import gui
+import argparse
+import sys
+from pathlib import Path
 
-gui.AkrocansimGui()
+from .__init__ import __app_name__
+
+parser = argparse.ArgumentParser(prog='akrocansim', description=__app_name__)
+parser.add_argument('--headless', action='store_true',
+                    help='run without GUI, transmitting all configured PGNs continuously')
+parser.add_argument('--replay', type=Path, metavar='LOG',
+                    help='replay a CAN log file (.asc, .blf, .log, ...) through the configured CAN interface, no GUI')
+parser.add_argument('--speed', type=float, default=1.0,
+                    help='replay: 1 for real time (default), N for N times faster, 0 for as fast as possible')
+parser.add_argument('--pgn', type=int, action='append', help='replay: only frames of this PGN, repeatable')
+parser.add_argument('--sa', type=int, action='append', help='replay: only frames of this source address, repeatable')
+parser.add_argument('--config', type=Path, metavar='DIR',
+                    help='configuration folder, default: akrocansim folder in the home folder')
+parser.add_argument('--duration', type=float, metavar='SEC',
+                    help='headless: stop after SEC seconds, default: run until interrupted')
+parser.add_argument('--telemetry-csv', type=Path, metavar='FILE',
+                    help='headless: save Tx telemetry as CSV on exit')
+parser.add_argument('--scenario', type=Path, action='append', metavar='FILE',
+                    help='headless: run the scenarios of a Python file and exit when they complete, repeatable')
+parser.add_argument('--record', type=Path, metavar='FILE',
+                    help='headless: record sent and received frames, format by suffix (.blf, .asc, .csv, .log)')
+args = parser.parse_args()
+
+if args.replay is not None:
+    from . import replay
+
+    sys.exit(replay.main(config_dir=args.config, log_file=args.replay, speed=args.speed, pgns=args.pgn,
+                         source_addresses=args.sa))
+elif args.headless:
+    from . import headless
+
+    sys.exit(headless.main(config_dir=args.config, duration=args.duration, telemetry_csv=args.telemetry_csv,
+                           record=args.record, scenarios=args.scenario))
+else:
+    from . import gui
+
+    gui.AkrocansimGui(args.config)
@@ -0,0 +1,79 @@
+"""Throughput and bus load of a CAN channel, from the frames sent and received by akrocansim."""
+import time
+
+import can
+
+
+def frame_bits(data_length: int, is_extended_id: bool = True, stuff_bits: bool = False) -> int:
+    """Bits of a classic CAN data frame on the bus, including the 3 bit interframe space.
+    With stuff_bits, the worst case number of stuff bits is added: one per 4 bits after the first
+    from the start of frame to the end of the CRC, which excludes the last 13 bits."""
+    bits = (67 if is_extended_id else 47) + 8 * data_length
+    if stuff_bits:
+        bits += (bits - 13 - 1) // 4
+    return bits
+
+
+def pgn_bits(data_length: int) -> int:
+    """Worst case bits of one transmission of a PGN, with stuff bits. PGNs with more than 8 data bytes are
+    broadcast with the transport protocol: a TP.CM BAM frame and a TP.DT frame per 7 data bytes."""
+    if data_length <= 8:
+        return frame_bits(data_length, stuff_bits=True)
+    return (1 + -(-data_length // 7)) * frame_bits(8, stuff_bits=True)
+
+
+def expected_bus_load(pgns, bitrate: int) -> float:
+    """Bus load % of PGNs transmitted periodically, from (data length, period in seconds) pairs."""
+    return sum(pgn_bits(data_length) / period for data_length, period in pgns) / bitrate * 100
+
+
+class TokenBucket:
+    """Bus load ceiling: tokens are bits, refilled at rate bits per second up to burst bits.
+    consume() takes the bits of a frame, going into debt if needed, and returns the seconds to wait
+    before sending it, so that frames are delayed rather than dropped. Not thread safe."""
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self._last = time.monotonic()
+
+    def consume(self, bits: int) -> float:
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self._last) * self.rate) - bits
+        self._last = now
+        return 0 if self.tokens >= 0 else -self.tokens / self.rate
+
+
+class BusLoad(can.Listener):
+    """Counts the frames sent (record_tx, a Transmitter tx listener) and received (a Receiver listener).
+    telemetry() reports rates over the time since its previous call.
+
+    With acceptance filters enabled, frames of other nodes are not received and not counted."""
+    def __init__(self, bitrate: int = None):
+        self.bitrate = bitrate
+        self.frames_sent = 0
+        self.frames_received = 0
+        self.bits = 0  # sent and received
+        self._last = (time.monotonic(), 0, 0)  # time, frames, bits at the previous telemetry() call
+
+    def record_tx(self, msg: can.Message):
+        self.frames_sent += 1
+        self.bits += frame_bits(len(msg.data), msg.is_extended_id)
+
+    def on_message_received(self, msg: can.Message):
+        self.frames_received += 1
+        self.bits += frame_bits(len(msg.data), msg.is_extended_id)
+
+    def telemetry(self) -> dict:
+        now, frames, bits = time.monotonic(), self.frames_sent + self.frames_received, self.bits
+        last_time, last_frames, last_bits = self._last
+        self._last = (now, frames, bits)
+        elapsed = now - last_time
+        return {
+            'frames sent': self.frames_sent,
+            'frames received': self.frames_received,
+            'frames/s': round((frames - last_frames) / elapsed) if elapsed else None,
+            'kbit/s': round((bits - last_bits) / elapsed / 1000, 1) if elapsed else None,
+            'bus load %': round((bits - last_bits) / elapsed / self.bitrate * 100, 1)
+            if elapsed and self.bitrate else None
+        }
@@ -0,0 +1,34 @@
+"""Composition and decomposition of 29-bit J1939 CAN IDs."""
+
+GLOBAL_ADDRESS = 0xFF
+PDU2_MIN_PF = 240  # PDU Format values below 240 are PDU1 (destination specific) PGNs
+
+
+def can_id(*, priority: int, pgn: int, source_address: int, destination_address: int = None) -> int:
+    """CAN ID of a PGN. For PDU1 PGNs destination_address replaces the PDU Specific byte of the PGN."""
+    if destination_address is not None and is_pdu1(pgn):
+        pgn = pgn & 0x3FF00 | destination_address
+    return priority << 26 | pgn << 8 | source_address
+
+
+def is_pdu1(pgn: int) -> bool:
+    return (pgn >> 8 & 0xFF) < PDU2_MIN_PF
+
+
+def priority(can_id: int) -> int:
+    return can_id >> 26 & 0x7
+
+
+def pgn(can_id: int) -> int:
+    """PGN of a CAN ID, with the destination address of PDU1 PGNs masked out."""
+    _pgn = can_id >> 8 & 0x3FFFF
+    return _pgn & 0x3FF00 if is_pdu1(_pgn) else _pgn
+
+
+def source_address(can_id: int) -> int:
+    return can_id & 0xFF
+
+
+def destination_address(can_id: int) -> int:
+    """Destination address of a PDU1 CAN ID, GLOBAL_ADDRESS for PDU2 (broadcast) CAN IDs."""
+    return can_id >> 8 & 0xFF if is_pdu1(can_id >> 8 & 0x3FFFF) else GLOBAL_ADDRESS
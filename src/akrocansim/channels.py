@@ -0,0 +1,295 @@
+"""CAN channels of the simulator, e.g. the powertrain, body and trailer J1939 segments of a truck.
+
+Every channel has its own bus and transmit engine: a Channel running in threads of this process, or a
+TransmitterProcess ([Transmitter] engine = 'process') running in a process of its own, so that the
+channels are served by separate CPU cores. Channels routes the Transmitter methods to the channel of
+each node, by source address.
+"""
+from pathlib import Path
+
+import can
+
+from . import config
+from .config import DEFAULT_CHANNEL
+from .busload import BusLoad
+from .receiver import Receiver
+from .recorder import Recorder
+from .telemetry import dump_telemetry_csv
+from .transmitter import Transmitter
+
+TX_ENGINE__THREAD = 'thread'  # transmission runs in threads of the GUI process
+TX_ENGINE__PROCESS = 'process'  # transmission runs in a TransmitterProcess per channel
+
+
+class Channel:
+    """Transmit engine of a channel in threads of this process: its bus, Transmitter, Receiver, BusLoad
+    and, while recording, Recorder. Also used by TransmitterProcess in its engine process."""
+    def __init__(self, J1939: dict, *, transmitter_options: dict = None, receiver_options: dict = None):
+        self.transmitter = Transmitter(J1939, **(transmitter_options or {}))
+        self.receiver = Receiver(self.transmitter, **(receiver_options or {}))
+        self.bus_load = BusLoad()
+        self.transmitter.tx_listeners.append(self.bus_load.record_tx)
+        self.receiver.listeners.append(self.bus_load)
+        self.recorder: Recorder = None
+        self.bus: can.BusABC = None
+
+    def connect(self, can_interface: dict) -> str:
+        """Open the bus of a [CAN_INTERFACE] table."""
+        self.disconnect()
+        self.bus, message = config.open_bus(can_interface)
+        if self.bus is not None:
+            self.bus_load.bitrate = self.transmitter.bitrate = can_interface.get('bitrate')
+            self.transmitter.bus = self.bus
+            self.receiver.start(self.bus)
+        return message
+
+    def disconnect(self) -> str:
+        if self.bus is None:
+            return 'INFO: CAN bus is not connected'
+        self.receiver.stop()
+        self.transmitter.bus = None
+        channel_info = self.bus.channel_info
+        self.bus.shutdown()
+        self.bus = None
+        return f'INFO: {channel_info} disconnected'
+
+    def is_connected(self) -> bool:
+        return self.bus is not None
+
+    def start_recording(self, path, **options):
+        """Record sent and received frames, options as for Recorder()."""
+        self.recorder = Recorder(path, **options)
+        self.recorder.start()
+        self.transmitter.tx_listeners.append(self.recorder.record_tx)
+        self.receiver.listeners.append(self.recorder)
+
+    def stop_recording(self) -> dict:
+        """Telemetry of the stopped Recorder, None if not recording."""
+        recorder, self.recorder = self.recorder, None
+        if recorder is None:
+            return None
+        self.transmitter.tx_listeners.remove(recorder.record_tx)
+        self.receiver.listeners.remove(recorder)
+        recorder.stop()
+        return recorder.telemetry()
+
+    def recorder_telemetry(self) -> dict:
+        """Telemetry of the Recorder and the file being written, None if not recording."""
+        if self.recorder is None:
+            return None
+        # files is filled in by the writer thread
+        return self.recorder.telemetry() | {'file': str(self.recorder.files[-1] if self.recorder.files
+                                                        else self.recorder.path)}
+
+    def transport_telemetry(self) -> list[dict]:
+        return self.transmitter.transport.telemetry()
+
+    def receiver_telemetry(self) -> dict:
+        return self.receiver.telemetry()
+
+    def bus_load_telemetry(self) -> dict:
+        return self.bus_load.telemetry()
+
+    def shutdown(self):
+        self.stop_recording()
+        self.disconnect()
+        self.transmitter.shutdown()
+
+
+class Channels(can.Listener):
+    def __init__(self, J1939: dict, can_channels: dict, node_channels: dict, *, engine: str = TX_ENGINE__THREAD,
+                 transmitter_options: dict = None, receiver_options: dict = None):
+        """can_channels: {channel name: [CAN_INTERFACE] table}, node_channels: {source address: channel name}."""
+        from .txprocess import TransmitterProcess  # txprocess imports this module
+
+        self.can_channels = can_channels
+        self.node_channels = node_channels
+        self.max_bus_load_pct = (transmitter_options or {}).get('max_bus_load_pct', 0)
+        self.channels = {}  # {channel name: Channel or TransmitterProcess}
+        self.transmitters = {}  # {channel name: Transmitter or TransmitterProcess}
+        # further can.Listener instances fed with the frames received by channels with the 'thread' engine
+        self.listeners = []
+        for name in can_channels:
+            if engine == TX_ENGINE__PROCESS:
+                self.channels[name] = self.transmitters[name] = TransmitterProcess(
+                    J1939, transmitter_options=transmitter_options, receiver_options=receiver_options)
+            else:
+                channel = self.channels[name] = Channel(J1939, transmitter_options=transmitter_options,
+                                                        receiver_options=receiver_options)
+                self.transmitters[name] = channel.transmitter
+                channel.receiver.listeners.append(self)
+
+    def on_message_received(self, msg: can.Message):
+        for listener in self.listeners:
+            listener.on_message_received(msg)
+
+    def _transmitter(self, source_address):
+        return self.transmitters[self.node_channels.get(source_address, DEFAULT_CHANNEL)]
+
+    def _label(self, name: str, message: str) -> str:
+        """message, prefixed with the channel name if there are several channels."""
+        if len(self.channels) == 1:
+            return message
+        level, _, text = message.partition(': ')
+        return f'{level}: channel {name} - {text}'
+
+    def bus_load_warnings(self) -> list[str]:
+        """Warnings for the channels whose registered PGNs cannot fit, from their expected worst case bus load."""
+        warnings = []
+        for name, transmitter in self.transmitters.items():
+            bitrate = self.can_channels[name].get('bitrate')
+            expected = transmitter.expected_bus_load(bitrate)
+            if expected is None:
+                continue
+            if expected > 100:
+                warnings.append(self._label(name, f'WARNING: expected bus load {expected:.1f} % at '
+                                                  f'{bitrate / 1000:.0f} kbit/s, periodic frames will be late '
+                                                  f'or missed'))
+            elif self.max_bus_load_pct and expected > self.max_bus_load_pct:
+                warnings.append(self._label(name, f'WARNING: expected bus load {expected:.1f} % exceeds '
+                                                  f'[Transmitter] max_bus_load_pct = {self.max_bus_load_pct}, '
+                                                  f'periodic frames will be delayed'))
+        return warnings
+
+    def connect(self) -> list[str]:
+        """Connect every channel, after the bus load warnings."""
+        return self.bus_load_warnings() + [self._label(name, channel.connect(self.can_channels[name]))
+                                           for name, channel in self.channels.items()]
+
+    def disconnect(self) -> list[str]:
+        return [self._label(name, channel.disconnect()) for name, channel in self.channels.items()]
+
+    def is_connected(self) -> bool:
+        """True if all channels are connected."""
+        return all(channel.is_connected() for channel in self.channels.values())
+
+    def start_recording(self, path, **options) -> list[Path]:
+        """Record every channel, to path or, with several channels, to files named after path and the channel,
+        e.g. rec_body.blf. Returns the paths."""
+        path = Path(path)
+        paths = []
+        for name, channel in self.channels.items():
+            channel_path = path if len(self.channels) == 1 else path.with_stem(f'{path.stem}_{name}')
+            channel.start_recording(channel_path, **options)
+            paths.append(channel_path)
+        return paths
+
+    def stop_recording(self) -> dict:
+        """Telemetry of the stopped Recorders, summed over the channels, None if not recording."""
+        telemetry = [t for t in (channel.stop_recording() for channel in self.channels.values()) if t is not None]
+        if not telemetry:
+            return None
+        return {key: sum(t[key] for t in telemetry) for key in ('frames written', 'frames dropped')}
+
+    def recorder_telemetry(self) -> dict:
+        """{channel name: telemetry of its Recorder}, empty if not recording."""
+        telemetry = {name: channel.recorder_telemetry() for name, channel in self.channels.items()}
+        return {name: t for name, t in telemetry.items() if t is not None}
+
+    def channel_telemetry(self) -> list[dict]:
+        """Throughput, bus load and Request PGN responses of every channel, and of all channels together
+        as the last row, except for bus load."""
+        telemetry = []
+        for name, channel in self.channels.items():
+            can_interface = self.can_channels[name]
+            telemetry.append({'channel': name, 'interface': f"{can_interface.get('interface')} "
+                                                            f"{can_interface.get('channel')}",
+                              'connected': channel.is_connected()}
+                             | channel.bus_load_telemetry()
+                             | {'expected bus load %': self._expected_bus_load(name)}
+                             | channel.receiver_telemetry())
+        if len(telemetry) > 1:
+            total = {'channel': 'all', 'interface': '', 'connected': all(t['connected'] for t in telemetry)}
+            for key in ('frames sent', 'frames received', 'frames/s', 'kbit/s', 'bus load %', 'expected bus load %',
+                        'requests received', 'responses sent', 'NACKs sent'):
+                total[key] = None if key.endswith('bus load %') else round(sum(t[key] or 0 for t in telemetry), 1)
+            telemetry.append(total)
+        return telemetry
+
+    def _expected_bus_load(self, name: str) -> float:
+        expected = self.transmitters[name].expected_bus_load(self.can_channels[name].get('bitrate'))
+        return None if expected is None else round(expected, 1)
+
+    def transport_telemetry(self) -> list[dict]:
+        return [{'channel': name} | row for name, channel in self.channels.items()
+                for row in channel.transport_telemetry()]
+
+    def shutdown(self):
+        """Shut every channel down, then raise the first error raised by one."""
+        error = None
+        for channel in self.channels.values():
+            try:
+                channel.shutdown()
+            except Exception as e:
+                error = error or e
+        if error is not None:
+            raise error
+
+    # Transmitter methods, routed by source address
+
+    def register_tx_PGN(self, *, pgn, priority, source_address, tx_rate_ms, data_length=None):
+        self._transmitter(source_address).register_tx_PGN(pgn=pgn, priority=priority, source_address=source_address,
+                                                          tx_rate_ms=tx_rate_ms, data_length=data_length)
+
+    def source_addresses(self) -> list:
+        return sorted(source_address for transmitter in self.transmitters.values()
+                      for source_address in transmitter.source_addresses())
+
+    def set_tx_mode_stop(self, pgn=None, source_address=0):
+        for transmitter in self.transmitters.values() if pgn is None else [self._transmitter(source_address)]:
+            transmitter.set_tx_mode_stop(pgn, source_address)
+
+    def set_tx_mode_continuous(self, pgn=None, source_address=0):
+        for transmitter in self.transmitters.values() if pgn is None else [self._transmitter(source_address)]:
+            transmitter.set_tx_mode_continuous(pgn, source_address)
+
+    def set_tx_mode_per_PGN(self):
+        for transmitter in self.transmitters.values():
+            transmitter.set_tx_mode_per_PGN()
+
+    def set_tx_once(self, pgn=None, source_address=0):
+        for transmitter in self.transmitters.values() if pgn is None else [self._transmitter(source_address)]:
+            transmitter.set_tx_once(pgn, source_address)
+
+    def modify_pgn_tx_rate(self, pgn, tx_rate_ms, source_address=0):
+        self._transmitter(source_address).modify_pgn_tx_rate(pgn, tx_rate_ms, source_address)
+
+    def get_tx_rate_ms(self, pgn: int, source_address=0) -> float:
+        return self._transmitter(source_address).get_tx_rate_ms(pgn, source_address)
+
+    def modify_pgn_data(self, pgn: int, spn: int, raw_value: int, source_address=0):
+        self._transmitter(source_address).modify_pgn_data(pgn, spn, raw_value, source_address)
+
+    def _split(self, values: dict, source_address) -> dict:
+        """{transmitter: values with (PGN, source address) keys} of values keyed by PGN or (PGN, source address)."""
+        split = {}
+        for pgn, value in values.items():
+            key = pgn if type(pgn) is tuple else (pgn, source_address)
+            split.setdefault(self._transmitter(key[1]), {})[key] = value
+        return split
+
+    def set_values(self, values: dict, source_address=0):
+        for transmitter, transmitter_values in self._split(values, source_address).items():
+            transmitter.set_values(transmitter_values)
+
+    def set_bits(self, updates: dict, source_address=0):
+        for transmitter, transmitter_updates in self._split(updates, source_address).items():
+            transmitter.set_bits(transmitter_updates)
+
+    def set_pgn_payload(self, pgn: int, data: bytes, source_address=0):
+        self._transmitter(source_address).set_pgn_payload(pgn, data, source_address)
+
+    def get_raw_value(self, pgn: int, spn: int, source_address=0) -> int:
+        return self._transmitter(source_address).get_raw_value(pgn, spn, source_address)
+
+    def telemetry(self) -> list[dict]:
+        return [row | {'channel': name} for name, transmitter in self.transmitters.items()
+                for row in transmitter.telemetry()]
+
+    def dump_telemetry_csv(self, telemetry_csv):
+        dump_telemetry_csv(telemetry=self.telemetry(), telemetry_csv=telemetry_csv)
+
+    def pop_messages(self) -> list[str]:
+        """Messages of the errors raised while sending since the last call, of all channels."""
+        return [self._label(name, msg) for name, transmitter in self.transmitters.items()
+                for msg in transmitter.pop_messages()]
@@ -0,0 +1,80 @@
+"""Precompiled packing and unpacking of little-endian J1939 SPN bit fields of any length and position.
+
+A field is compiled once into the byte span it covers and the shift and mask within that span.
+"""
+from functools import lru_cache
+
+
+class SPNCodec:
+    __slots__ = ('start_byte', 'start_bit', 'length_bits', 'bit_offset', 'end_byte', 'max_raw',
+                 '_shift', '_mask', '_inv_mask', '_single_byte')
+
+    def __init__(self, *, start_byte: int, start_bit: int, length_bits: int):
+        if start_byte is None or start_bit is None or length_bits is None \
+                or start_byte < 0 or not 0 <= start_bit < 8 or length_bits < 1:
+            raise ValueError(f'SPN field cannot be positioned: start_byte={start_byte}, '
+                             f'start_bit={start_bit}, length_bits={length_bits}')
+        self.start_byte = start_byte
+        self.start_bit = start_bit
+        self.length_bits = length_bits
+        self.bit_offset = start_byte * 8 + start_bit
+        self.end_byte = (self.bit_offset + length_bits + 7) // 8  # exclusive
+        self.max_raw = (1 << length_bits) - 1
+
+        n_bytes = self.end_byte - start_byte
+        self._shift = start_bit
+        self._mask = self.max_raw << start_bit
+        self._inv_mask = ~self._mask & ((1 << 8 * n_bytes) - 1)
+        self._single_byte = n_bytes == 1
+
+    @classmethod
+    def from_spec(cls, spn_spec: dict):
+        return _field(spn_spec['start_byte'], spn_spec['start_bit'], spn_spec['length_bits'])
+
+    def pack(self, data: bytearray, raw_value: int):
+        """Write raw_value into the field in place. Bits beyond the field length are discarded."""
+        if self._single_byte:
+            i = self.start_byte
+            data[i] = data[i] & self._inv_mask | raw_value << self._shift & self._mask
+        else:
+            i, j = self.start_byte, self.end_byte
+            word = int.from_bytes(data[i:j], 'little') & self._inv_mask | raw_value << self._shift & self._mask
+            data[i:j] = word.to_bytes(j - i, 'little')
+
+    def unpack(self, data) -> int:
+        if self._single_byte:
+            return (data[self.start_byte] & self._mask) >> self._shift
+        return (int.from_bytes(data[self.start_byte:self.end_byte], 'little') & self._mask) >> self._shift
+
+
+@lru_cache(maxsize=None)
+def _field(start_byte, start_bit, length_bits) -> SPNCodec:
+    return SPNCodec(start_byte=start_byte, start_bit=start_bit, length_bits=length_bits)
+
+
+class PGNCodec:
+    """Codecs of all SPNs of a PGN that can be positioned within its data length."""
+    __slots__ = ('data_length', 'fields')
+
+    def __init__(self, pgn_spec: dict, data_length: int = None):
+        self.data_length = pgn_spec['PGN Data Length'] if data_length is None else data_length
+        self.fields = {}
+        for spn, spn_spec in pgn_spec['SPNs'].items():
+            try:
+                field = SPNCodec.from_spec(spn_spec)
+            except (ValueError, KeyError, TypeError):
+                continue
+            if field.end_byte <= self.data_length:
+                self.fields[spn] = field
+
+    def new_buffer(self) -> bytearray:
+        return bytearray(self.data_length)
+
+    def pack(self, data: bytearray, spn: int, raw_value: int):
+        self.fields[spn].pack(data, raw_value)
+
+    def unpack(self, data, spn: int) -> int:
+        return self.fields[spn].unpack(data)
+
+    def unpack_all(self, data) -> dict:
+        return {spn: field.unpack(data) for spn, field in self.fields.items()}
@@ -3,12 +3,12 @@ import os
 import subprocess
 from pathlib import Path
 import tomllib
-import pickle
+import time
 
 import can
 
-from . import J1939DA
-from . import dbc
+from .rules import Rules
+from .specstore import SpecStore
 
 
 default_config_toml = '''[CAN_INTERFACE]
@@ -30,10 +30,17 @@ bitrate=250000
 # If your copy is in .xls format, you need to convert it to .xlsx using Microsoft Excel.
 # Save the 'J1939DA_??????.xlsx' file in the 'J1939' folder, located in the same folder with this configuration.
 # Edit the values of all keys in the [J1939DA] table as required and parse the J1939 Digital Annex.
+# Texts of the J1939DA are mapped to values by normalization rules, which can be extended for other J1939DA
+# revisions in a J1939DA_rules.toml file in the same folder with this configuration, see the rules bundled in
+# akrocansim/resources/J1939DA_rules.toml for the format.
 
 filename = 'J1939DA_??????.xlsx'
 SPNs_and_PGNs_sheet = 'SPNs & PGNs'
 
+# Write JSON Lines files of the parsed definitions next to the J1939DA, for inspecting parsing correctness.
+# They are written in the background after parsing.
+inspection_files = false
+
 
 [J1939DA.SPNs_and_PGNs_sheet_columns]
 # Adjust as required
@@ -64,13 +71,106 @@ first_row = 5
 last_row = 5000
 
 
+[Transmitter]
+# Transmit engine:
+# 'thread'  - transmission runs in the GUI process
+# 'process' - transmission, request responses and recording run in a separate process with the CAN interface,
+#             so GUI rendering and callbacks never delay frames. SPN changes are sent to it in batches.
+engine = 'thread'
+
+# Cyclic transmission backend:
+# 'software' - akrocansim schedules every frame
+# 'driver'   - continuously transmitted PGNs are handed over to cyclic tasks of the CAN interface driver or firmware
+#              (python-can send_periodic), falling back to 'software' if the interface does not support them
+
+tx_backend = 'software'
+
+# J1939-21 transport protocol, used for PGNs with more than 8 data bytes:
+# time between BAM data packets, 50 to 200 ms per J1939-21, 0 to send as fast as possible
+tp_bam_packet_gap_ms = 50
+# time between RTS/CTS data packets
+tp_cmdt_packet_gap_ms = 0
+
+# Bus load: offset the first transmission of each PGN by a fraction of its period, so that PGNs with equal rates
+# do not reach the bus at the same instant every period
+phase_stagger = true
+# Ceiling on the bus load % of the periodic frames of each channel, enforced by delaying frames (token bucket),
+# 0 for none. A warning is shown on connecting when the expected worst case bus load, with stuff bits,
+# of the configured PGNs exceeds this ceiling or the bit rate.
+max_bus_load_pct = 0
+
+
+[Receiver]
+# Answer Request PGN 59904 with the current data of the requested PGN, or with a NACK
+# for destination specific requests of PGNs not transmitted by the addressed node
+respond_to_requests = true
+# Program the CAN interface to pass only requests and transport protocol frames addressed to the simulated nodes
+acceptance_filters = true
+
+
+[Recorder]
+# Recording of sent and received frames: MENU > Recording > Start, saved in the 'recordings' sub-folder.
+# File format: 'blf', 'asc', 'csv' or 'log' (candump)
+format = 'blf'
+# Start a new file after this many MB / minutes, 0 for a single file
+rotate_mb = 0
+rotate_min = 0
+# Frames waiting to be written, further frames are dropped (and counted) if the disk falls behind
+max_queue = 100000
+
+
+[Control]
+# Local control server for external test tools, e.g. HIL test frameworks: newline delimited JSON requests
+# setting SPN values, tx modes and tx rates, see akrocansim.control. A Python client: akrocansim.control.ControlClient
+enabled = false
+host = '127.0.0.1'
+port = 41939
+# Listen on this Unix domain socket path instead of host and port, e.g. '/tmp/akrocansim.sock'
+#unix_socket = ''
+
+
 [Tx_PGNs_SPNs]
 # List the PGNs and SPNs to be loaded by akrocansim using the following format:
 # PGN = [SPN#1, SPN#2, ..., SPN#N], e.g. 61444 = [513, 190]
 
 #61444 = [513, 190]
+
+
+[Nodes]
+# The PGNs listed in [Tx_PGNs_SPNs] are transmitted from source address 0.
+# Additional simulated controllers (nodes) can be listed here, each with a unique source address
+# and its own PGNs and SPNs, in the same format as [Tx_PGNs_SPNs], e.g.:
+#
+#[Nodes.engine_2]
+#source_address = 0x01
+#channel = 'default'  # CAN channel of the node, see [Channels]
+#
+#[Nodes.engine_2.Tx_PGNs_SPNs]
+#61444 = [513, 190]
+
+
+[Channels]
+# The CAN interface of [CAN_INTERFACE] is the channel named 'default', used by [Tx_PGNs_SPNs] and by nodes
+# without a channel. Further channels, e.g. for trucks with several J1939 segments, can be listed here with
+# the same parameters as [CAN_INTERFACE]. Each channel has its own transmit engine, e.g.:
+#
+#[Channels.body]
+#interface='pcan'
+#channel='PCAN_USBBUS2'
+#bitrate=250000
 '''
 
+DEFAULT_CHANNEL = 'default'  # the channel of the [CAN_INTERFACE] table
+
+
+def open_bus(can_interface: dict) -> tuple[can.BusABC, str]:
+    """Bus of a [CAN_INTERFACE] table, None if it cannot be opened, and a message for the user."""
+    try:
+        bus = can.Bus(**can_interface)
+    except can.exceptions.CanError as e:
+        return None, f'ERROR: {e}'
+    return bus, f"INFO: connected to: {bus.channel_info}, bit rate: {can_interface['bitrate'] / 1000:.0f} kbit/s"
+
 
 class Config:
     def __init__(self, config_dir: Path = None):
@@ -81,14 +181,26 @@ class Config:
         self.config_toml = self.config_dir/'config.toml'
         self.J1939DA_dir = self.config_dir / 'J1939DA'
         self.J1939DA_xlsx = None
-        self.J1939DA_pickle = self.J1939DA_dir / 'J1939DA.pkl'
+        self.J1939DA_store = self.J1939DA_dir / 'J1939DA.sqlite'
+        self.J1939DA_cache = self.J1939DA_dir / 'J1939DA_cache.pkl'  # normalized values, reused by the next parse
+        self.J1939DA_rules = self.config_dir / 'J1939DA_rules.toml'  # optional, extends the bundled rules
 
         self._config = {}
 
         self.J1939_spec = None
+        self.inspection_export = None  # J1939DA.InspectionExport of the last parse with [J1939DA] inspection_files
         self.bus = None
         self.tx_PGNs_SPNs = {}
+        self.tx_nodes = {}  # {source address: {'name': str, 'channel': str, 'Tx_PGNs_SPNs': {PGN: [SPN, ...]}}}
+        self.can_channels = {}  # {channel name: [CAN_INTERFACE] or [Channels.<name>] table}
+        self.transmitter_options = {}  # [Transmitter] table without 'engine', keyword arguments of Transmitter()
+        self.tx_engine = 'thread'  # [Transmitter] engine
+        self.receiver_options = {}  # [Receiver] table, keyword arguments of Receiver()
+        self.recorder_options = {}  # [Recorder] table, 'format' and keyword arguments of Recorder()
+        self.control_options = {}  # [Control] table, 'enabled' and keyword arguments of ControlServer()
         self.tx_PGNs_SPNs_dbc = self.config_dir / 'Tx_PGNs_SPNs.dbc'
+        self.tx_telemetry_csv = self.config_dir / 'Tx_telemetry.csv'
+        self.recordings_dir = self.config_dir / 'recordings'
 
     def load(self):
         messages = []
@@ -107,45 +219,107 @@ class Config:
             except tomllib.TOMLDecodeError as e:
                 messages.append(f'ERROR: incompatible configuration file - {e}')
 
+            self.transmitter_options = dict(self._config.get('Transmitter', {}))
+            self.tx_engine = self.transmitter_options.pop('engine', 'thread')
+            self.receiver_options = self._config.get('Receiver', {})
+            self.recorder_options = self._config.get('Recorder', {})
+            self.control_options = self._config.get('Control', {})
+            self.can_channels = {DEFAULT_CHANNEL: self._config.get('CAN_INTERFACE', {})} \
+                | self._config.get('Channels', {})
+
             if '?' in self._config['J1939DA']['filename']:
                 messages.append(f'INFO: [J1939DA] filename has not been specified in the configuration file')
             elif Path(self._config['J1939DA']['filename']).suffix != '.xlsx':
                 messages.append('ERROR: J1939DA filename must be in .xlsx format')
             else:
                 self.J1939DA_xlsx = self.J1939DA_dir / self._config['J1939DA']['filename']
+                rules, rules_error = self._load_rules()
                 if not self.J1939DA_xlsx.exists():
                     messages.append(f'ERROR: {self.J1939DA_xlsx} file not found')
+                elif rules_error is not None:
+                    messages.append(rules_error)
                 else:
-                    if not self.J1939DA_pickle.exists():
-                        messages.append(self.parse_J1939DA())
+                    from . import J1939DA
+
+                    outdated = J1939DA.cache_outdated(J1939DA_config=self._config['J1939DA'],
+                                                      J1939DA_dir=self.J1939DA_dir,
+                                                      J1939DA_store=self.J1939DA_store, rules=rules)
+                    if outdated is not None:
+                        messages.append(f'INFO: parsing {self.J1939DA_xlsx.name}: {outdated}')
+                        messages.extend(self._parse_J1939DA(rules))
+                    # PGNs are loaded from the store on first use, i.e. only those of [Tx_PGNs_SPNs] and [Nodes]
+                    self.J1939_spec = SpecStore(self.J1939DA_store)
+                    messages.append(f'INFO: loaded: {self.J1939DA_store}')
+
+                    nodes = self._config.get('Nodes', {})
+                    self.tx_nodes = {}
+                    if not self._config['Tx_PGNs_SPNs'] and not nodes:
+                        messages.append('ERROR: PGNs not found in [Tx_PGNs_SPNs] section of configuration file')
                     else:
-                        with self.J1939DA_pickle.open('rb') as f:
-                            self.J1939_spec = pickle.load(f)
-                            messages.append(f'INFO: loaded: {self.J1939DA_pickle}')
-
-                        if not self._config['Tx_PGNs_SPNs']:
-                            messages.append('ERROR: PGNs not found in [Tx_PGNs_SPNs] section of configuration file')
-                        else:
-                            pgn_spn_errors_found = False
-                            for pgn, spn_list in self._config['Tx_PGNs_SPNs'].items():
-                                try:
-                                    _ = self.J1939_spec[int(pgn)]
-                                    for spn in spn_list:
-                                        try:
-                                            _ = self.J1939_spec[int(pgn)]['SPNs'][spn]
-                                        except KeyError:
-                                            pgn_spn_errors_found = True
-                                            messages.append(f'ERROR: SPN {spn} not found in parsed elements of J1939DA')
-                                except KeyError:
-                                    pgn_spn_errors_found = True
-                                    messages.append(f'ERROR: PGN {pgn} not found in parsed elements of J1939DA')
-                                if not pgn_spn_errors_found:
-                                    self.tx_PGNs_SPNs[int(pgn)] = spn_list
-                                pgn_spn_errors_found = False
+                        self.tx_PGNs_SPNs = self._load_PGNs_SPNs(self._config['Tx_PGNs_SPNs'], messages)
+                        if self.tx_PGNs_SPNs:
+                            self.tx_nodes[0] = {'name': 'default', 'channel': DEFAULT_CHANNEL,
+                                                'Tx_PGNs_SPNs': self.tx_PGNs_SPNs}
+                        for name, node in nodes.items():
+                            source_address = node.get('source_address')
+                            if not isinstance(source_address, int) or not 0 <= source_address <= 253:
+                                messages.append(f'ERROR: [Nodes.{name}] source_address must be 0 to 253')
+                            elif source_address in self.tx_nodes:
+                                messages.append(f'ERROR: [Nodes.{name}] source address {source_address} '
+                                                f"already used by node '{self.tx_nodes[source_address]['name']}'")
+                            elif node.get('channel', DEFAULT_CHANNEL) not in self.can_channels:
+                                messages.append(f"ERROR: [Nodes.{name}] channel '{node['channel']}' "
+                                                f'not found in [Channels]')
+                            else:
+                                self.tx_nodes[source_address] = {
+                                    'name': name,
+                                    'channel': node.get('channel', DEFAULT_CHANNEL),
+                                    'Tx_PGNs_SPNs': self._load_PGNs_SPNs(node.get('Tx_PGNs_SPNs', {}), messages)
+                                }
 
         return messages
 
+    def _load_PGNs_SPNs(self, PGNs_SPNs: dict, messages: list) -> dict:
+        tx_PGNs_SPNs = {}
+        pgn_spn_errors_found = False
+        for pgn, spn_list in PGNs_SPNs.items():
+            try:
+                _ = self.J1939_spec[int(pgn)]
+                for spn in spn_list:
+                    try:
+                        _ = self.J1939_spec[int(pgn)]['SPNs'][spn]
+                    except KeyError:
+                        pgn_spn_errors_found = True
+                        messages.append(f'ERROR: SPN {spn} not found in parsed elements of J1939DA')
+            except KeyError:
+                pgn_spn_errors_found = True
+                messages.append(f'ERROR: PGN {pgn} not found in parsed elements of J1939DA')
+            if not pgn_spn_errors_found:
+                tx_PGNs_SPNs[int(pgn)] = spn_list
+            pgn_spn_errors_found = False
+        return tx_PGNs_SPNs
+
+    def new_recording(self) -> tuple[Path, dict]:
+        """Path of a new recording file and the keyword arguments of Recorder()."""
+        options = dict(self.recorder_options)
+        file_format = options.pop('format', 'blf')
+        return self.recordings_dir / f"akrocansim_{time.strftime('%Y%m%d_%H%M%S')}.{file_format}", options
+
+    def node_channels(self) -> dict:
+        """{source address: channel name} of the configured nodes."""
+        return {source_address: node['channel'] for source_address, node in self.tx_nodes.items()}
+
+    def new_control_server(self, J1939: dict, transmitter):
+        """ControlServer of the [Control] table, None if not enabled."""
+        options = dict(self.control_options)
+        if not options.pop('enabled', False):
+            return None
+        from .control import ControlServer
+
+        return ControlServer(J1939, transmitter, **options)
+
     def connect_can(self):
+        """Connect the CAN interface of the [CAN_INTERFACE] table."""
         messages = []
 
         if not self._config:
@@ -157,12 +331,8 @@ class Config:
                 messages.append('ERROR: CAN interface configuration parameters not found '
                                 'in [CAN_INTERFACE] section of configuration file')
             else:
-                try:
-                    self.bus = can.Bus(**self._config['CAN_INTERFACE'])
-                    messages.append(f"INFO: connected to: {self.bus.channel_info}, "
-                                    f"bit rate: {self._config['CAN_INTERFACE']['bitrate'] / 1000:.0f} kbit/s")
-                except can.exceptions.CanError as e:
-                    messages.append(f'ERROR: {e}')
+                self.bus, message = open_bus(self._config['CAN_INTERFACE'])
+                messages.append(message)
         except KeyError:
             messages.append(f'ERROR: [CAN_INTERFACE] section not found in configuration file')
 
@@ -177,14 +347,37 @@ class Config:
         else:
             return 'INFO: CAN bus is not connected'
 
+    def _load_rules(self) -> tuple:
+        """(normalization rules, None) or (None, error message)."""
+        try:
+            return Rules(self.J1939DA_rules), None
+        except (OSError, ValueError) as e:  # including tomllib.TOMLDecodeError
+            return None, f'ERROR: J1939DA normalization rules - {e}'
+
+    def _parse_J1939DA(self, rules: Rules) -> list[str]:
+        """Messages of the parse, with the rule hit counts and unmatched texts."""
+        from . import J1939DA  # openpyxl is imported when parsing only
+
+        if self._config['J1939DA'].get('inspection_files', False):
+            self.inspection_export = J1939DA.InspectionExport()
+            inspection = self.inspection_export
+        else:
+            inspection = None
+        result = J1939DA.parse_J1939DA(J1939DA_config=self._config['J1939DA'], J1939DA_dir=self.J1939DA_dir,
+                                       J1939DA_store=self.J1939DA_store, J1939DA_cache=self.J1939DA_cache,
+                                       rules=rules, inspection=inspection)
+        return [f'INFO: {result}'] + rules.report()
+
     def parse_J1939DA(self):
-        parsing_result = J1939DA.parse_J1939DA(J1939DA_config=self._config['J1939DA'],
-                                               J1939DA_dir=self.J1939DA_dir,
-                                               J1939DA_pickle=self.J1939DA_pickle)
-        messages = [f'INFO: {parsing_result}', 'reload configuration to use parsed J1939DA definitions']
+        rules, rules_error = self._load_rules()
+        if rules_error is not None:
+            return [rules_error]
+        messages = self._parse_J1939DA(rules) + ['reload configuration to use parsed J1939DA definitions']
         return messages
 
     def dump_tx_PGNs_SPNs_dbc(self):
+        from . import dbc
+
         dbc.dump_J1939_dbc(J1939DA=self.J1939_spec, PGNs_SPNs=self.tx_PGNs_SPNs, PGNs_SPNs_dbc=self.tx_PGNs_SPNs_dbc)
         return f'INFO: DBC file created: {self.tx_PGNs_SPNs_dbc}'
 
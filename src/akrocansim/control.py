@@ -0,0 +1,279 @@
+"""Local control server, for changing SPN values and tx modes from external test tools, e.g. HIL test frameworks
+in other processes and languages.
+
+The protocol is newline delimited JSON over TCP (localhost by default) or a Unix domain socket.
+Every request is a JSON object on one line, answered by one line, in order:
+
+    {"id": 1, "op": "set_values", "values": {"61444": {"190": 12000, "513": 150}}, "source_address": 0}
+    {"id": 1, "ok": true, "result": null}
+
+    {"id": 2, "op": "set_values", "values": {"65262": {"110": 85.5}}, "physical": true}
+    {"id": 3, "op": "set_tx_mode", "mode": "continuous", "pgn": 61444}
+    {"id": 4, "op": "set_tx_rate", "pgn": 61444, "tx_rate_ms": 20}
+    {"id": 5, "op": "get_value", "pgn": 65262, "spn": 110, "physical": true}
+    {"id": 6, "op": "set_tx_mode", "mode": "bogus"}
+    {"id": 6, "ok": false, "error": "ValueError: unknown tx mode 'bogus'"}
+
+"id" is optional and echoed. All SPNs of a set_values request are applied together, each PGN in one frame.
+Clients may pipeline requests, sending many before reading their replies.
+
+ops: set_values (values, source_address=0, physical=false), set_tx_mode (mode: stop, continuous, per_pgn, once;
+pgn=null for all PGNs; source_address=0), set_tx_rate (pgn, tx_rate_ms: 10 to 50000, source_address=0),
+get_value (pgn, spn, source_address=0, physical=false), source_addresses, telemetry, ping.
+"""
+import json
+import socket
+import socketserver
+import threading
+from pathlib import Path
+
+from . import signaltools
+
+DEFAULT_PORT = 41939
+MIN_TX_RATE_MS = 10  # as the tx rate inputs of the GUI
+MAX_TX_RATE_MS = 50_000
+
+
+class ControlError(Exception):
+    """A request failed in the control server."""
+
+
+def _dumps(obj) -> bytes:
+    return json.dumps(obj, separators=(',', ':')).encode() + b'\n'
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        control: ControlServer = self.server.control
+        control._count('clients', 1)
+        try:
+            for line in self.rfile:
+                if line.strip():
+                    self.wfile.write(control.execute_line(line))
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            control._count('clients', -1)
+
+
+class _TCPHandler(_Handler):
+    disable_nagle_algorithm = True  # replies are small and latency matters
+
+
+class _TCPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+if hasattr(socketserver, 'ThreadingUnixStreamServer'):
+    class _UnixServer(socketserver.ThreadingUnixStreamServer):
+        daemon_threads = True
+
+
+class ControlServer:
+    def __init__(self, J1939: dict, transmitter, *, host: str = '127.0.0.1', port: int = DEFAULT_PORT,
+                 unix_socket: str = None):
+        """transmitter: Transmitter, TransmitterProcess or Channels.
+        unix_socket: path of a Unix domain socket to listen on instead of host and port."""
+        self._J1939 = J1939
+        self.transmitter = transmitter
+        self.host = host
+        self.port = port
+        self.unix_socket = unix_socket
+        self.clients = 0
+        self.requests = 0
+        self.errors = 0
+        self._counters_lock = threading.Lock()  # the counters are updated by the handler thread of each client
+        self._server: socketserver.BaseServer = None
+        self._thread: threading.Thread = None
+        self._ops = {
+            'set_values': self._set_values,
+            'set_tx_mode': self._set_tx_mode,
+            'set_tx_rate': self._set_tx_rate,
+            'get_value': self._get_value,
+            'source_addresses': lambda: self.transmitter.source_addresses(),
+            'telemetry': lambda: self.transmitter.telemetry(),
+            'ping': lambda: 'pong',
+        }
+
+    @property
+    def address(self):
+        """(host, port) or Unix socket path listened on, port as bound if 0 was given."""
+        return None if self._server is None else self._server.server_address
+
+    def start(self) -> str:
+        if self.unix_socket and not hasattr(socketserver, 'ThreadingUnixStreamServer'):
+            return 'ERROR: control server - Unix domain sockets are not supported on this platform'
+        try:
+            if self.unix_socket:
+                Path(self.unix_socket).unlink(missing_ok=True)
+                self._server = _UnixServer(str(self.unix_socket), _Handler)
+            else:
+                self._server = _TCPServer((self.host, self.port), _TCPHandler)
+        except OSError as e:
+            self._server = None
+            return f'ERROR: control server - {e}'
+        self._server.control = self
+        self._thread = threading.Thread(target=self._server.serve_forever, name='akrocansim-control', daemon=True)
+        self._thread.start()
+        address = self.address if self.unix_socket else f'{self.address[0]}:{self.address[1]}'
+        return f'INFO: control server listening on: {address}'
+
+    def stop(self):
+        if self._server is None:
+            return
+        self._server.shutdown()
+        self._server.server_close()
+        self._server = None
+        if self.unix_socket:
+            Path(self.unix_socket).unlink(missing_ok=True)
+
+    def _count(self, counter: str, n: int = 1):
+        with self._counters_lock:
+            setattr(self, counter, getattr(self, counter) + n)
+
+    def telemetry(self) -> dict:
+        return {'clients': self.clients, 'requests': self.requests, 'errors': self.errors}
+
+    def execute_line(self, line: bytes) -> bytes:
+        """Reply line to a request line."""
+        self._count('requests')
+        request_id = None
+        try:
+            request = json.loads(line)
+            request_id = request.pop('id', None)
+            result = self._ops[request.pop('op')](**request)
+            reply = {'ok': True, 'result': result}
+        except Exception as e:
+            reply = {'ok': False, 'error': f'{type(e).__name__}: {e}'}
+        if not reply['ok']:
+            self._count('errors')
+        return _dumps(reply if request_id is None else {'id': request_id} | reply)
+
+    def _spn_spec(self, pgn: int, spn: int) -> dict:
+        return self._J1939[pgn]['SPNs'][spn]
+
+    def _set_values(self, values: dict, source_address: int = 0, physical: bool = False):
+        raw_values = {}
+        for pgn, spn_values in values.items():
+            pgn = int(pgn)
+            raw_values[(pgn, source_address)] = {
+                int(spn): signaltools.encode_clamped(decoded_value=value, signal_spec=self._spn_spec(pgn, int(spn)))
+                if physical else int(value) for spn, value in spn_values.items()}
+        self.transmitter.set_values(raw_values)
+
+    def _set_tx_mode(self, mode: str, pgn: int = None, source_address: int = 0):
+        if mode == 'stop':
+            self.transmitter.set_tx_mode_stop(pgn, source_address)
+        elif mode == 'continuous':
+            self.transmitter.set_tx_mode_continuous(pgn, source_address)
+        elif mode == 'once':
+            self.transmitter.set_tx_once(pgn, source_address)
+        elif mode == 'per_pgn' and pgn is None:
+            self.transmitter.set_tx_mode_per_PGN()
+        elif mode == 'per_pgn':
+            raise ValueError("tx mode 'per_pgn' applies to all PGNs")
+        else:
+            raise ValueError(f'unknown tx mode {mode!r}')
+
+    def _set_tx_rate(self, pgn: int, tx_rate_ms: float, source_address: int = 0):
+        if not (isinstance(tx_rate_ms, (int, float)) and MIN_TX_RATE_MS <= tx_rate_ms <= MAX_TX_RATE_MS):
+            raise ValueError(f'tx_rate_ms must be {MIN_TX_RATE_MS} to {MAX_TX_RATE_MS}, got {tx_rate_ms!r}')
+        self.transmitter.modify_pgn_tx_rate(pgn, tx_rate_ms, source_address)
+
+    def _get_value(self, pgn: int, spn: int, source_address: int = 0, physical: bool = False):
+        raw_value = self.transmitter.get_raw_value(pgn, spn, source_address)
+        if not physical:
+            return raw_value
+        return signaltools.decode_raw(raw_value=raw_value, signal_spec=self._spn_spec(pgn, spn))
+
+
+class ControlClient:
+    """Client of a ControlServer, needing only the Python standard library.
+
+    Requests wait for their reply by default. With wait=False they are pipelined: sent without waiting, with
+    their replies read by sync(), or whenever max_pending replies are outstanding. sync() raises ControlError
+    for the first failed pipelined request."""
+    def __init__(self, address=('127.0.0.1', DEFAULT_PORT), *, timeout: float = 5, max_pending: int = 1000):
+        """address: (host, port) or the path of a Unix domain socket."""
+        if isinstance(address, (str, Path)):
+            self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self._sock.settimeout(timeout)
+            self._sock.connect(str(address))
+        else:
+            self._sock = socket.create_connection(address, timeout)
+            self._sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, True)
+        self._rfile = self._sock.makefile('rb')
+        self.max_pending = max_pending
+        self._next_id = 0
+        self._pending = 0
+        self._error: str = None  # of the first failed pipelined request since the last sync()
+
+    def close(self):
+        self._rfile.close()
+        self._sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _read_reply(self) -> dict:
+        line = self._rfile.readline()
+        if not line:
+            raise ConnectionError('control server closed the connection')
+        return json.loads(line)
+
+    def _read_pending(self):
+        while self._pending:
+            reply = self._read_reply()
+            self._pending -= 1
+            if not reply['ok'] and self._error is None:
+                self._error = reply['error']
+
+    def request(self, op: str, *, wait: bool = True, **params):
+        """Result of a request, None with wait=False."""
+        self._next_id += 1
+        self._sock.sendall(_dumps({'id': self._next_id, 'op': op} | params))
+        if not wait:
+            self._pending += 1
+            if self._pending >= self.max_pending:
+                self._read_pending()
+            return None
+        self._read_pending()
+        reply = self._read_reply()
+        if not reply['ok']:
+            raise ControlError(reply['error'])
+        return reply['result']
+
+    def sync(self):
+        """Wait for the replies of the pipelined requests."""
+        self._read_pending()
+        error, self._error = self._error, None
+        if error is not None:
+            raise ControlError(error)
+
+    def set_values(self, values: dict, source_address: int = 0, *, physical: bool = False, wait: bool = True):
+        """Set SPNs of many PGNs, e.g. {61444: {190: 12000, 513: 150}, 65262: {110: 80}},
+        raw values, or decoded values with physical=True."""
+        self.request('set_values', values=values, source_address=source_address, physical=physical, wait=wait)
+
+    def set_tx_mode(self, mode: str, pgn: int = None, source_address: int = 0, *, wait: bool = True):
+        """mode: 'stop', 'continuous', 'once', or 'per_pgn' (global only), of one PGN or, with pgn None, all."""
+        self.request('set_tx_mode', mode=mode, pgn=pgn, source_address=source_address, wait=wait)
+
+    def set_tx_rate(self, pgn: int, tx_rate_ms: float, source_address: int = 0, *, wait: bool = True):
+        self.request('set_tx_rate', pgn=pgn, tx_rate_ms=tx_rate_ms, source_address=source_address, wait=wait)
+
+    def get_value(self, pgn: int, spn: int, source_address: int = 0, *, physical: bool = False):
+        return self.request('get_value', pgn=pgn, spn=spn, source_address=source_address, physical=physical)
+
+    def source_addresses(self) -> list:
+        return self.request('source_addresses')
+
+    def telemetry(self) -> list[dict]:
+        return self.request('telemetry')
+
+    def ping(self) -> str:
+        return self.request('ping')
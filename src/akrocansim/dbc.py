@@ -2,6 +2,7 @@ from pathlib import Path
 import re
 
 from . import signaltools
+from .codec import PGNCodec
 
 
 def _J1939_dbc(J1939DA: dict, PGNs_SPNs: dict) -> str:
@@ -145,6 +146,7 @@ BA_ "DBName" "Tx_PGNs_SPNs";
 
     for pgn, spns in PGNs_SPNs.items():
         pgn_spec = J1939DA[pgn]
+        pgn_codec = PGNCodec(pgn_spec)
         frame_id = 1 << 31 | pgn_spec['Default Priority'] << 26 | pgn << 8 | 0
         pgn_name = re.sub('\W+', '_', f"{pgn_spec['Acronym']}_{pgn_spec['Parameter Group Label']}")
         pgn_name = '_' + pgn_name[:31] if pgn_name[0].isnumeric() else pgn_name[:32]
@@ -154,12 +156,16 @@ BA_ "DBName" "Tx_PGNs_SPNs";
 
         for spn in spns:
             spn_spec = pgn_spec['SPNs'][spn]
+            try:
+                field = pgn_codec.fields[spn]
+            except KeyError:  # SPN cannot be positioned within the PGN data
+                continue
             spn_name = re.sub('\W+', '_', f"SPN{spn}_{spn_spec['SPN Name']}")[:32]
 
             scale = spn_spec['scale'] if spn_spec['scale'] != 'ENUM' else 1
 
             BO_SG_ += (f" SG_ {spn_name} : "
-                       f"{signaltools.start_bit(signal_spec=spn_spec)}|{spn_spec['length_bits']}@1+ "
+                       f"{field.bit_offset}|{field.length_bits}@1+ "
                        f"({scale},{spn_spec['offset']}) [{spn_spec['min_value']}|{spn_spec['max_value']}] "
                        f'"{spn_spec["unit"]}" Vector__XXX\n')
             if spn_spec['scale'] not in ['ENUM']:
@@ -0,0 +1,231 @@
+"""Signal generators driving SPN values over time, e.g. for soak tests with thousands of SPNs.
+
+All generators are evaluated together on each tick as NumPy arrays: decoded values are encoded
+(scale, offset, clamp to the SPN range) and shifted into place in one pass, and each affected PGN
+is then updated with a single Transmitter.set_bits() call.
+
+Generator values are decoded (physical) values; discrete SPNs are driven with raw values.
+Requires numpy: pip install akrocansim[generators]
+"""
+import threading
+import time
+from typing import NamedTuple
+
+try:
+    import numpy as np
+except ImportError as e:
+    raise ImportError('signal generators require numpy: pip install akrocansim[generators]') from e
+
+from . import signaltools
+from .codec import SPNCodec
+
+
+class Generator(NamedTuple):
+    kind: str
+    params: tuple
+
+
+def ramp(*, start: float, stop: float, period_s: float) -> Generator:
+    """Sawtooth from start to stop over period_s, then again from start."""
+    return Generator('ramp', (start, stop, period_s))
+
+
+def sine(*, mean: float, amplitude: float, period_s: float, phase_deg: float = 0) -> Generator:
+    return Generator('sine', (mean, amplitude, period_s, phase_deg))
+
+
+def square(*, low: float, high: float, period_s: float, duty: float = 0.5) -> Generator:
+    """high for the first duty fraction of each period, low for the rest."""
+    return Generator('square', (low, high, period_s, duty))
+
+
+def steps(*, values: list, dwell_s: float) -> Generator:
+    """Each of values in turn for dwell_s, repeated."""
+    return Generator('steps', (tuple(values), dwell_s))
+
+
+def random_walk(*, start: float, step_std: float) -> Generator:
+    """start plus normally distributed steps (standard deviation step_std per tick), kept within the SPN range."""
+    return Generator('random_walk', (start, step_std))
+
+
+def table(*, times_s: list, values: list) -> Generator:
+    """Linear interpolation of values at increasing times_s, starting at 0, repeated every times_s[-1]."""
+    if len(times_s) != len(values) or len(times_s) < 2 or times_s[0] != 0 \
+            or any(t1 <= t0 for t0, t1 in zip(times_s, times_s[1:])):
+        raise ValueError('table times_s must increase from 0, with one value per time')
+    return Generator('table', (tuple(times_s), tuple(values)))
+
+
+def _numeric_scale(spn_spec):
+    scale, offset = spn_spec.get('scale'), spn_spec.get('offset', 0)
+    if isinstance(scale, (int, float)) and scale and isinstance(offset, (int, float)):
+        return scale, offset
+    return 1, 0  # discrete (ENUM) SPNs
+
+
+class SignalGenerator:
+    def __init__(self, J1939: dict, transmitter, *, rate_hz: float = 100, seed: int = None):
+        self._J1939 = J1939
+        self.transmitter = transmitter
+        self.period_sec = 1 / rate_hz
+        self.ticks = 0
+        self.missed = 0  # ticks skipped because evaluation fell more than a period behind
+        self._rng = np.random.default_rng(seed)
+        self._signals = {}  # {(PGN, source address, SPN): Generator}
+        self._compiled = None
+        self._lock = threading.Lock()
+        self._thread = None
+        self._running = threading.Event()
+
+    def add(self, pgn: int, spn: int, generator: Generator, source_address=0):
+        """Drive an SPN of a PGN registered with the transmitter. Replaces any generator of the SPN."""
+        with self._lock:
+            self._signals[(pgn, source_address, spn)] = generator
+            self._compiled = None
+
+    def remove(self, pgn: int, spn: int, source_address=0):
+        with self._lock:
+            self._signals.pop((pgn, source_address, spn), None)
+            self._compiled = None
+
+    def _compile(self):
+        """Arrays of all signals, ordered by PGN so that the fields of a PGN are contiguous."""
+        J1939 = self._J1939
+        signals = sorted(self._signals.items())
+        n = len(signals)
+        scale, offset = np.empty(n), np.empty(n)
+        raw_min, raw_max = np.empty(n), np.empty(n)
+        shift = np.empty(n, dtype=np.uint64)
+        pgn_keys, pgn_starts, masks = [], [], []
+        by_kind = {}
+
+        for i, ((pgn, source_address, spn), generator) in enumerate(signals):
+            spn_spec = J1939[pgn]['SPNs'][spn]
+            field = SPNCodec.from_spec(spn_spec)
+            scale[i], offset[i] = _numeric_scale(spn_spec)
+            raw_min[i], raw_max[i] = 0, field.max_raw
+            if scale[i] != 1 or offset[i] != 0 or 'min_value' in spn_spec:
+                try:
+                    limits = sorted((signaltools.raw_min_value(signal_spec=spn_spec),
+                                     signaltools.raw_max_value(signal_spec=spn_spec)))
+                    raw_min[i], raw_max[i] = max(limits[0], 0), min(limits[1], field.max_raw)
+                except (KeyError, TypeError):
+                    pass
+            shift[i] = field.bit_offset
+            if not pgn_keys or pgn_keys[-1] != (pgn, source_address):
+                pgn_keys.append((pgn, source_address))
+                pgn_starts.append(i)
+                masks.append(0)
+            masks[-1] |= field.max_raw << field.bit_offset
+            by_kind.setdefault(generator.kind, []).append((i, generator.params))
+
+        wide = any(mask >> 64 for mask in masks)  # PGNs of more than 8 bytes cannot be packed into uint64
+        kinds = {kind: self._compile_kind(kind, entries) for kind, entries in by_kind.items()}
+        return (scale, offset, raw_min, raw_max, shift, np.array(pgn_starts, dtype=np.intp), pgn_keys, masks,
+                wide, kinds)
+
+    def _compile_kind(self, kind, entries):
+        index = np.array([i for i, _ in entries], dtype=np.intp)
+        params = [p for _, p in entries]
+        if kind in ('ramp', 'sine', 'square'):
+            return index, np.array(params, dtype=float).T
+        if kind == 'random_walk':
+            start, step_std = np.array(params, dtype=float).T
+            return index, (start.copy(), step_std)
+        if kind == 'steps':
+            lengths = np.array([len(values) for values, _ in params])
+            starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+            values = np.concatenate([np.array(values, dtype=float) for values, _ in params])
+            dwell = np.array([dwell_s for _, dwell_s in params], dtype=float)
+            return index, (values, starts, lengths, dwell)
+        if kind == 'table':
+            # tables are concatenated; shifting the times of table k by k * span keeps them globally sorted
+            periods = np.array([times_s[-1] for times_s, _ in params], dtype=float)
+            span = periods.max() + 1
+            lengths = np.array([len(times_s) for times_s, _ in params])
+            times = np.concatenate([np.array(times_s, dtype=float) + k * span
+                                    for k, (times_s, _) in enumerate(params)])
+            values = np.concatenate([np.array(values, dtype=float) for _, values in params])
+            ends = np.cumsum(lengths)
+            return index, (times, values, periods, span, ends)
+        raise ValueError(f'unknown generator: {kind}')
+
+    def _evaluate(self, kind, compiled, t):
+        index, params = compiled
+        if kind == 'ramp':
+            start, stop, period = params
+            return start + (stop - start) * (t / period % 1)
+        if kind == 'sine':
+            mean, amplitude, period, phase_deg = params
+            return mean + amplitude * np.sin(2 * np.pi * t / period + np.radians(phase_deg))
+        if kind == 'square':
+            low, high, period, duty = params
+            return np.where(t / period % 1 < duty, high, low)
+        if kind == 'steps':
+            values, starts, lengths, dwell = params
+            return values[starts + (t // dwell).astype(np.intp) % lengths]
+        if kind == 'table':
+            times, values, periods, span, ends = params
+            k = np.arange(len(periods))
+            local_t = k * span + t % periods
+            hi = np.minimum(np.searchsorted(times, local_t, side='right'), ends - 1)
+            lo = hi - 1
+            fraction = (local_t - times[lo]) / (times[hi] - times[lo])
+            return values[lo] + (values[hi] - values[lo]) * np.clip(fraction, 0, 1)
+        # random_walk, kept within the SPN range by the clamp in tick()
+        state, step_std = params
+        state += self._rng.normal(0, 1, len(state)) * step_std
+        return state
+
+    def tick(self, t: float):
+        """Evaluate all generators at t seconds and update the transmitter."""
+        with self._lock:
+            if self._compiled is None:
+                self._compiled = self._compile()
+            scale, offset, raw_min, raw_max, shift, pgn_starts, pgn_keys, masks, wide, kinds = self._compiled
+            if not pgn_keys:
+                return
+            decoded = np.empty(len(scale))
+            for kind, compiled in kinds.items():
+                decoded[compiled[0]] = self._evaluate(kind, compiled, t)
+
+            raw = np.clip(np.rint((decoded - offset) / scale), raw_min, raw_max)
+            if 'random_walk' in kinds:
+                # keep the walk within the SPN range
+                index, (state, _) = kinds['random_walk']
+                state[:] = raw[index] * scale[index] + offset[index]
+
+            if wide:
+                fields = [int(value) << int(s) for value, s in zip(raw, shift)]
+                ends = list(pgn_starts[1:]) + [len(fields)]
+                bits = [sum(fields[start:end]) for start, end in zip(pgn_starts, ends)]
+            else:
+                bits = np.bitwise_or.reduceat(raw.astype(np.uint64) << shift, pgn_starts).tolist()
+        self.transmitter.set_bits(dict(zip(pgn_keys, zip(masks, bits))))
+        self.ticks += 1
+
+    def start(self):
+        if self._thread is None:
+            self._running.set()
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._running.clear()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        started = next_due = time.monotonic()
+        while self._running.is_set():
+            self.tick(next_due - started)
+            next_due += self.period_sec
+            now = time.monotonic()
+            if now > next_due:
+                # skip the ticks already missed, keeping later ticks aligned to the original time base
+                skipped = int((now - next_due) / self.period_sec) + 1
+                self.missed += skipped
+                next_due += skipped * self.period_sec
+            time.sleep(max(0.0, next_due - time.monotonic()))
@@ -1,17 +1,22 @@
 import webbrowser
 import os
+import time
 
 import dearpygui.dearpygui as dpg
 
 from .__init__ import __version__, __app_name__
 from . import version_check
 from . import signaltools
-from .transmitter import Transmitter
+from . import canid
+from .telemetry import TELEMETRY_COLUMNS
+from .channels import Channels
 from .config import Config
+from .control import ControlServer, MIN_TX_RATE_MS, MAX_TX_RATE_MS
 
 VIEWPORT_WIDTH = 1500
 VIEWPORT_HEIGHT = 650
 WINDOW_WIDTH = VIEWPORT_WIDTH - 16
+TELEMETRY_REFRESH_SEC = 0.5
 
 
 def _hyperlink(text, address):
@@ -19,10 +24,13 @@ def _hyperlink(text, address):
     dpg.bind_item_theme(b, "__demo_hyperlinkTheme")
 
 class AkrocansimGui:
-    def __init__(self):
-        self.config = Config()
-        self.transmitter = None
+    def __init__(self, config_dir=None):
+        self.config = Config(config_dir)
+        self.channels: Channels = None
+        self.control_server: ControlServer = None
         self.J1939: dict = None
+        self._telemetry_refreshed = 0
+        self._tx_messages_refreshed = 0
 
         self.gui_main()
 
@@ -50,10 +58,17 @@ class AkrocansimGui:
 
         dpg.setup_dearpygui()
         dpg.show_viewport()
-        dpg.start_dearpygui()
+        while dpg.is_dearpygui_running():
+            self.refresh_telemetry_window()
+            self.refresh_inspection_messages()
+            self.refresh_tx_messages()
+            dpg.render_dearpygui_frame()
 
         dpg.destroy_context()
-        self.config.disconnect_can()
+        if self.control_server is not None:
+            self.control_server.stop()
+        if self.channels is not None:
+            self.channels.shutdown()  # stops recording and disconnects
 
     def make_menu_bar(self):
         with dpg.viewport_menu_bar():
@@ -73,6 +88,12 @@ class AkrocansimGui:
             with dpg.menu(label='CAN interface'):
                 dpg.add_menu_item(label='Connect', callback=lambda: self.add_messages(self.connect_can()))
                 dpg.add_menu_item(label='Disconnect', callback=lambda: self.add_messages(self.disconnect_can()))
+            with dpg.menu(label='Recording'):
+                dpg.add_menu_item(label='Start', callback=lambda: self.add_messages(self.start_recording()))
+                dpg.add_menu_item(label='Stop', callback=lambda: self.add_messages(self.stop_recording()))
+            with dpg.menu(label='Telemetry'):
+                dpg.add_menu_item(label='Show Tx telemetry', callback=self.make_telemetry_window)
+                dpg.add_menu_item(label='Save Tx telemetry as CSV', callback=self.dump_telemetry_csv)
             with dpg.menu(label='Help'):
                 dpg.add_menu_item(label='Report a problem',
                                   callback=lambda: webbrowser.open('https://github.com/cfsok/akrocansim/issues'))
@@ -99,19 +120,89 @@ class AkrocansimGui:
             _hyperlink('openpyxl', 'https://openpyxl.readthedocs.io/')
 
     def connect_can(self):
-        msg = self.config.connect_can()
-        self.transmitter.bus = self.config.bus
-        return msg
+        return self.channels.connect()
 
     def disconnect_can(self):
-        msg = self.config.disconnect_can()
-        self.transmitter.bus = None
-        return msg
+        return self.channels.disconnect()
+
+    def start_recording(self):
+        recording = self.channels.recorder_telemetry()
+        if recording:
+            return [f"INFO: already recording to: {telemetry['file']}" for telemetry in recording.values()]
+        path, options = self.config.new_recording()
+        return [f'INFO: recording to: {path}' for path in self.channels.start_recording(path, **options)]
+
+    def stop_recording(self):
+        telemetry = self.channels.stop_recording()
+        if telemetry is None:
+            return 'INFO: not recording'
+        return (f"INFO: recording stopped, {telemetry['frames written']} frames written, "
+                f"{telemetry['frames dropped']} dropped")
 
     def dump_tx_PGNs_SPNs_dbc(self, sender, app_data, user_data):
         message = self.config.dump_tx_PGNs_SPNs_dbc()
         self.add_messages(message)
 
+    def dump_telemetry_csv(self, sender, app_data, user_data):
+        self.channels.dump_telemetry_csv(self.config.tx_telemetry_csv)
+        self.add_messages(f'INFO: telemetry file created: {self.config.tx_telemetry_csv}')
+
+    def make_telemetry_window(self):
+        if dpg.does_item_exist('telemetry_window'):
+            dpg.delete_item('telemetry_window')
+        with dpg.window(tag='telemetry_window', label='Tx telemetry', pos=(100, 150), width=WINDOW_WIDTH - 200,
+                        height=400):
+            with dpg.table(header_row=True, resizable=True,
+                           borders_outerV=True, borders_outerH=True, borders_innerH=True, borders_innerV=True):
+                for column in TELEMETRY_COLUMNS:
+                    dpg.add_table_column(label=column.upper())
+                for row in self.channels.telemetry():
+                    with dpg.table_row():
+                        for column in TELEMETRY_COLUMNS:
+                            dpg.add_text(tag=f"telemetry_{row['CAN ID']}_{column}")
+            dpg.add_spacer(height=10)
+            dpg.add_text('Transport protocol (PGNs with more than 8 data bytes):')
+            dpg.add_text(tag='telemetry_transport')
+            dpg.add_spacer(height=10)
+            dpg.add_text('Channels (throughput and bus load of the frames sent and received, Request PGN responses):')
+            dpg.add_text(tag='telemetry_channels')
+            dpg.add_spacer(height=10)
+            dpg.add_text('Recording:')
+            dpg.add_text(tag='telemetry_recorder')
+        self._telemetry_refreshed = 0
+
+    def refresh_telemetry_window(self):
+        now = time.monotonic()
+        if now - self._telemetry_refreshed < TELEMETRY_REFRESH_SEC or not dpg.does_item_exist('telemetry_window'):
+            return
+        self._telemetry_refreshed = now
+        for row in self.channels.telemetry():
+            for column in TELEMETRY_COLUMNS:
+                tag = f"telemetry_{row['CAN ID']}_{column}"
+                if dpg.does_item_exist(tag):
+                    value = row.get(column)
+                    dpg.set_value(tag, '' if value is None else str(value))
+        dpg.set_value('telemetry_transport', '\n'.join(', '.join(f'{key}: {value}' for key, value in row.items())
+                                                       for row in self.channels.transport_telemetry()))
+        dpg.set_value('telemetry_channels', '\n'.join(', '.join(f'{key}: {value}' for key, value in row.items())
+                                                      for row in self.channels.channel_telemetry()))
+        recorder_telemetry = self.channels.recorder_telemetry()
+        dpg.set_value('telemetry_recorder', 'not recording' if not recorder_telemetry else
+                      '\n'.join(', '.join(f'{key}: {value}' for key, value in telemetry.items())
+                                for telemetry in recorder_telemetry.values()))
+
+    def refresh_tx_messages(self):
+        now = time.monotonic()
+        if now - self._tx_messages_refreshed < TELEMETRY_REFRESH_SEC or self.channels is None:
+            return
+        self._tx_messages_refreshed = now
+        self.add_messages(self.channels.pop_messages())
+
+    def refresh_inspection_messages(self):
+        inspection_export = self.config.inspection_export
+        while inspection_export is not None and inspection_export.messages:
+            self.add_messages(inspection_export.messages.popleft())
+
     def make_app_log_window(self):
         with dpg.window(pos=(570, 19), width=914, no_close=True, no_title_bar=True, no_move=True, no_resize=True):
             dpg.add_text(tag='log')
@@ -130,15 +221,33 @@ class AkrocansimGui:
         dpg.set_value('log', _messages)
 
     def make_tx_dashboard(self):
+        if self.control_server is not None:
+            self.control_server.stop()
+        was_connected = False
+        if self.channels is not None:
+            if self.channels.recorder_telemetry():
+                self.add_messages(self.stop_recording())
+            was_connected = self.channels.is_connected()
+            self.channels.shutdown()
         self.add_messages(self.config.load())
         self.J1939 = self.config.J1939_spec
-        self.transmitter = Transmitter(self.J1939)
+        self.channels = Channels(self.J1939, self.config.can_channels, self.config.node_channels(),
+                                 engine=self.config.tx_engine, transmitter_options=self.config.transmitter_options,
+                                 receiver_options=self.config.receiver_options)
+        # SPN values set through the control server are not shown by the SPN widgets
+        self.control_server = self.config.new_control_server(self.J1939, self.channels)
+        if self.control_server is not None:
+            self.add_messages(self.control_server.start())
         if dpg.does_item_exist('global_tx_window'):
             dpg.delete_item('global_tx_window')
         self.make_PGN_global_tx_window()
         if dpg.does_item_exist('transmitter_window'):
             dpg.delete_item('transmitter_window')
         self.make_transmitter_window()
+        if was_connected:
+            self.add_messages(self.connect_can())
+        if dpg.does_item_exist('telemetry_window'):
+            self.make_telemetry_window()
 
     def make_PGN_global_tx_window(self):  # put user_data='all PGNs' to tag
         with dpg.window(tag='global_tx_window', pos=(0, 19), width=570, no_close=True, no_title_bar=True, no_move=True, no_resize=True):
@@ -153,30 +262,32 @@ class AkrocansimGui:
         match tx_mode:
             case 'Stop All':
                 dpg.show_item('global_tx_once')
-                self.transmitter.set_tx_mode_stop()
+                self.channels.set_tx_mode_stop()
             case 'Tx All':
                 dpg.hide_item('global_tx_once')
-                self.transmitter.set_tx_mode_continuous()
+                self.channels.set_tx_mode_continuous()
             case 'Use PGN Settings':
                 dpg.show_item('global_tx_once')
-                self.transmitter.set_tx_mode_per_PGN()
+                self.channels.set_tx_mode_per_PGN()
 
     def global_tx_once_invoked(self, sender, app_data, user_data):
-        self.transmitter.set_tx_once()
+        self.channels.set_tx_once()
 
     def make_transmitter_window(self):
         with dpg.window(tag='transmitter_window', label='Tx signals', width=WINDOW_WIDTH, pos=(0, 119), height=500, no_close=True):
-            for pgn, spns in self.config.tx_PGNs_SPNs.items():
-                self.add_pgn(pgn, spns)
+            for source_address, node in self.config.tx_nodes.items():
+                for pgn, spns in node['Tx_PGNs_SPNs'].items():
+                    self.add_pgn(pgn, spns, source_address, node['name'])
 
-    def add_pgn(self, pgn, spns: list):
+    def add_pgn(self, pgn, spns: list, sa=0, node_name='default'):
         priority = self.J1939[pgn]['Default Priority']
-        source_address = 0
-        self.transmitter.register_tx_PGN(pgn=pgn, priority=priority, source_address=source_address,
+        self.channels.register_tx_PGN(pgn=pgn, priority=priority, source_address=sa,
                                          tx_rate_ms=self.J1939[pgn]['transmission_rate_ms'])
 
-        pgn_label = (f"PGN {pgn} - CAN ID: {priority << 26 | pgn << 8 | source_address:08X} "
+        pgn_label = (f"PGN {pgn} - CAN ID: {canid.can_id(priority=priority, pgn=pgn, source_address=sa):08X} "
                      f"- {self.J1939[pgn]['Acronym']} - {self.J1939[pgn]['Parameter Group Label']}")
+        if len(self.config.tx_nodes) > 1:
+            pgn_label = f'{node_name} (SA {sa}) - {pgn_label}'
         with (dpg.collapsing_header(label=pgn_label, default_open=True)):
 
             continuous_signals_present = False
@@ -204,8 +315,8 @@ class AkrocansimGui:
                                 # SIGNAL - decoded value, direct entry, decrement, decrement
                                 max_value = (2 ** spn_spec['length_bits'] - 1) * spn_spec['scale'] + spn_spec['offset']
                                 if type(spn_spec['scale']) is int:
-                                    dpg.add_input_int(tag=f'{pgn}_{spn}_input', width=140,
-                                                      user_data=(pgn, spn, spn_spec),
+                                    dpg.add_input_int(tag=f'{sa}_{pgn}_{spn}_input', width=140,
+                                                      user_data=(sa, pgn, spn, spn_spec),
                                                       default_value=spn_spec['min_value'],
                                                       min_value=spn_spec['offset'],
                                                       max_value=max_value,
@@ -214,8 +325,8 @@ class AkrocansimGui:
                                                       callback=self.continuous_spn_input_int_changed,
                                                       on_enter=True)
                                 elif type(spn_spec['scale']) is float:
-                                    dpg.add_input_float(tag=f'{pgn}_{spn}_input', width=140,
-                                                        user_data=(pgn, spn, spn_spec),
+                                    dpg.add_input_float(tag=f'{sa}_{pgn}_{spn}_input', width=140,
+                                                        user_data=(sa, pgn, spn, spn_spec),
                                                         format=f"%.{spn_spec['n_decimals']}f",
                                                         default_value=spn_spec['min_value'],
                                                         min_value=spn_spec['offset'],
@@ -232,17 +343,17 @@ class AkrocansimGui:
                                 dpg.add_text(f"{unit if unit is not None else ''}".ljust(10))
 
                                 # RAW HEX
-                                dpg.add_text(tag=f'{spn}_hex')
+                                dpg.add_text(tag=f'{sa}_{pgn}_{spn}_hex')
 
                                 # RAW DECIMAL
                                 min_value = signaltools.raw_min_value(signal_spec=spn_spec)
-                                dpg.add_slider_int(tag=str(spn), user_data=(pgn, spn, spn_spec),
+                                dpg.add_slider_int(tag=f'{sa}_{pgn}_{spn}', user_data=(sa, pgn, spn, spn_spec),
                                                    label=f"SPN {spn}: {spn_spec['SPN Name']}",
                                                    min_value=min_value,
                                                    max_value=signaltools.raw_max_value(signal_spec=spn_spec),
                                                    default_value=signaltools.raw_min_value(signal_spec=spn_spec),
                                                    callback=self.continuous_spn_slider_changed)
-                            self.continuous_spn_slider_changed(str(spn), min_value, (pgn, spn, spn_spec))
+                            self.continuous_spn_slider_changed(f'{sa}_{pgn}_{spn}', min_value, (sa, pgn, spn, spn_spec))
 
             if enum_signals_present:
                 with dpg.table(header_row=True, resizable=True,
@@ -257,90 +368,93 @@ class AkrocansimGui:
                         if spn_spec['scale'] == 'ENUM':
                             with dpg.table_row():
                                 # DECIMAL
-                                dpg.add_input_int(tag=str(spn), width=140, user_data=(pgn, spn, spn_spec),
+                                dpg.add_input_int(tag=f'{sa}_{pgn}_{spn}', width=140, user_data=(sa, pgn, spn, spn_spec),
                                                   min_value=0, max_value=2 ** spn_spec['length_bits'] - 1,
                                                   min_clamped=True, max_clamped=True,
                                                   callback=self.discrete_spn_input_int_changed,
                                                   on_enter=True)
 
                                 # BINARY
-                                dpg.add_text(tag=f'{spn}_bin')
+                                dpg.add_text(tag=f'{sa}_{pgn}_{spn}_bin')
 
                                 # HEX
-                                dpg.add_text(tag=f'{spn}_hex')
+                                dpg.add_text(tag=f'{sa}_{pgn}_{spn}_hex')
 
                                 # OPTIONS
                                 labels = [label for label in spn_spec['discrete_values'].values()]
-                                dpg.add_combo(tag=f'{pgn}_{spn}_combo', items=labels, user_data=(pgn, spn, spn_spec),
+                                dpg.add_combo(tag=f'{sa}_{pgn}_{spn}_combo', items=labels, user_data=(sa, pgn, spn, spn_spec),
                                               default_value=signaltools.get_label(signal_spec=spn_spec, value=0),
                                               label=f"SPN {spn}: {spn_spec['SPN Name']}",
                                               callback=self.discrete_spn_combo_changed)
-                            self.discrete_spn_input_int_changed(str(spn), 0, (pgn, spn, spn_spec))
+                            self.discrete_spn_input_int_changed(f'{sa}_{pgn}_{spn}', 0, (sa, pgn, spn, spn_spec))
 
             with dpg.group(horizontal=True):
                 dpg.add_text('Tx mode:')
-                dpg.add_checkbox(tag=f'{pgn}_tx_mode', label='Continuous',
-                                 user_data=pgn, callback=self.pgn_tx_mode_changed)
+                dpg.add_checkbox(tag=f'{sa}_{pgn}_tx_mode', label='Continuous',
+                                 user_data=(sa, pgn), callback=self.pgn_tx_mode_changed)
                 dpg.add_spacer(width=10)
                 dpg.add_input_int(label='ms', default_value=self.J1939[pgn]['transmission_rate_ms'],
-                                  min_value=10, max_value=50000, min_clamped=True, max_clamped=True,
-                                  step=10, step_fast=100, width=90,
-                                  user_data=pgn, callback=self.pgn_tx_rate_changed)
+                                  min_value=MIN_TX_RATE_MS, max_value=MAX_TX_RATE_MS,
+                                  min_clamped=True, max_clamped=True, step=10, step_fast=100, width=90,
+                                  user_data=(sa, pgn), callback=self.pgn_tx_rate_changed)
                 dpg.add_spacer(width=10)
-                dpg.add_button(tag=f'{pgn}_tx_once', label='Tx Once',
-                               user_data=pgn, callback=self.pgn_tx_once_invoked)
+                dpg.add_button(tag=f'{sa}_{pgn}_tx_once', label='Tx Once',
+                               user_data=(sa, pgn), callback=self.pgn_tx_once_invoked)
 
             dpg.add_spacer(height=10)
 
-    def pgn_tx_mode_changed(self, sender, cont_tx, pgn):
+    def pgn_tx_mode_changed(self, sender, cont_tx, sa__pgn):
+        sa, pgn = sa__pgn
         if cont_tx:
-            dpg.hide_item(f'{pgn}_tx_once')
-            self.transmitter.set_tx_mode_continuous(pgn)
+            dpg.hide_item(f'{sa}_{pgn}_tx_once')
+            self.channels.set_tx_mode_continuous(pgn, source_address=sa)
         else:
-            dpg.show_item(f'{pgn}_tx_once')
-            self.transmitter.set_tx_mode_stop(pgn)
+            dpg.show_item(f'{sa}_{pgn}_tx_once')
+            self.channels.set_tx_mode_stop(pgn, source_address=sa)
 
-    def pgn_tx_once_invoked(self, sender, app_data, pgn):
-        self.transmitter.set_tx_once(pgn)
+    def pgn_tx_once_invoked(self, sender, app_data, sa__pgn):
+        sa, pgn = sa__pgn
+        self.channels.set_tx_once(pgn, source_address=sa)
 
-    def pgn_tx_rate_changed(self, sender, tx_rate_ms, pgn):
-        self.transmitter.modify_pgn_tx_rate(pgn, tx_rate_ms)
+    def pgn_tx_rate_changed(self, sender, tx_rate_ms, sa__pgn):
+        sa, pgn = sa__pgn
+        self.channels.modify_pgn_tx_rate(pgn, tx_rate_ms, source_address=sa)
 
-    def continuous_spn_slider_changed(self, sender, raw_value, pgn__spn__spn_spec):
-        pgn, spn, signal_spec = pgn__spn__spn_spec
-        self.transmitter.modify_pgn_data(pgn, spn, raw_value)
+    def continuous_spn_slider_changed(self, sender, raw_value, sa__pgn__spn__spn_spec):
+        sa, pgn, spn, signal_spec = sa__pgn__spn__spn_spec
+        self.channels.modify_pgn_data(pgn, spn, raw_value, source_address=sa)
 
         decoded_value = signaltools.decode(raw_value=raw_value, scale=signal_spec['scale'], offset=signal_spec['offset'])
         # :4.{len(str(J1939[pgn]['SPNs'][spn]['scale']).split('.')[1])}f
-        dpg.set_value(f'{pgn}_{spn}_input', decoded_value)
+        dpg.set_value(f'{sa}_{pgn}_{spn}_input', decoded_value)
         # dpg.set_item_user_data(f'{pgn}_{spn}_input', decoded_value)
 
         match signal_spec['length_bits']:
             case 1 | 2 | 3 | 4:
                 nimble = f'{raw_value:X}'
-                dpg.set_value(f'{spn}_hex', f'   [{nimble}]             ')
+                dpg.set_value(f'{sa}_{pgn}_{spn}_hex', f'   [{nimble}]             ')
             case 5 | 6 | 7 | 8:
                 byte = f'{raw_value:02X}'
-                dpg.set_value(f'{spn}_hex', f'   [{byte}]            ')
+                dpg.set_value(f'{sa}_{pgn}_{spn}_hex', f'   [{byte}]            ')
             case 16:
                 all_bytes = f'{raw_value:04X}'
                 byte1 = all_bytes[2:4]
                 byte2 = all_bytes[0:2]
-                dpg.set_value(f'{spn}_hex', f'LSB[{byte1} {byte2}]MSB      ')
+                dpg.set_value(f'{sa}_{pgn}_{spn}_hex', f'LSB[{byte1} {byte2}]MSB      ')
             case 32:
                 all_bytes = f'{raw_value:08X}'
                 byte1 = all_bytes[6:8]
                 byte2 = all_bytes[4:6]
                 byte3 = all_bytes[2:4]
                 byte4 = all_bytes[0:2]
-                dpg.set_value(f'{spn}_hex', f'LSB[{byte1} {byte2} {byte3} {byte4}]MSB')
+                dpg.set_value(f'{sa}_{pgn}_{spn}_hex', f'LSB[{byte1} {byte2} {byte3} {byte4}]MSB')
 
-    def continuous_spn_input_int_changed(self, sender, real_value, pgn__spn__spn_spec):
-        pgn, spn, spn_spec = pgn__spn__spn_spec
+    def continuous_spn_input_int_changed(self, sender, real_value, sa__pgn__spn__spn_spec):
+        sa, pgn, spn, spn_spec = sa__pgn__spn__spn_spec
         raw_value = signaltools.encode(decoded_value=real_value, scale=spn_spec['scale'], offset=spn_spec['offset'])
-        slider_tag = str(spn)
+        slider_tag = f'{sa}_{pgn}_{spn}'
         dpg.set_value(slider_tag, raw_value)
-        self.continuous_spn_slider_changed(slider_tag, raw_value, pgn__spn__spn_spec)
+        self.continuous_spn_slider_changed(slider_tag, raw_value, sa__pgn__spn__spn_spec)
 
         #if new_value > old_value:
         #    ...
@@ -349,24 +463,24 @@ class AkrocansimGui:
         #    dpg.set_value(spn, dpg.get_value(spn) - 1)
         #    dpg.set_item_user_data(sender, new_value)
 
-    def discrete_spn_input_int_changed(self, sender, raw_value, pgn__spn__spn_spec):
-        pgn, spn, signal_spec = pgn__spn__spn_spec
-        self.transmitter.modify_pgn_data(pgn, spn, raw_value)
-        dpg.set_value(f'{pgn}_{spn}_combo', signaltools.get_label(signal_spec=signal_spec, value=raw_value))
+    def discrete_spn_input_int_changed(self, sender, raw_value, sa__pgn__spn__spn_spec):
+        sa, pgn, spn, signal_spec = sa__pgn__spn__spn_spec
+        self.channels.modify_pgn_data(pgn, spn, raw_value, source_address=sa)
+        dpg.set_value(f'{sa}_{pgn}_{spn}_combo', signaltools.get_label(signal_spec=signal_spec, value=raw_value))
 
         match signal_spec['length_bits']:
             case 1 | 2 | 3 | 4 as length_bits:
                 nibble = f'{raw_value:X}'
-                dpg.set_value(f'{spn}_bin', f"{raw_value:0{length_bits}b}".ljust(10))
-                dpg.set_value(f'{spn}_hex', f'    [{nibble}]            ')
+                dpg.set_value(f'{sa}_{pgn}_{spn}_bin', f"{raw_value:0{length_bits}b}".ljust(10))
+                dpg.set_value(f'{sa}_{pgn}_{spn}_hex', f'    [{nibble}]            ')
             case 5 | 6 | 7 | 8 as length_bits:
                 byte = f'{raw_value:02X}'
-                dpg.set_value(f'{spn}_bin', f"{raw_value:0{length_bits}b}".ljust(10))
-                dpg.set_value(f'{spn}_hex', f'   [{byte}]            ')
+                dpg.set_value(f'{sa}_{pgn}_{spn}_bin', f"{raw_value:0{length_bits}b}".ljust(10))
+                dpg.set_value(f'{sa}_{pgn}_{spn}_hex', f'   [{byte}]            ')
 
-    def discrete_spn_combo_changed(self, sender, real_value, pgn__spn__spn_spec):
-        pgn, spn, spn_spec = pgn__spn__spn_spec
+    def discrete_spn_combo_changed(self, sender, real_value, sa__pgn__spn__spn_spec):
+        sa, pgn, spn, spn_spec = sa__pgn__spn__spn_spec
         raw_value = signaltools.get_label_value(signal_spec=spn_spec, label=real_value)
-        input_int_widget = str(spn)
+        input_int_widget = f'{sa}_{pgn}_{spn}'
         dpg.set_value(input_int_widget, raw_value)
-        self.discrete_spn_input_int_changed(input_int_widget, raw_value, pgn__spn__spn_spec)
+        self.discrete_spn_input_int_changed(input_int_widget, raw_value, sa__pgn__spn__spn_spec)
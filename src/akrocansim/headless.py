@@ -0,0 +1,110 @@
+"""Simulator without GUI, e.g. for test benches without a display.
+
+Transmits all configured PGNs of all nodes continuously on their channels and answers Request PGNs,
+optionally running scenario scripts and the control server.
+Neither dearpygui nor openpyxl is imported, unless the J1939DA has not been parsed yet or has changed.
+"""
+import asyncio
+import time
+
+from .channels import Channels
+from .config import Config
+from .control import ControlServer
+from .scenario import Simulation, load_scenarios, run_scenarios
+
+
+class HeadlessSimulator:
+    def __init__(self, config: Config):
+        self.config = config
+        self.channels: Channels = None
+        self.control_server: ControlServer = None
+
+    def start(self, *, receive_all: bool = False) -> list[str]:
+        """receive_all: disable the acceptance filters, e.g. for scenarios waiting for frames of other nodes."""
+        messages = self.config.load()
+        J1939 = self.config.J1939_spec
+        if J1939 is None or not self.config.tx_nodes:
+            return messages
+
+        receiver_options = self.config.receiver_options | ({'acceptance_filters': False} if receive_all else {})
+        self.channels = Channels(J1939, self.config.can_channels, self.config.node_channels(),
+                                 engine=self.config.tx_engine, transmitter_options=self.config.transmitter_options,
+                                 receiver_options=receiver_options)
+        for source_address, node in self.config.tx_nodes.items():
+            for pgn in node['Tx_PGNs_SPNs']:
+                self.channels.register_tx_PGN(pgn=pgn, priority=J1939[pgn]['Default Priority'],
+                                              source_address=source_address,
+                                              tx_rate_ms=J1939[pgn]['transmission_rate_ms'])
+
+        messages.extend(self.channels.connect())
+        if self.channels.is_connected():
+            self.channels.set_tx_mode_continuous()
+        self.control_server = self.config.new_control_server(J1939, self.channels)
+        if self.control_server is not None:
+            messages.append(self.control_server.start())
+        return messages
+
+    def is_connected(self) -> bool:
+        return self.channels is not None and self.channels.is_connected()
+
+    def record(self, path) -> list:
+        """Record sent and received frames to path, in the format given by its suffix. Returns the paths written,
+        one per channel."""
+        options = dict(self.config.recorder_options)
+        options.pop('format', None)
+        return self.channels.start_recording(path, **options)
+
+    def stop(self):
+        if self.control_server is not None:
+            self.control_server.stop()
+        if self.channels is not None:
+            self.channels.shutdown()
+
+
+def main(*, config_dir=None, duration: float = None, telemetry_csv=None, record=None, scenarios=None) -> int:
+    """Run until interrupted, for duration seconds, or until the scenarios of the given files complete.
+    Returns the process exit status."""
+    scenario_functions = []
+    for path in scenarios or []:
+        try:
+            scenario_functions.extend(load_scenarios(path))
+        except Exception as e:
+            print(f'ERROR: scenario file {path} - {type(e).__name__}: {e}', flush=True)
+            return 1
+
+    simulator = HeadlessSimulator(Config(config_dir))
+    messages = simulator.start(receive_all=bool(scenario_functions))
+    for msg in messages:
+        print(msg, flush=True)
+    if not simulator.is_connected() or any(msg.startswith('ERROR') for msg in messages):
+        simulator.stop()
+        return 1
+    if record is not None:
+        for path in simulator.record(record):
+            print(f'INFO: recording to: {path}', flush=True)
+
+    status = 0
+    try:
+        if scenario_functions:
+            sim = Simulation(simulator.config.J1939_spec, simulator.channels, simulator.channels)
+            for msg in asyncio.run(run_scenarios(sim, scenario_functions)):
+                print(msg, flush=True)
+                if msg.startswith('ERROR'):
+                    status = 1
+        elif duration is None:
+            while True:
+                time.sleep(1)
+        else:
+            time.sleep(duration)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for msg in simulator.channels.pop_messages():
+            print(msg, flush=True)
+        if telemetry_csv is not None:
+            simulator.channels.dump_telemetry_csv(telemetry_csv)
+            print(f'INFO: telemetry file created: {telemetry_csv}', flush=True)
+        for row in simulator.channels.channel_telemetry():
+            print('INFO: ' + ', '.join(f'{key}: {value}' for key, value in row.items()), flush=True)
+        simulator.stop()
+    return status
@@ -0,0 +1,118 @@
+"""Receive path: answers Request PGN 59904 for the PGNs registered with the Transmitter
+and feeds transport protocol connection management frames to the Transmitter's transport layer."""
+import time
+from collections import deque
+
+import can
+
+from . import canid
+from .telemetry import _percentile
+from .transport import TP_CM_PGN
+
+
+REQUEST_PGN = 0xEA00  # 59904
+ACKNOWLEDGEMENT_PGN = 0xE800  # 59392
+_ACK_CONTROL_NACK = 1
+
+
+class Receiver(can.Listener):
+    def __init__(self, transmitter, *, respond_to_requests: bool = True, acceptance_filters: bool = True,
+                 latency_window: int = 1000):
+        """acceptance_filters: program the interface to pass only requests and transport protocol frames
+        addressed to the simulated nodes. Disable to let listeners see all bus traffic."""
+        self.transmitter = transmitter
+        self.respond_to_requests = respond_to_requests
+        self.acceptance_filters = acceptance_filters
+        self.listeners = []  # further can.Listener instances fed with every received frame
+        self.bus: can.BusABC = None
+        self._notifier: can.Notifier = None
+
+        self.requests_received = 0
+        self.responses_sent = 0
+        self.nacks_sent = 0
+        self.latency = deque(maxlen=latency_window)  # request received to response sent, seconds
+
+    def start(self, bus: can.BusABC):
+        self.stop()
+        self.bus = bus
+        if self.acceptance_filters:
+            bus.set_filters(self.filters())
+        self._notifier = can.Notifier(bus, [self], timeout=0.1)
+
+    def stop(self):
+        # can.Notifier.stop() calls stop() of its listeners, so the notifier is released first
+        notifier, self._notifier = self._notifier, None
+        if notifier is not None:
+            notifier.stop()
+        self.bus = None
+
+    def filters(self) -> list[dict]:
+        """Acceptance filters for requests and transport protocol frames addressed to the simulated nodes."""
+        filters = [{'can_id': (REQUEST_PGN | canid.GLOBAL_ADDRESS) << 8, 'can_mask': 0x00FFFF00, 'extended': True}]
+        for source_address in self.transmitter.source_addresses():
+            for pgn in (REQUEST_PGN, TP_CM_PGN):
+                filters.append({'can_id': (pgn | source_address) << 8, 'can_mask': 0x00FFFF00, 'extended': True})
+        return filters
+
+    def on_message_received(self, msg: can.Message):
+        received = time.perf_counter()
+        if msg.is_extended_id and not msg.is_error_frame and not msg.is_remote_frame:
+            pgn = canid.pgn(msg.arbitration_id)
+            if pgn == REQUEST_PGN and self.respond_to_requests and len(msg.data) >= 3:
+                self._respond(msg, received)
+            elif pgn == TP_CM_PGN:
+                self.transmitter.transport.on_message_received(msg)
+        for listener in self.listeners:
+            listener.on_message_received(msg)
+
+    def _respond(self, msg: can.Message, received: float):
+        requested_pgn = int.from_bytes(msg.data[:3], 'little')
+        destination_address = canid.destination_address(msg.arbitration_id)
+        requester = canid.source_address(msg.arbitration_id)
+        self.requests_received += 1
+
+        if destination_address == canid.GLOBAL_ADDRESS:
+            source_addresses = [source_address for source_address in self.transmitter.source_addresses()
+                                if (requested_pgn, source_address) in self.transmitter.J1939_CAN_IDs]
+        elif destination_address in self.transmitter.source_addresses():
+            source_addresses = [destination_address]
+        else:
+            return
+
+        for source_address in source_addresses:
+            if (requested_pgn, source_address) in self.transmitter.J1939_CAN_IDs:
+                if self.transmitter.send_on_request(requested_pgn, source_address=source_address, requester=requester,
+                                                    to_global=destination_address == canid.GLOBAL_ADDRESS):
+                    self.responses_sent += 1
+                    self.latency.append(time.perf_counter() - received)
+            elif self.bus is not None:
+                # a destination specific request of an unsupported PGN is answered with a NACK
+                self._send(can.Message(
+                    arbitration_id=canid.can_id(priority=6, pgn=ACKNOWLEDGEMENT_PGN, source_address=source_address,
+                                                destination_address=canid.GLOBAL_ADDRESS),
+                    is_extended_id=True,
+                    data=bytes([_ACK_CONTROL_NACK, 0xFF, 0xFF, 0xFF, requester]) + requested_pgn.to_bytes(3, 'little')))
+                self.nacks_sent += 1
+
+    def _send(self, msg: can.Message):
+        try:
+            self.bus.send(msg)
+        except can.CanOperationError:
+            return
+        for listener in self.transmitter.tx_listeners:
+            listener(msg)
+
+    def telemetry(self) -> dict:
+        latency = sorted(self.latency)
+
+        def us(value):
+            return None if value is None else round(value * 1_000_000)
+
+        return {
+            'requests received': self.requests_received,
+            'responses sent': self.responses_sent,
+            'NACKs sent': self.nacks_sent,
+            'latency p50 us': us(_percentile(latency, 50)),
+            'latency p99 us': us(_percentile(latency, 99)),
+            'latency max us': us(latency[-1]) if latency else None
+        }
@@ -0,0 +1,112 @@
+"""Recording of the frames sent and received by akrocansim, in any log format written by python-can
+(.blf, .asc, .csv, .log candump, ...), chosen by the file suffix.
+
+Sending and receiving threads only append to a bounded queue, without locks and without blocking;
+a background thread writes the frames. When the writer falls behind and the queue is full, new
+frames are dropped and counted, so recording never delays a transmission.
+"""
+import threading
+import time
+from collections import deque
+from pathlib import Path
+
+import can
+
+_IDLE_SLEEP_SEC = 0.01
+
+
+class Recorder(can.Listener):
+    def __init__(self, path, *, max_queue: int = 100_000, rotate_mb: float = 0, rotate_min: float = 0):
+        """rotate_mb, rotate_min: start a new file after this size / time, 0 to write a single file.
+        Rotated files are numbered, e.g. rec.blf is written as rec_000.blf, rec_001.blf, ..."""
+        self.path = Path(path)
+        self.max_queue = max_queue
+        self.rotate_bytes = rotate_mb * 1_000_000
+        self.rotate_sec = rotate_min * 60
+        self.files = []  # paths of the files written
+
+        self.frames_written = 0
+        self.frames_dropped = 0
+        self.queue_max = 0  # highest queue length seen by the writer
+
+        # deque append and popleft are atomic, the length check before append keeps the queue bounded
+        self._queue = deque()
+        self._thread = None
+        self._running = False
+
+    def start(self):
+        if self._thread is None:
+            self._running = True
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Write the frames still queued and close the file."""
+        self._running = False
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def record_tx(self, msg: can.Message):
+        """Transmitter tx listener."""
+        if len(self._queue) < self.max_queue:
+            self._queue.append((time.time(), msg))
+        else:
+            self.frames_dropped += 1
+
+    def on_message_received(self, msg: can.Message):
+        """Receiver listener, msg carries the reception timestamp of the interface."""
+        if len(self._queue) < self.max_queue:
+            self._queue.append((None, msg))
+        else:
+            self.frames_dropped += 1
+
+    def _open(self) -> can.io.generic.MessageWriter:
+        if self.rotate_bytes or self.rotate_sec:
+            path = self.path.with_name(f'{self.path.stem}_{len(self.files):03d}{self.path.suffix}')
+        else:
+            path = self.path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.files.append(path)
+        return can.Logger(path)
+
+    def _run(self):
+        queue = self._queue
+        writer = self._open()
+        opened = time.monotonic()
+        try:
+            while True:
+                try:
+                    timestamp, msg = queue.popleft()
+                except IndexError:
+                    if not self._running:
+                        break
+                    time.sleep(_IDLE_SLEEP_SEC)
+                    continue
+                self.queue_max = max(self.queue_max, len(queue) + 1)
+
+                if timestamp is not None:  # sent frame, published messages are shared and are not modified
+                    msg = can.Message(timestamp=timestamp, arbitration_id=msg.arbitration_id,
+                                      is_extended_id=msg.is_extended_id, is_remote_frame=msg.is_remote_frame,
+                                      is_error_frame=msg.is_error_frame, channel=msg.channel, dlc=msg.dlc,
+                                      data=msg.data, is_fd=msg.is_fd, is_rx=False,
+                                      bitrate_switch=msg.bitrate_switch)
+                writer.on_message_received(msg)
+                self.frames_written += 1
+
+                if self.rotate_bytes and writer.file_size() >= self.rotate_bytes \
+                        or self.rotate_sec and time.monotonic() - opened >= self.rotate_sec:
+                    writer.stop()
+                    writer = self._open()
+                    opened = time.monotonic()
+        finally:
+            writer.stop()
+
+    def telemetry(self) -> dict:
+        return {
+            'frames written': self.frames_written,
+            'frames dropped': self.frames_dropped,
+            'queue length': len(self._queue),
+            'queue max': self.queue_max,
+            'files': len(self.files)
+        }
@@ -0,0 +1,157 @@
+"""Replay of CAN log files (.asc, .blf, .log candump, .csv, .trc, ...) through a CAN interface.
+
+Frames are streamed from can.LogReader one at a time, so logs of any size are replayed in constant
+memory. Pacing follows the log timestamps on the monotonic clock, scaled by speed.
+"""
+import threading
+import time
+from collections import deque
+
+import can
+
+from . import canid
+from .config import Config
+from .codec import PGNCodec
+from .telemetry import _percentile
+
+
+class Replay:
+    def __init__(self, log_file, *, speed: float = 1.0, pgns=None, source_addresses=None, J1939: dict = None,
+                 pacing_window: int = 10000):
+        """speed: 1 for real time, N for N times faster, 0 for as fast as possible.
+        pgns, source_addresses: replay only frames of these PGNs / source addresses (J1939 29-bit CAN IDs).
+        J1939: parsed J1939DA, required for SPN overrides."""
+        self.log_file = log_file
+        self.speed = speed
+        self.pgns = None if pgns is None else set(pgns)
+        self.source_addresses = None if source_addresses is None else set(source_addresses)
+        self._J1939 = J1939
+        self._codecs = {}  # {(PGN, data length): PGNCodec}
+        self._overrides = {}  # {PGN: {source address or None: {SPN: raw value}}}
+        self._stop = threading.Event()
+
+        self.frames_read = 0
+        self.frames_filtered = 0
+        self.frames_sent = 0
+        self.errors = 0  # can.CanOperationError raised by bus.send()
+        self.pacing_error = deque(maxlen=pacing_window)  # send time minus due time, seconds
+        self.elapsed = 0.0
+
+    def override(self, pgn: int, spn: int, raw_value: int, source_address: int = None):
+        """Replace an SPN of the replayed frames of a PGN, of all source addresses unless source_address is given.
+        Takes effect on the next frame of the PGN, also during replay."""
+        if self._J1939 is None:
+            raise ValueError('SPN overrides require the parsed J1939DA')
+        self._J1939[pgn]['SPNs'][spn]  # raises KeyError for unknown PGNs and SPNs
+        overrides = {sa: dict(spn_values) for sa, spn_values in self._overrides.get(pgn, {}).items()}
+        overrides.setdefault(source_address, {})[spn] = raw_value
+        self._overrides = self._overrides | {pgn: overrides}  # replaced, not mutated, while replay reads it
+
+    def clear_overrides(self):
+        self._overrides = {}
+
+    def frames(self):
+        """Generator of the log frames passing the filters, with the SPN overrides applied."""
+        pgns, source_addresses = self.pgns, self.source_addresses
+        for msg in can.LogReader(self.log_file):
+            if msg.is_error_frame or msg.is_remote_frame:
+                continue
+            self.frames_read += 1
+            if msg.is_extended_id:
+                pgn = canid.pgn(msg.arbitration_id)
+                if pgns is not None and pgn not in pgns or source_addresses is not None \
+                        and canid.source_address(msg.arbitration_id) not in source_addresses:
+                    self.frames_filtered += 1
+                    continue
+                overrides = self._overrides.get(pgn)
+                if overrides:
+                    msg = self._apply_overrides(msg, pgn, overrides)
+            elif pgns is not None or source_addresses is not None:
+                self.frames_filtered += 1
+                continue
+            yield msg
+
+    def _apply_overrides(self, msg: can.Message, pgn: int, overrides: dict) -> can.Message:
+        spn_values = overrides.get(None, {}) | overrides.get(canid.source_address(msg.arbitration_id), {})
+        if not spn_values:
+            return msg
+        key = (pgn, len(msg.data))
+        try:
+            codec = self._codecs[key]
+        except KeyError:
+            codec = self._codecs[key] = PGNCodec(self._J1939[pgn], data_length=len(msg.data))
+        data = bytearray(msg.data)
+        for spn, raw_value in spn_values.items():
+            if spn in codec.fields:
+                codec.pack(data, spn, raw_value)
+        return can.Message(timestamp=msg.timestamp, arbitration_id=msg.arbitration_id,
+                           is_extended_id=msg.is_extended_id, is_fd=msg.is_fd, bitrate_switch=msg.bitrate_switch,
+                           channel=msg.channel, data=data)
+
+    def run(self, bus: can.BusABC):
+        """Replay the log to bus, paced by the log timestamps. Blocks until the end of the log or stop()."""
+        self._stop.clear()
+        started = time.monotonic()
+        first_timestamp = None
+        try:
+            for msg in self.frames():
+                if self._stop.is_set():
+                    break
+                if self.speed:
+                    if first_timestamp is None:
+                        first_timestamp = msg.timestamp
+                    due = started + (msg.timestamp - first_timestamp) / self.speed
+                    if (timeout := due - time.monotonic()) > 0:
+                        if self._stop.wait(timeout):
+                            break
+                try:
+                    bus.send(msg)
+                    self.frames_sent += 1
+                except can.CanOperationError:
+                    self.errors += 1
+                if self.speed:
+                    self.pacing_error.append(time.monotonic() - due)
+        finally:
+            self.elapsed = time.monotonic() - started
+
+    def stop(self):
+        self._stop.set()
+
+    def telemetry(self) -> dict:
+        pacing_error = sorted(self.pacing_error)
+
+        def ms(value):
+            return None if value is None else round(value * 1000, 3)
+
+        return {
+            'frames read': self.frames_read,
+            'frames filtered': self.frames_filtered,
+            'frames sent': self.frames_sent,
+            'CAN errors': self.errors,
+            'elapsed s': round(self.elapsed, 3),
+            'throughput frames/s': round(self.frames_sent / self.elapsed) if self.elapsed else None,
+            'pacing error p50 ms': ms(_percentile(pacing_error, 50)),
+            'pacing error p99 ms': ms(_percentile(pacing_error, 99)),
+            'pacing error max ms': ms(pacing_error[-1]) if pacing_error else None
+        }
+
+
+def main(*, config_dir=None, log_file, speed: float = 1.0, pgns=None, source_addresses=None) -> int:
+    """Replay log_file through the CAN interface of the configuration. Returns the process exit status."""
+    config = Config(config_dir)
+    messages = config.load()
+    messages.extend(config.connect_can())
+    for msg in messages:
+        print(msg, flush=True)
+    if config.bus is None:
+        return 1
+
+    replay = Replay(log_file, speed=speed, pgns=pgns, source_addresses=source_addresses, J1939=config.J1939_spec)
+    try:
+        replay.run(config.bus)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        config.disconnect_can()
+    print(', '.join(f'{key}: {value}' for key, value in replay.telemetry().items()), flush=True)
+    return 0
@@ -0,0 +1,169 @@
+"""Data-driven normalization of J1939DA text fields, e.g. '100 ms' of the Transmission Rate column to 100.
+
+Each field has a table of exact texts, looked up first, and an ordered list of precompiled regular expressions.
+The rules bundled in resources/J1939DA_rules.toml can be extended by a user file of the same format,
+see the bundled file for the format.
+"""
+import hashlib
+import re
+import tomllib
+from collections import Counter
+from pathlib import Path
+
+BUNDLED_RULES = Path(__file__).parent / 'resources' / 'J1939DA_rules.toml'
+FIELDS = ('Transmission Rate', 'SPN Position in PGN', 'Operational Range')  # J1939DA columns normalized by rules
+REPORT_MAX_UNMATCHED = 5  # unmatched texts listed per field by report()
+
+_EXACT = 'exact'  # rule name of exact text matches
+_TABLE_KEYS = {'default', 'exact', 'replace', 'patterns'}
+_PATTERN_KEYS = {'regex', 'value', 'scale', 'add', 'name'}
+_GROUP = re.compile(r'\$(\d+)$')
+
+
+def _none(value):
+    """TOML value with 'None' for None, arrays as tuples."""
+    if isinstance(value, list):
+        return tuple(_none(item) for item in value)
+    return None if value == 'None' else value
+
+
+def _number(text: str):
+    try:
+        return int(text)
+    except ValueError:
+        return float(text)
+
+
+class _Pattern:
+    __slots__ = ('name', 'regex', 'value', 'scale', 'add')
+
+    def __init__(self, *, regex: str, value, scale=1, add=0, name: str = None):
+        self.name = regex if name is None else name
+        self.regex = re.compile(regex)
+        self.value = _none(value)
+        self.scale = tuple(scale) if isinstance(scale, list) else scale
+        self.add = tuple(add) if isinstance(add, list) else add
+
+    def _apply(self, value, match: re.Match, scale, add):
+        if not isinstance(value, str) or (group := _GROUP.match(value)) is None:
+            return value
+        number = _number(match.group(int(group.group(1)))) * scale + add
+        if isinstance(number, float) and scale != 1 and number.is_integer():
+            number = int(number)
+        return number
+
+    def apply(self, match: re.Match):
+        """Value of a match, ValueError if one of its groups is not a number."""
+        if isinstance(self.value, tuple):
+            n = len(self.value)
+            scales = self.scale if isinstance(self.scale, tuple) else (self.scale,) * n
+            adds = self.add if isinstance(self.add, tuple) else (self.add,) * n
+            return tuple(self._apply(value, match, scale, add) for value, scale, add in zip(self.value, scales, adds))
+        return self._apply(self.value, match, self.scale, self.add)
+
+
+class RuleTable:
+    """Rules of one J1939DA field."""
+    def __init__(self, field: str):
+        self.field = field
+        self.default = None
+        self.exact = {}
+        self.replace = []
+        self.patterns = []
+
+    def update(self, table: dict, source: str):
+        """Add the rules of a TOML table, its exact texts replacing and its patterns tried before the current ones."""
+        unknown = table.keys() - _TABLE_KEYS
+        if unknown:
+            raise ValueError(f"{source}: unknown keys in ['{self.field}']: {', '.join(sorted(unknown))}")
+        if 'default' in table:
+            self.default = _none(table['default'])
+        self.exact |= {text: _none(value) for text, value in table.get('exact', {}).items()}
+        self.replace = [tuple(pair) for pair in table.get('replace', [])] + self.replace
+        patterns = []
+        for n, pattern in enumerate(table.get('patterns', []), start=1):
+            unknown = pattern.keys() - _PATTERN_KEYS
+            if unknown or 'regex' not in pattern or 'value' not in pattern:
+                raise ValueError(f"{source}: pattern {n} of ['{self.field}'] must have the keys regex and value, "
+                                 f"and optionally scale, add and name")
+            try:
+                patterns.append(_Pattern(**pattern))
+            except re.error as e:
+                raise ValueError(f"{source}: pattern {n} of ['{self.field}'] - {e}") from None
+        self.patterns = patterns + self.patterns
+
+    def match(self, raw_value) -> tuple:
+        """(normalized value, name of the matching rule), the rule name None if no rule matches."""
+        if raw_value is None:
+            return self.default, None
+        text = (raw_value if isinstance(raw_value, str) else str(raw_value)).strip()
+        try:
+            return self.exact[text], _EXACT
+        except KeyError:
+            pass
+        for old, new in self.replace:
+            text = text.replace(old, new)
+        for pattern in self.patterns:
+            match = pattern.regex.match(text)
+            if match is not None:
+                try:
+                    return pattern.apply(match), pattern.name
+                except ValueError:
+                    continue
+        return self.default, None
+
+
+class Rules:
+    """Normalization rules of the bundled file and an optional user file.
+    After count(), hits holds the rows normalized per (field, rule name), and unmatched the rows per (field, text)
+    that no rule matched."""
+    def __init__(self, user_rules: Path = None):
+        """user_rules: file extending the bundled rules, ignored if it does not exist.
+        Raises OSError, tomllib.TOMLDecodeError or ValueError for unreadable or invalid rules."""
+        self.tables = {field: RuleTable(field) for field in FIELDS}
+        self.files = [BUNDLED_RULES]
+        if user_rules is not None and Path(user_rules).exists():
+            self.files.append(Path(user_rules))
+        digest = hashlib.sha256()
+        for path in self.files:
+            content = path.read_bytes()
+            digest.update(content)
+            for field, table in tomllib.loads(content.decode('utf-8')).items():
+                if field not in self.tables:
+                    raise ValueError(f"{path.name}: ['{field}'] is not one of the fields normalized by rules: "
+                                     f"{', '.join(FIELDS)}")
+                self.tables[field].update(table, path.name)
+        self.sha256 = digest.hexdigest()
+        self.hits = Counter()
+        self.unmatched = Counter()
+
+    def normalize(self, field: str, raw_value):
+        return self.tables[field].match(raw_value)[0]
+
+    def count(self, raw_values: dict[str, Counter]):
+        """Count the rule hits and unmatched texts of {field: Counter of raw values}."""
+        self.hits = Counter()
+        self.unmatched = Counter()
+        for field, counter in raw_values.items():
+            table = self.tables[field]
+            for raw_value, rows in counter.items():
+                name = table.match(raw_value)[1]
+                if name is not None:
+                    self.hits[(field, name)] += rows
+                elif raw_value is not None:
+                    self.unmatched[(field, raw_value)] += rows
+
+    def report(self) -> list[str]:
+        """Messages of the last count()."""
+        messages = []
+        for field in self.tables:
+            hits = [f'{rows} {name}' for (hit_field, name), rows in self.hits.most_common() if hit_field == field]
+            unmatched = [(text, rows) for (unmatched_field, text), rows in self.unmatched.most_common()
+                         if unmatched_field == field]
+            messages.append(f"INFO: {field} rules - rows matched: {', '.join(hits) or 'none'}, "
+                            f"unmatched: {sum(rows for _, rows in unmatched)}")
+            for text, rows in unmatched[:REPORT_MAX_UNMATCHED]:
+                messages.append(f'WARNING: no {field} rule for {text!r} ({rows} rows)')
+            if len(unmatched) > REPORT_MAX_UNMATCHED:
+                messages.append(f'WARNING: no {field} rule for {len(unmatched) - REPORT_MAX_UNMATCHED} more texts')
+        return messages
@@ -0,0 +1,169 @@
+"""Asyncio scenario scripting on top of the Transmitter, for timed test sequences, e.g.:
+
+    async def scenario(sim):
+        await sim.set(61444, 190, 1500)  # engine speed, rpm
+        await sim.wait(2)
+        await sim.ramp(65262, 110, to=110, duration_s=30)  # coolant temperature, deg C
+        await sim.wait_for_frame(pgn=65226, timeout=5)  # DM1
+
+Scenarios are coroutine functions named scenario or scenario_*, taking the Simulation, loaded from
+Python files with load_scenarios(). Any number of scenarios run concurrently on one event loop.
+Waits are scheduled on absolute deadlines of the loop clock, so timing errors do not accumulate.
+"""
+import asyncio
+import importlib.util
+import inspect
+import time
+from collections import deque
+from pathlib import Path
+
+import can
+
+from . import canid
+from . import signaltools
+from .telemetry import _percentile
+
+
+class Simulation(can.Listener):
+    def __init__(self, J1939: dict, transmitter, receiver=None, *, lateness_window: int = 10000):
+        """transmitter: Transmitter or Channels.
+        receiver: Receiver or Channels feeding wait_for_frame(). Acceptance filters must pass the awaited frames,
+        e.g. Receiver(..., acceptance_filters=False)."""
+        self._J1939 = J1939
+        self.transmitter = transmitter
+        self._loop: asyncio.AbstractEventLoop = None
+        self._started = None
+        self._waiters = []  # [(future, PGN, source address, predicate)], used in the event loop only
+        self.lateness = deque(maxlen=lateness_window)  # wake-up time minus deadline, seconds
+        if receiver is not None:
+            receiver.listeners.append(self)
+
+    def _bind(self):
+        if self._loop is None:
+            self._loop = asyncio.get_running_loop()
+            self._started = self._loop.time()
+
+    def time(self) -> float:
+        """Seconds since the first scenario call."""
+        self._bind()
+        return self._loop.time() - self._started
+
+    def _encode(self, pgn: int, spn: int, value: float) -> int:
+        return signaltools.encode_clamped(decoded_value=value, signal_spec=self._J1939[pgn]['SPNs'][spn])
+
+    def get(self, pgn: int, spn: int, source_address=0) -> float:
+        """Decoded value of an SPN in the transmitted frame."""
+        return signaltools.decode_raw(raw_value=self.transmitter.get_raw_value(pgn, spn, source_address),
+                                      signal_spec=self._J1939[pgn]['SPNs'][spn])
+
+    async def set(self, pgn: int, spn: int, value: float, source_address=0):
+        """Set an SPN to a decoded value (raw value for discrete SPNs), clamped to the SPN field."""
+        self.transmitter.modify_pgn_data(pgn, spn, self._encode(pgn, spn, value), source_address)
+
+    async def set_values(self, pgn: int, values: dict, source_address=0):
+        """Set several SPNs of a PGN at once, e.g. {190: 1500, 513: 40}, in the same frame."""
+        self.transmitter.set_values({(pgn, source_address): {spn: self._encode(pgn, spn, value)
+                                                             for spn, value in values.items()}})
+
+    async def wait(self, seconds: float):
+        await self._sleep_until(self._loop_time() + seconds)
+
+    async def wait_until(self, t: float):
+        """Wait until t seconds since the first scenario call."""
+        self._bind()
+        await self._sleep_until(self._started + t)
+
+    def _loop_time(self) -> float:
+        self._bind()
+        return self._loop.time()
+
+    async def _sleep_until(self, deadline: float):
+        await asyncio.sleep(max(0.0, deadline - self._loop.time()))
+        self.lateness.append(self._loop.time() - deadline)
+
+    async def ramp(self, pgn: int, spn: int, *, to: float, duration_s: float, start: float = None,
+                   step_s: float = None, source_address=0):
+        """Change an SPN linearly from start (default: its current value) to `to` over duration_s,
+        in steps of step_s (default: the tx rate of the PGN, i.e. one step per transmitted frame)."""
+        if start is None:
+            start = self.get(pgn, spn, source_address)
+        if step_s is None:
+            step_s = self.transmitter.get_tx_rate_ms(pgn, source_address) / 1000
+        began = self._loop_time()
+        n_steps = max(1, round(duration_s / step_s))
+        for step in range(n_steps + 1):
+            await self._sleep_until(began + duration_s * step / n_steps)
+            await self.set(pgn, spn, start + (to - start) * step / n_steps, source_address)
+
+    async def wait_for_frame(self, *, pgn: int = None, source_address: int = None, predicate=None,
+                             timeout: float = None) -> can.Message:
+        """Wait for a received frame of pgn and/or source_address, for which predicate(msg) is true.
+        Raises asyncio.TimeoutError after timeout seconds."""
+        self._bind()
+        future = self._loop.create_future()
+        waiter = (future, pgn, source_address, predicate)
+        self._waiters.append(waiter)
+        try:
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+
+    def on_message_received(self, msg: can.Message):
+        """Called by the Receiver thread."""
+        if self._waiters and self._loop is not None:
+            self._loop.call_soon_threadsafe(self._dispatch, msg)
+
+    def _dispatch(self, msg: can.Message):
+        pgn = canid.pgn(msg.arbitration_id) if msg.is_extended_id else None
+        source_address = canid.source_address(msg.arbitration_id) if msg.is_extended_id else None
+        for waiter in list(self._waiters):
+            future, waiter_pgn, waiter_source_address, predicate = waiter
+            if future.done() or waiter_pgn is not None and waiter_pgn != pgn \
+                    or waiter_source_address is not None and waiter_source_address != source_address \
+                    or predicate is not None and not predicate(msg):
+                continue
+            future.set_result(msg)
+            self._waiters.remove(waiter)
+
+    def telemetry(self) -> dict:
+        lateness = sorted(self.lateness)
+
+        def ms(value):
+            return None if value is None else round(value * 1000, 3)
+
+        return {
+            'waits': len(lateness),
+            'lateness p50 ms': ms(_percentile(lateness, 50)),
+            'lateness p99 ms': ms(_percentile(lateness, 99)),
+            'lateness max ms': ms(lateness[-1]) if lateness else None
+        }
+
+
+def load_scenarios(path) -> list:
+    """Coroutine functions named scenario or scenario_* of a Python file."""
+    path = Path(path)
+    spec = importlib.util.spec_from_file_location(f'akrocansim_scenario_{path.stem}', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    scenarios = [function for name, function in vars(module).items()
+                 if (name == 'scenario' or name.startswith('scenario_')) and inspect.iscoroutinefunction(function)]
+    if not scenarios:
+        raise ValueError(f'no scenario coroutine functions found in {path}')
+    return scenarios
+
+
+async def run_scenarios(sim: Simulation, scenarios: list) -> list[str]:
+    """Run scenarios concurrently. Returns a result message per scenario."""
+    started = time.monotonic()
+    results = await asyncio.gather(*(scenario(sim) for scenario in scenarios), return_exceptions=True)
+    elapsed = time.monotonic() - started
+    messages = []
+    for scenario, result in zip(scenarios, results):
+        if isinstance(result, BaseException):
+            messages.append(f'ERROR: scenario {scenario.__name__} failed - {type(result).__name__}: {result}')
+        else:
+            messages.append(f'INFO: scenario {scenario.__name__} completed')
+    messages.append(f'INFO: {len(scenarios)} scenarios in {elapsed:.3f} s, '
+                    + ', '.join(f'{key}: {value}' for key, value in sim.telemetry().items()))
+    return messages
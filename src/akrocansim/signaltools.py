@@ -1,5 +1,14 @@
+from .codec import SPNCodec
+
+
 def start_bit(*, signal_spec: dict):
-    return signal_spec['start_byte'] * 8 + signal_spec['start_bit']
+    return SPNCodec.from_spec(signal_spec).bit_offset
+
+def pack(*, data: bytearray, signal_spec: dict, raw_value: int):
+    SPNCodec.from_spec(signal_spec).pack(data, raw_value)
+
+def unpack(*, data, signal_spec: dict) -> int:
+    return SPNCodec.from_spec(signal_spec).unpack(data)
 
 def raw_min_value(*, signal_spec: dict):
     min_value = encode(decoded_value=signal_spec['min_value'], offset=signal_spec['offset'], scale=signal_spec['scale'])
@@ -15,6 +24,21 @@ def decode(*, raw_value, scale, offset):
 def encode(*, decoded_value, scale, offset):
     return round((decoded_value - offset) / scale)
 
+def encode_clamped(*, decoded_value, signal_spec: dict) -> int:
+    """Raw value of a decoded value, clamped to the SPN field. Discrete SPNs take raw values."""
+    scale, offset = signal_spec['scale'], signal_spec['offset']
+    if not isinstance(scale, (int, float)):
+        raw_value = int(decoded_value)
+    else:
+        raw_value = encode(decoded_value=decoded_value, scale=scale, offset=offset)
+    return max(0, min(raw_value, (1 << signal_spec['length_bits']) - 1))
+
+def decode_raw(*, raw_value: int, signal_spec: dict):
+    """Decoded value of a raw value. Discrete SPNs give raw values."""
+    if not isinstance(signal_spec['scale'], (int, float)):
+        return raw_value
+    return decode(raw_value=raw_value, scale=signal_spec['scale'], offset=signal_spec['offset'])
+
 def get_label(*, signal_spec: dict, value: int):
     try:
         return signal_spec['discrete_values'][value]
@@ -0,0 +1,175 @@
+"""Indexed on-disk store of the parsed J1939DA, an SQLite file read on demand.
+
+A SpecStore reads as the {PGN: {field: value, 'SPNs': {SPN: {field: value}}}} dict built by the J1939DA parser,
+but loads a PGN and its SPNs from the file only when the PGN is first looked up, into compact read-only
+records. PGN and SPN descriptions, the longest fields, are only read from the file when accessed.
+
+The file is opened read-only for each lookup, so any number of processes can share it.
+Metadata, e.g. what the J1939DA was parsed from, is kept in the file as {name: JSON value}, see read_meta().
+"""
+import json
+import os
+import sqlite3
+from collections.abc import Mapping
+from contextlib import closing
+from pathlib import Path
+
+_MISSING = object()  # field not present in the parsed spec
+_STORED = object()  # description left in the file
+
+_SCHEMA = '''
+CREATE TABLE pgns (pgn INTEGER, fields TEXT, description TEXT);
+CREATE TABLE spns (pgn INTEGER, spn INTEGER, fields TEXT, description TEXT);
+CREATE TABLE meta (name TEXT PRIMARY KEY, value TEXT);
+CREATE INDEX pgns_pgn ON pgns (pgn);
+CREATE INDEX spns_pgn ON spns (pgn, spn);
+'''
+
+
+class _Record(Mapping):
+    """Read-only {field: value} of a PGN or SPN."""
+    __slots__ = ('_values', '_store', '_key')
+    FIELDS: tuple = ()
+    _INDEX: dict = {}
+    _DESCRIPTION = ''
+    _DESCRIPTION_QUERY = ''
+
+    def __init__(self, fields: dict, store: 'SpecStore' = None, key: tuple = None, has_description: bool = False):
+        """fields without the description, which is read from the store when has_description."""
+        self._values = tuple(_STORED if has_description and name == self._DESCRIPTION else fields.get(name, _MISSING)
+                             for name in self.FIELDS)
+        self._store = store
+        self._key = key
+
+    def __getitem__(self, name):
+        value = self._values[self._INDEX[name]]
+        if value is _MISSING:
+            raise KeyError(name)
+        if value is _STORED:
+            return json.loads(self._store._query(self._DESCRIPTION_QUERY, self._key)[0][0])
+        return value
+
+    def __iter__(self):
+        return (name for name, value in zip(self.FIELDS, self._values) if value is not _MISSING)
+
+    def __len__(self):
+        return sum(value is not _MISSING for value in self._values)
+
+    def __repr__(self):
+        return f'{type(self).__name__}({dict(self)!r})'
+
+    def __reduce__(self):
+        # sent to the transmitter engine processes as a plain dict, with the description
+        return dict, (dict(self),)
+
+
+class SPNRecord(_Record):
+    __slots__ = ()
+    FIELDS = ('SPN Name', 'SPN Description', 'SPN Position in PGN', 'SPN Length', 'Resolution', 'Offset',
+              'Data Range', 'Operational Range', 'Units', 'start_byte', 'start_bit', 'length_bits', 'scale',
+              'n_decimals', 'offset', 'min_value', 'max_value', 'unit', 'discrete_values')
+    _INDEX = {name: i for i, name in enumerate(FIELDS)}
+    _DESCRIPTION = 'SPN Description'
+    _DESCRIPTION_QUERY = 'SELECT description FROM spns WHERE pgn IS ? AND spn IS ?'
+
+
+class PGNRecord(_Record):
+    __slots__ = ()
+    FIELDS = ('Parameter Group Label', 'Acronym', 'PGN Description', 'PGN Data Length', 'Default Priority',
+              'Transmission Rate', 'transmission_rate_ms', 'SPNs')
+    _INDEX = {name: i for i, name in enumerate(FIELDS)}
+    _DESCRIPTION = 'PGN Description'
+    _DESCRIPTION_QUERY = 'SELECT description FROM pgns WHERE pgn IS ?'
+
+
+def _dumps_fields(spec: dict, record_class: type) -> tuple[str, str]:
+    """JSON of the fields, without the description and the SPNs, and JSON of the description, None if absent."""
+    if spec.keys() - record_class._INDEX.keys():
+        raise ValueError(f'unknown {record_class.__name__} fields: {sorted(spec.keys() - record_class._INDEX.keys())}')
+    description = record_class._DESCRIPTION
+    fields = {name: value for name, value in spec.items() if name not in (description, 'SPNs')}
+    if 'discrete_values' in fields:  # integer keys, which JSON objects do not have
+        fields['discrete_values'] = list(fields['discrete_values'].items())
+    return (json.dumps(fields, ensure_ascii=False),
+            json.dumps(spec[description], ensure_ascii=False) if description in spec else None)
+
+
+def _loads_fields(fields: str) -> dict:
+    fields = json.loads(fields)
+    if 'discrete_values' in fields:
+        fields['discrete_values'] = dict(fields['discrete_values'])
+    return fields
+
+
+def write(path: Path, J1939: dict, meta: dict = None):
+    """Write the parsed J1939DA and the {name: value} metadata to a new store file at path, replacing any previous
+    one. Metadata values must be JSON serializable."""
+    path = Path(path)
+    tmp_path = path.with_name(f'{path.name}.tmp')
+    tmp_path.unlink(missing_ok=True)
+    with closing(sqlite3.connect(tmp_path)) as db:
+        db.executescript(_SCHEMA)
+        for pgn, pgn_spec in J1939.items():
+            db.execute('INSERT INTO pgns VALUES (?, ?, ?)', (pgn, *_dumps_fields(pgn_spec, PGNRecord)))
+            db.executemany('INSERT INTO spns VALUES (?, ?, ?, ?)',
+                           [(pgn, spn, *_dumps_fields(spn_spec, SPNRecord))
+                            for spn, spn_spec in pgn_spec.get('SPNs', {}).items()])
+        db.executemany('INSERT INTO meta VALUES (?, ?)',
+                       [(name, json.dumps(value, ensure_ascii=False)) for name, value in (meta or {}).items()])
+        db.commit()
+    os.replace(tmp_path, path)
+
+
+def read_meta(path: Path) -> dict:
+    """{name: value} metadata of a store file, empty if the file is missing, unreadable or has none.
+    Only the small metadata table is read."""
+    try:
+        with closing(sqlite3.connect(f'{Path(path).resolve().as_uri()}?mode=ro', uri=True)) as db:
+            return {name: json.loads(value) for name, value in db.execute('SELECT name, value FROM meta')}
+    except (sqlite3.Error, ValueError):
+        return {}
+
+
+class SpecStore(Mapping):
+    """{PGN: PGNRecord} of a store file, each PGN loaded on first lookup and kept."""
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        if not self.path.is_file():
+            raise FileNotFoundError(self.path)
+        self._uri = f'{self.path.resolve().as_uri()}?mode=ro'
+        self._pgns = {}
+
+    def _query(self, sql: str, params: tuple = ()) -> list:
+        with closing(sqlite3.connect(self._uri, uri=True)) as db:
+            return db.execute(sql, params).fetchall()
+
+    @property
+    def loaded_PGNs(self) -> list:
+        return list(self._pgns)
+
+    def __getitem__(self, pgn):
+        try:
+            return self._pgns[pgn]
+        except KeyError:
+            pass
+        rows = self._query('SELECT fields, description IS NOT NULL FROM pgns WHERE pgn IS ?', (pgn,))
+        if not rows:
+            raise KeyError(pgn)
+        (fields, has_description), = rows
+        spns = {spn: SPNRecord(_loads_fields(spn_fields), self, (pgn, spn), spn_has_description)
+                for spn, spn_fields, spn_has_description in self._query(
+                    'SELECT spn, fields, description IS NOT NULL FROM spns WHERE pgn IS ? ORDER BY rowid', (pgn,))}
+        record = self._pgns[pgn] = PGNRecord(_loads_fields(fields) | {'SPNs': spns}, self, (pgn,), has_description)
+        return record
+
+    def __contains__(self, pgn):
+        return pgn in self._pgns or bool(self._query('SELECT 1 FROM pgns WHERE pgn IS ?', (pgn,)))
+
+    def __iter__(self):
+        return (pgn for pgn, in self._query('SELECT pgn FROM pgns ORDER BY rowid'))
+
+    def __len__(self):
+        return self._query('SELECT count(*) FROM pgns')[0][0]
+
+    def __repr__(self):
+        return f'SpecStore({str(self.path)!r})'
@@ -0,0 +1,123 @@
+import bisect
+import csv
+import itertools
+import math
+from array import array
+from pathlib import Path
+
+
+TELEMETRY_COLUMNS = ('CAN ID', 'PGN', 'SA', 'nominal period ms', 'tx backend', 'frames sent',
+                     'achieved period ms', 'period min ms', 'period max ms', 'period std ms',
+                     'jitter p50 ms', 'jitter p95 ms', 'jitter p99 ms', 'jitter max ms',
+                     'late', 'missed', 'shaped', 'CAN errors', 'channel')
+
+
+def _percentile(sorted_values: list, q: float):
+    """Nearest-rank percentile of an already sorted list, q in [0, 100]."""
+    if not sorted_values:
+        return None
+    rank = max(0, min(len(sorted_values) - 1, round(q / 100 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+# Jitter histogram: bin 0 for jitter below JITTER_MIN_SEC, then JITTER_BINS_PER_DECADE logarithmic bins per
+# decade up to 10 s, the last bin also holding larger jitter. Percentiles are given as the upper edge of their bin,
+# within about 26% of the measured jitter.
+JITTER_MIN_SEC = 1e-5
+JITTER_BINS_PER_DECADE = 10
+JITTER_BINS = 1 + 6 * JITTER_BINS_PER_DECADE
+
+
+def jitter_bin(jitter: float) -> int:
+    if jitter < JITTER_MIN_SEC:
+        return 0
+    return min(JITTER_BINS - 1, 1 + int(math.log10(jitter / JITTER_MIN_SEC) * JITTER_BINS_PER_DECADE))
+
+
+def histogram_percentiles(histogram, qs: tuple, max_value: float) -> list:
+    """Nearest-rank percentiles of a jitter histogram, q in [0, 100], at most max_value, the largest jitter."""
+    cumulative = list(itertools.accumulate(histogram))
+    n = cumulative[-1]
+    if not n:
+        return [None] * len(qs)
+    return [min(JITTER_MIN_SEC * 10 ** (bisect.bisect_right(cumulative, max(0, min(n - 1, round(q / 100 * n) - 1)))
+                                        / JITTER_BINS_PER_DECADE), max_value) for q in qs]
+
+
+class TxStats:
+    """Transmission statistics of a single CAN ID.
+
+    Periods and jitter are measured between consecutive transmitted frames; a slot that is not
+    transmitted (e.g. tx mode stopped) restarts the measurement. Jitter is the absolute difference
+    between the achieved and the nominal period. Both are kept as running aggregates, jitter as a histogram,
+    so memory and snapshot() time do not depend on the number of frames.
+    """
+    __slots__ = ('frames_sent', 'late', 'missed', 'shaped', 'errors', 'last_sent', 'period_count', 'period_sum',
+                 'period_sum_sq', 'period_min', 'period_max', 'jitter_max', 'jitter_histogram')
+
+    def __init__(self):
+        self.frames_sent = 0
+        self.late = 0  # frames sent more than a tenth of a period after their deadline
+        self.missed = 0  # deadlines skipped because the scheduler fell more than a period behind
+        self.shaped = 0  # frames delayed by the bus load ceiling
+        self.errors = 0  # can.CanOperationError raised by bus.send(), or other errors raised while sending
+        self.last_sent = None
+        self.restart()
+
+    def restart(self):
+        """Clear the period and jitter aggregates, e.g. on a change of the nominal period."""
+        self.period_count = 0
+        self.period_sum = 0.0
+        self.period_sum_sq = 0.0
+        self.period_min = math.inf
+        self.period_max = 0.0
+        self.jitter_max = 0.0
+        self.jitter_histogram = array('I', bytes(4 * JITTER_BINS))
+
+    def record_sent(self, sent: float, nominal_period: float):
+        if self.last_sent is not None:
+            period = sent - self.last_sent
+            self.period_count += 1
+            self.period_sum += period
+            self.period_sum_sq += period * period
+            self.period_min = min(self.period_min, period)
+            self.period_max = max(self.period_max, period)
+            jitter = abs(period - nominal_period)
+            self.jitter_max = max(self.jitter_max, jitter)
+            self.jitter_histogram[jitter_bin(jitter)] += 1
+        self.last_sent = sent
+        self.frames_sent += 1
+
+    def record_idle(self):
+        self.last_sent = None
+
+    def snapshot(self) -> dict:
+        def ms(value):
+            return None if value is None else round(value * 1000, 3)
+
+        n = self.period_count
+        mean = self.period_sum / n if n else None
+        jitter_max = self.jitter_max if n else None
+        p50, p95, p99 = histogram_percentiles(self.jitter_histogram, (50, 95, 99), jitter_max)
+        return {
+            'frames sent': self.frames_sent,
+            'achieved period ms': ms(mean),
+            'period min ms': ms(self.period_min) if n else None,
+            'period max ms': ms(self.period_max) if n else None,
+            'period std ms': ms(math.sqrt(max(0.0, self.period_sum_sq / n - mean * mean))) if n else None,
+            'jitter p50 ms': ms(p50),
+            'jitter p95 ms': ms(p95),
+            'jitter p99 ms': ms(p99),
+            'jitter max ms': ms(jitter_max),
+            'late': self.late,
+            'missed': self.missed,
+            'shaped': self.shaped,
+            'CAN errors': self.errors
+        }
+
+
+def dump_telemetry_csv(*, telemetry: list[dict], telemetry_csv: Path):
+    with telemetry_csv.open('w', encoding='utf-8', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=TELEMETRY_COLUMNS)
+        writer.writeheader()
+        writer.writerows(telemetry)
@@ -1,7 +1,17 @@
+import heapq
+import itertools
 import threading
 import time
+from collections import deque
+
 import can
 
+from . import canid
+from .busload import TokenBucket, expected_bus_load, frame_bits
+from .codec import PGNCodec
+from .telemetry import TxStats, dump_telemetry_csv
+from .transport import MAX_PAYLOAD, TransportProtocol
+
 
 _TX_MODE = 0
 _TX_MODE__STOP = 0  # global, local
@@ -10,102 +20,518 @@ _TX_MODE__PER_PGN = 2  # global only
 _TX_MODE__TX_ONCE = 3  # local only
 _TX_RATE_SEC = 1
 _DATA = 2
+_NEXT_DUE = 3
+_SCHEDULE_SEQ = 4
+_STATS = 5
+_DRIVER_TASK = 6
+_CODEC = 7
+_MESSAGE = 8
+_DEFERRED = 9
+
+TX_BACKEND__SOFTWARE = 'software'  # every frame is scheduled by the Transmitter
+TX_BACKEND__DRIVER = 'driver'  # continuous frames are sent by interface driver/firmware cyclic tasks
+
+
+def driver_periodic_supported(bus: can.BusABC) -> bool:
+    """True if the interface implements cyclic transmission in its driver or firmware
+    rather than python-can's thread based fallback."""
+    return type(bus)._send_periodic_internal is not can.BusABC._send_periodic_internal
+
+
+def _van_der_corput(n: int) -> float:
+    """n-th element of the base 2 van der Corput sequence: 0.5, 0.25, 0.75, 0.125, ... Consecutive elements
+    split the largest remaining gap of [0, 1), so any number of phases is evenly spread."""
+    phase, denominator = 0.0, 1
+    while n:
+        n, bit = divmod(n, 2)
+        denominator *= 2
+        phase += bit / denominator
+    return phase
+
+
+def _check_tx_rate(tx_rate_ms):
+    if not tx_rate_ms > 0:
+        raise ValueError(f'tx rate must be greater than 0 ms, got {tx_rate_ms}')
 
 
 class Transmitter:
-    def __init__(self, J1939: dict):
+    def __init__(self, J1939: dict, tx_backend: str = TX_BACKEND__SOFTWARE,
+                 tp_bam_packet_gap_ms: float = 50, tp_cmdt_packet_gap_ms: float = 0,
+                 phase_stagger: bool = True, max_bus_load_pct: float = 0):
         self._J1939 = J1939
-        self.bus: can.BusABC = None
+        self._bus: can.BusABC = None
+        self.tx_backend = tx_backend
+        # the first transmission slot of each registered PGN is offset by a fraction of its period,
+        # so that PGNs registered together do not burst onto the bus at the same instant every period
+        self.phase_stagger = phase_stagger
+        self._phases = itertools.count(1)
+        # token bucket ceiling on the bus load of the periodic frames, 0 for none. Needs the bitrate.
+        self.max_bus_load_pct = max_bus_load_pct
+        self._bitrate = None
+        self._shaper: TokenBucket = None
+        # PGNs with more than 8 data bytes are broadcast through the transport protocol
+        self.transport = TransportProtocol(bam_packet_gap_ms=tp_bam_packet_gap_ms,
+                                           cmdt_packet_gap_ms=tp_cmdt_packet_gap_ms)
+        self._driver_tasks_enabled = False
         self.PGNs_pending_tx = {}
+        # callables called with every frame sent, e.g. Recorder.record_tx. They run in the sending thread and
+        # must not block. Frames sent by interface cyclic tasks (tx_backend 'driver') are not seen.
+        self.tx_listeners = []
+        self.transport.tx_listeners = self.tx_listeners
+        # errors raised while sending in the scheduler and transport threads, the first of each CAN ID or
+        # transport source address, see pop_messages()
+        self.messages = deque(maxlen=100)
+        self.transport.messages = self.messages
+        self._failed_CAN_IDs = set()
 
         self.global_tx_mode = _TX_MODE__STOP  # _TX_MODE__STOP, _TX_MODE__TX_CONT, _TX_MODE__PER_PGN
-        self.tx_CAN_IDs = {}  # {(CAN_ID: int, is_extended: bool): {
+        self.tx_CAN_IDs = {}  # {(CAN_ID: int, is_extended: bool): [  # list indexed by:
                               #     _TX_MODE: _TX_MODE__STOP, _TX_MODE__TX_CONT, _TX_MODE__TX_ONCE
                               #     _TX_RATE_SEC: #,
-                              #     _DATA: list
-                              # }
+                              #     _DATA: bytearray, working buffer updated by set_values(),
+                              #     _NEXT_DUE: monotonic time of the next transmission slot,
+                              #     _SCHEDULE_SEQ: sequence number of the valid schedule entry,
+                              #     _STATS: TxStats,
+                              #     _DRIVER_TASK: can.broadcastmanager.CyclicSendTaskABC or None,
+                              #     _CODEC: PGNCodec, shared by all source addresses of a PGN,
+                              #     _MESSAGE: can.Message published for transmission, never modified once published
+                              #     _DEFERRED: True while the schedule entry is a frame delayed by the bus load
+                              #                ceiling, sent at the entry's time, for the slot at _NEXT_DUE
+                              # ]}
 
-        self.J1939_CAN_IDs = {}  # {PGN: CAN_ID}
+        self.J1939_CAN_IDs = {}  # {(PGN, source address): CAN_ID}
+        self._codecs = {}  # {PGN: PGNCodec}
+        self._data_lock = threading.Lock()  # serialises writers of _DATA buffers
 
-    def register_tx_PGN(self, *, pgn, priority, source_address, tx_rate_ms):
-        can_id = priority << 26 | pgn << 8 | source_address
-        self.J1939_CAN_IDs[pgn] = (can_id, True)
+        # A single scheduler thread serves all registered CAN IDs from a heap of
+        # (_NEXT_DUE, _SCHEDULE_SEQ, CAN ID) entries. Entries whose sequence number no longer
+        # matches the CAN ID's _SCHEDULE_SEQ have been superseded (e.g. by a rate change) and are dropped.
+        self._schedule = []
+        self._schedule_seq = itertools.count()
+        self._schedule_cv = threading.Condition()
+        self._scheduler_thread = None
+        self._running = True
+
+    def register_tx_PGN(self, *, pgn, priority, source_address, tx_rate_ms, data_length=None):
+        can_id = canid.can_id(priority=priority, pgn=pgn, source_address=source_address)
+        _check_tx_rate(tx_rate_ms)
+        self.J1939_CAN_IDs[(pgn, source_address)] = (can_id, True)
         tx_rate_sec = tx_rate_ms / 1000
-        self.tx_CAN_IDs[(can_id, True)] = {
-            _TX_MODE: _TX_MODE__STOP,
-            _TX_RATE_SEC: tx_rate_sec,
-            _DATA: [0 for _ in range(self._J1939[pgn]['PGN Data Length'])]
-        }
-        threading.Thread(target=self.send_periodic, args=(can_id, True), daemon=True).start()
+        try:
+            codec = self._codecs[pgn]
+        except KeyError:
+            codec = self._codecs[pgn] = PGNCodec(self._J1939[pgn])
+        self.tx_CAN_IDs[(can_id, True)] = [
+            _TX_MODE__STOP,  # _TX_MODE
+            tx_rate_sec,  # _TX_RATE_SEC
+            codec.new_buffer() if data_length is None else bytearray(data_length),  # _DATA
+            None,  # _NEXT_DUE
+            None,  # _SCHEDULE_SEQ
+            TxStats(),  # _STATS
+            None,  # _DRIVER_TASK
+            codec,  # _CODEC
+            None,  # _MESSAGE
+            False  # _DEFERRED
+        ]
+        self._publish((can_id, True))
+        phase = _van_der_corput(next(self._phases)) if self.phase_stagger else 1
+        with self._schedule_cv:
+            self._reschedule((can_id, True), time.monotonic() + phase * tx_rate_sec)
+            if self._scheduler_thread is None:
+                self._scheduler_thread = threading.Thread(target=self._run_scheduler, daemon=True)
+                self._scheduler_thread.start()
+
+    @property
+    def bus(self) -> can.BusABC:
+        return self._bus
+
+    @bus.setter
+    def bus(self, bus: can.BusABC):
+        for can_id_key in self.tx_CAN_IDs:
+            self._stop_driver_task(can_id_key)
+        self._bus = bus
+        self.transport.bus = bus
+        self._driver_tasks_enabled = (bus is not None and self.tx_backend == TX_BACKEND__DRIVER
+                                      and driver_periodic_supported(bus))
+        self._sync_driver_tasks()
+
+    @property
+    def bitrate(self) -> int:
+        return self._bitrate
+
+    @bitrate.setter
+    def bitrate(self, bitrate: int):
+        self._bitrate = bitrate
+        if bitrate and self.max_bus_load_pct:
+            rate = bitrate * self.max_bus_load_pct / 100
+            self._shaper = TokenBucket(rate=rate, burst=max(rate / 100, frame_bits(8, stuff_bits=True)))  # 10 ms
+        else:
+            self._shaper = None
+
+    def expected_bus_load(self, bitrate: int = None) -> float:
+        """Worst case bus load %, with stuff bits, of all registered PGNs transmitted at their rates,
+        None without a bitrate (default: self.bitrate)."""
+        bitrate = bitrate or self._bitrate
+        if not bitrate:
+            return None
+        return expected_bus_load([(len(signal_spec[_DATA]), signal_spec[_TX_RATE_SEC])
+                                  for signal_spec in self.tx_CAN_IDs.values()], bitrate)
+
+    def _is_continuous(self, signal_spec) -> bool:
+        return self.global_tx_mode == _TX_MODE__TX_CONT or signal_spec[_TX_MODE] == _TX_MODE__TX_CONT
+
+    def _sync_driver_tasks(self, can_id_key=None):
+        """Start or stop driver cyclic tasks so that exactly the continuously transmitted CAN IDs have one."""
+        if not self._driver_tasks_enabled:
+            return
+        for _can_id_key in self.tx_CAN_IDs if can_id_key is None else [can_id_key]:
+            signal_spec = self.tx_CAN_IDs[_can_id_key]
+            if len(signal_spec[_DATA]) > 8:
+                continue  # transport protocol sessions are not cyclic frames
+            if self._is_continuous(signal_spec) and signal_spec[_DRIVER_TASK] is None:
+                try:
+                    signal_spec[_DRIVER_TASK] = self._bus.send_periodic(signal_spec[_MESSAGE],
+                                                                        signal_spec[_TX_RATE_SEC])
+                except (can.CanError, NotImplementedError):
+                    signal_spec[_STATS].errors += 1  # the software scheduler keeps serving this CAN ID
+            elif not self._is_continuous(signal_spec):
+                self._stop_driver_task(_can_id_key)
+
+    def _stop_driver_task(self, can_id_key):
+        signal_spec = self.tx_CAN_IDs[can_id_key]
+        if signal_spec[_DRIVER_TASK] is not None:
+            try:
+                signal_spec[_DRIVER_TASK].stop()
+            except can.CanError:
+                pass
+            signal_spec[_DRIVER_TASK] = None
+
+    def _modify_driver_task_data(self, can_id_key):
+        signal_spec = self.tx_CAN_IDs[can_id_key]
+        task = signal_spec[_DRIVER_TASK]
+        if task is None:
+            return
+        if isinstance(task, can.ModifiableCyclicTaskABC):
+            task.modify_data(signal_spec[_MESSAGE])
+        else:
+            self._stop_driver_task(can_id_key)
+            self._sync_driver_tasks(can_id_key)
+
+    def _reschedule(self, can_id_key, next_due):
+        """Push a new schedule entry for a CAN ID, superseding any previous entry.
+        Must be called with self._schedule_cv held."""
+        signal_spec = self.tx_CAN_IDs[can_id_key]
+        signal_spec[_NEXT_DUE] = next_due
+        signal_spec[_DEFERRED] = False
+        self._push(can_id_key, next_due)
+
+    def _defer(self, can_id_key, send_at):
+        """Push a schedule entry sending the frame of the current slot at send_at, superseding any previous entry.
+        Must be called with self._schedule_cv held."""
+        self.tx_CAN_IDs[can_id_key][_DEFERRED] = True
+        self._push(can_id_key, send_at)
+
+    def _push(self, can_id_key, due):
+        seq = next(self._schedule_seq)
+        self.tx_CAN_IDs[can_id_key][_SCHEDULE_SEQ] = seq
+        heapq.heappush(self._schedule, (due, seq, can_id_key))
+        if self._schedule[0][1] == seq:  # new earliest deadline, wake the scheduler
+            self._schedule_cv.notify()
+
+    def _run_scheduler(self):
+        while True:
+            with self._schedule_cv:
+                while self._running:
+                    if not self._schedule:
+                        self._schedule_cv.wait()
+                        continue
+                    due, seq, can_id_key = self._schedule[0]
+                    if seq != self.tx_CAN_IDs[can_id_key][_SCHEDULE_SEQ]:
+                        heapq.heappop(self._schedule)
+                        continue
+                    timeout = due - time.monotonic()
+                    if timeout > 0:
+                        self._schedule_cv.wait(timeout)
+                        continue
+                    heapq.heappop(self._schedule)
+                    deferred = self.tx_CAN_IDs[can_id_key][_DEFERRED]
+                    break
+                else:
+                    return
+
+            signal_spec = self.tx_CAN_IDs[can_id_key]
+            send_at = None
+            try:
+                if deferred:
+                    self._send(can_id_key)
+                else:
+                    send_at = self.send_periodic(*can_id_key)
+            except Exception as e:  # e.g. raised by a tx listener, the other CAN IDs keep being served
+                signal_spec[_STATS].errors += 1
+                signal_spec[_STATS].record_idle()
+                if can_id_key not in self._failed_CAN_IDs:
+                    self._failed_CAN_IDs.add(can_id_key)
+                    self.messages.append(f'ERROR: tx of CAN ID {can_id_key[0]:08X} - {type(e).__name__}: {e}')
+
+            with self._schedule_cv:
+                if signal_spec[_SCHEDULE_SEQ] == seq:
+                    if send_at is not None:
+                        self._defer(can_id_key, send_at)
+                        continue
+                    # anchor the next slot to the previous deadline, not to the time the send completed,
+                    # so that processing time does not accumulate as drift
+                    tx_rate_sec = signal_spec[_TX_RATE_SEC]
+                    next_due = signal_spec[_NEXT_DUE] + tx_rate_sec
+                    behind = time.monotonic() - next_due
+                    if behind >= 0:
+                        missed = int(behind // tx_rate_sec) + 1
+                        signal_spec[_STATS].missed += missed
+                        next_due += missed * tx_rate_sec
+                    self._reschedule(can_id_key, next_due)
 
     def send_periodic(self, can_id, is_extended):
+        """Handle one transmission slot of a CAN ID according to the global and per PGN tx modes.
+        Returns the monotonic time to send the frame at if the bus load ceiling delays it, else None. The
+        scheduler sends delayed frames with _send() at that time, serving the other CAN IDs meanwhile."""
         signal_spec = self.tx_CAN_IDs[(can_id, is_extended)]
+        stats = signal_spec[_STATS]
 
-        while True:
-            time.sleep(signal_spec[_TX_RATE_SEC])
-            if self.global_tx_mode == _TX_MODE__TX_CONT or signal_spec[_TX_MODE] == _TX_MODE__TX_CONT:
-                pass
-            elif self.global_tx_mode in [_TX_MODE__STOP, _TX_MODE__PER_PGN] \
-                    and signal_spec[_TX_MODE] == _TX_MODE__TX_ONCE:
-                signal_spec[_TX_MODE] = _TX_MODE__STOP
-            else:
-                continue
+        if self.global_tx_mode == _TX_MODE__TX_CONT or signal_spec[_TX_MODE] == _TX_MODE__TX_CONT:
+            pass
+        elif self.global_tx_mode in [_TX_MODE__STOP, _TX_MODE__PER_PGN] \
+                and signal_spec[_TX_MODE] == _TX_MODE__TX_ONCE:
+            signal_spec[_TX_MODE] = _TX_MODE__STOP
+        else:
+            stats.record_idle()
+            return
+
+        if signal_spec[_DRIVER_TASK] is not None:
+            return  # transmitted by the interface
 
-            if self.bus is not None:
+        msg = signal_spec[_MESSAGE]
+        if self.bus is not None and self._shaper is not None and len(msg.data) <= 8:
+            delay = self._shaper.consume(frame_bits(len(msg.data), msg.is_extended_id, stuff_bits=True))
+            if delay:
+                stats.shaped += 1
+                return time.monotonic() + delay
+        self._send((can_id, is_extended))
+
+    def _send(self, can_id_key):
+        """Send the frame of the current slot of a CAN ID, or start its transport protocol session."""
+        can_id, _ = can_id_key
+        signal_spec = self.tx_CAN_IDs[can_id_key]
+        stats = signal_spec[_STATS]
+        if self.bus is not None:
+            msg = signal_spec[_MESSAGE]
+            sent = time.monotonic()
+            if len(msg.data) > 8:
+                if not self.transport.send(pgn=canid.pgn(can_id), data=msg.data,
+                                           source_address=canid.source_address(can_id)):
+                    stats.record_idle()  # previous transfer of this PGN still in progress
+                    return
+            else:
                 try:
-                    self.bus.send(can.Message(arbitration_id=can_id, is_extended_id=is_extended,
-                                              data=signal_spec[_DATA]))
+                    self.bus.send(msg)
                 except can.CanOperationError:
-                    pass
+                    stats.errors += 1
+                    stats.record_idle()
+                    return
+                for listener in self.tx_listeners:
+                    listener(msg)
+            tx_rate_sec = signal_spec[_TX_RATE_SEC]
+            if sent - signal_spec[_NEXT_DUE] > tx_rate_sec / 10:
+                stats.late += 1
+            stats.record_sent(sent, tx_rate_sec)
+        else:
+            stats.record_idle()
+
+    def telemetry(self) -> list[dict]:
+        """Snapshot of the transmission statistics of every registered PGN."""
+        telemetry = []
+        for (pgn, source_address), can_id_key in self.J1939_CAN_IDs.items():
+            signal_spec = self.tx_CAN_IDs[can_id_key]
+            can_id, _ = can_id_key
+            telemetry.append({'CAN ID': f'{can_id:08X}', 'PGN': pgn, 'SA': source_address,
+                              'nominal period ms': round(signal_spec[_TX_RATE_SEC] * 1000, 3),
+                              'tx backend': TX_BACKEND__SOFTWARE if signal_spec[_DRIVER_TASK] is None
+                              else TX_BACKEND__DRIVER}
+                             | signal_spec[_STATS].snapshot())
+        return telemetry
 
-    def set_tx_mode_stop(self, pgn=None):
+    def dump_telemetry_csv(self, telemetry_csv):
+        dump_telemetry_csv(telemetry=self.telemetry(), telemetry_csv=telemetry_csv)
+
+    def pop_messages(self) -> list[str]:
+        """Messages of the errors raised while sending since the last call."""
+        messages = []
+        while self.messages:
+            messages.append(self.messages.popleft())
+        return messages
+
+    def shutdown(self):
+        """Stop the scheduler thread and any driver cyclic tasks. Registered PGNs are no longer transmitted.
+        PGNs registered afterwards are transmitted by a new scheduler thread."""
+        for can_id_key in self.tx_CAN_IDs:
+            self._stop_driver_task(can_id_key)
+        self.transport.shutdown()
+        with self._schedule_cv:
+            self._running = False
+            self._schedule_cv.notify()
+            thread = self._scheduler_thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+        with self._schedule_cv:
+            self._schedule.clear()
+            for signal_spec in self.tx_CAN_IDs.values():
+                signal_spec[_SCHEDULE_SEQ] = None
+            self._scheduler_thread = None
+            self._running = True
+
+    def set_tx_mode_stop(self, pgn=None, source_address=0):
         if pgn is None:
             self.global_tx_mode = _TX_MODE__STOP
+            self._sync_driver_tasks()
         else:
-            self.tx_CAN_IDs[self.J1939_CAN_IDs[pgn]][_TX_MODE] = _TX_MODE__STOP
+            can_id_key = self.J1939_CAN_IDs[(pgn, source_address)]
+            self.tx_CAN_IDs[can_id_key][_TX_MODE] = _TX_MODE__STOP
+            self._sync_driver_tasks(can_id_key)
 
-    def set_tx_mode_continuous(self, pgn=None):
+    def set_tx_mode_continuous(self, pgn=None, source_address=0):
         if pgn is None:
             self.global_tx_mode = _TX_MODE__TX_CONT
+            self._sync_driver_tasks()
         else:
-            self.tx_CAN_IDs[self.J1939_CAN_IDs[pgn]][_TX_MODE] = _TX_MODE__TX_CONT
+            can_id_key = self.J1939_CAN_IDs[(pgn, source_address)]
+            self.tx_CAN_IDs[can_id_key][_TX_MODE] = _TX_MODE__TX_CONT
+            self._sync_driver_tasks(can_id_key)
 
     def set_tx_mode_per_PGN(self):
         self.global_tx_mode = _TX_MODE__PER_PGN
+        self._sync_driver_tasks()
 
-    def set_tx_once(self, pgn=None):
+    def set_tx_once(self, pgn=None, source_address=0):
         if pgn is None:
             for signal_spec in self.tx_CAN_IDs.values():
                 signal_spec[_TX_MODE] = _TX_MODE__TX_ONCE
+            self._sync_driver_tasks()
         else:
-            self.tx_CAN_IDs[self.J1939_CAN_IDs[pgn]][_TX_MODE] = _TX_MODE__TX_ONCE
+            can_id_key = self.J1939_CAN_IDs[(pgn, source_address)]
+            self.tx_CAN_IDs[can_id_key][_TX_MODE] = _TX_MODE__TX_ONCE
+            self._sync_driver_tasks(can_id_key)
 
-    def modify_pgn_tx_rate(self, pgn, tx_rate_ms):
+    def modify_pgn_tx_rate(self, pgn, tx_rate_ms, source_address=0):
+        _check_tx_rate(tx_rate_ms)
         tx_rate_sec = tx_rate_ms / 1000
-        self.tx_CAN_IDs[self.J1939_CAN_IDs[pgn]][_TX_RATE_SEC] = tx_rate_sec
-
-    def modify_pgn_data(self, pgn: int, spn: int, raw_value: int):
-        data = self.tx_CAN_IDs[self.J1939_CAN_IDs[pgn]][_DATA]
-        spn_spec = self._J1939[pgn]['SPNs'][spn]
-        start_byte = spn_spec['start_byte']
-
-        match spn_spec['length_bits']:
-            case 1 | 2 | 3 | 4 | 5 | 6 | 7:
-                start_bit = spn_spec['start_bit']
-                length_bits = spn_spec['length_bits']
-                mask = 0x00
-                for i in range(length_bits):
-                    mask = mask | 1 << start_bit + i
-                data[start_byte] = data[start_byte] & ~mask | raw_value << start_bit & mask
-            case 8:
-                data[start_byte] = raw_value
-            case 16:
-                data[start_byte] = raw_value & 0x00FF
-                data[start_byte + 1] = raw_value >> 8
-            case 32:
-                data[start_byte] = raw_value & 0x0000_00FF
-                data[start_byte + 1] = raw_value >> 8 & 0x00_00FF
-                data[start_byte + 2] = raw_value >> 16 & 0x00FF
-                data[start_byte + 3] = raw_value >> 24
-
-        self.tx_CAN_IDs[self.J1939_CAN_IDs[pgn]][_DATA] = bytearray(data)
+        can_id_key = self.J1939_CAN_IDs[(pgn, source_address)]
+        signal_spec = self.tx_CAN_IDs[can_id_key]
+        with self._schedule_cv:
+            last_due = signal_spec[_NEXT_DUE] - signal_spec[_TX_RATE_SEC]
+            signal_spec[_TX_RATE_SEC] = tx_rate_sec
+            signal_spec[_STATS].restart()  # periods and jitter of the new rate only
+            signal_spec[_STATS].record_idle()
+            # apply the new rate to the pending slot instead of waiting out the old period
+            self._reschedule(can_id_key, max(last_due + tx_rate_sec, time.monotonic()))
+        # driver cyclic tasks cannot change their period, restart with the new one
+        if signal_spec[_DRIVER_TASK] is not None:
+            self._stop_driver_task(can_id_key)
+            self._sync_driver_tasks(can_id_key)
+
+    def get_tx_rate_ms(self, pgn: int, source_address=0) -> float:
+        return self.tx_CAN_IDs[self.J1939_CAN_IDs[(pgn, source_address)]][_TX_RATE_SEC] * 1000
+
+    def modify_pgn_data(self, pgn: int, spn: int, raw_value: int, source_address=0):
+        self.set_values({(pgn, source_address): {spn: raw_value}})
+
+    def set_values(self, values: dict, source_address=0):
+        """Set the raw values of many SPNs across many PGNs, e.g. {61444: {190: 12000, 513: 150}, 65262: {110: 80}}.
+        PGNs are transmitted from source_address, unless given as (PGN, source address) keys.
+
+        All SPNs of a PGN are packed before its frame is published, so a transmitted frame never carries
+        only part of an update. Each frame is published as a new prebuilt can.Message that replaces the
+        previous one in a single reference assignment, leaving frames being sent untouched.
+        The update is packed into copies of the data, so an error, e.g. a KeyError for an unknown PGN or SPN,
+        leaves every PGN unchanged.
+        """
+        with self._data_lock:
+            updates = []
+            for pgn, spn_values in values.items():
+                can_id_key = self.J1939_CAN_IDs[pgn if type(pgn) is tuple else (pgn, source_address)]
+                signal_spec = self.tx_CAN_IDs[can_id_key]
+                codec, data = signal_spec[_CODEC], bytearray(signal_spec[_DATA])
+                for spn, raw_value in spn_values.items():
+                    codec.pack(data, spn, raw_value)
+                updates.append((can_id_key, data))
+            self._apply(updates)
+
+    def set_bits(self, updates: dict, source_address=0):
+        """Replace bits of the data of many PGNs, e.g. {61444: (mask, bits)}, with the data taken as a little-endian
+        integer. The bits selected by mask are replaced with those of bits. Published like set_values()."""
+        with self._data_lock:
+            new_data = []
+            for pgn, (mask, bits) in updates.items():
+                can_id_key = self.J1939_CAN_IDs[pgn if type(pgn) is tuple else (pgn, source_address)]
+                data = self.tx_CAN_IDs[can_id_key][_DATA]
+                new_data.append((can_id_key, bytearray(
+                    (int.from_bytes(data, 'little') & ~mask | bits).to_bytes(len(data), 'little'))))
+            self._apply(new_data)
+
+    def _apply(self, updates: list):
+        """Replace the data of (CAN ID, new data) pairs and publish them. Must be called with self._data_lock held."""
+        for can_id_key, data in updates:
+            self.tx_CAN_IDs[can_id_key][_DATA] = data
+            self._publish(can_id_key)
+            self._modify_driver_task_data(can_id_key)
+
+    def get_raw_value(self, pgn: int, spn: int, source_address=0) -> int:
+        """Raw value of an SPN in the published frame."""
+        signal_spec = self.tx_CAN_IDs[self.J1939_CAN_IDs[(pgn, source_address)]]
+        return signal_spec[_CODEC].unpack(signal_spec[_MESSAGE].data, spn)
+
+    def source_addresses(self) -> list:
+        return sorted({source_address for _, source_address in self.J1939_CAN_IDs})
+
+    def send_on_request(self, pgn: int, *, source_address: int, requester: int, to_global: bool) -> bool:
+        """Send the current frame of a registered PGN in response to a Request PGN, regardless of tx modes.
+        A destination specific request of a PDU1 PGN, or of more than 8 data bytes, is answered to the requester."""
+        bus = self.bus
+        if bus is None:
+            return False
+        msg = self.tx_CAN_IDs[self.J1939_CAN_IDs[(pgn, source_address)]][_MESSAGE]
+        destination_address = canid.GLOBAL_ADDRESS if to_global else requester
+        if len(msg.data) > 8:
+            return self.transport.send(pgn=pgn, data=msg.data, source_address=source_address,
+                                       destination_address=destination_address)
+        if canid.is_pdu1(pgn):
+            msg = can.Message(arbitration_id=canid.can_id(priority=canid.priority(msg.arbitration_id), pgn=pgn,
+                                                          source_address=source_address,
+                                                          destination_address=destination_address),
+                              is_extended_id=True, data=msg.data)
+        try:
+            bus.send(msg)
+        except can.CanOperationError:
+            return False
+        for listener in self.tx_listeners:
+            listener(msg)
+        return True
+
+    def set_pgn_payload(self, pgn: int, data: bytes, source_address=0):
+        """Replace the whole data of a PGN, e.g. to send a variable length PGN such as DM1 or VIN.
+        Data longer than 8 bytes is broadcast through the transport protocol (BAM).
+        Raises ValueError for data longer than the transport protocol maximum, 1785 bytes."""
+        if len(data) > MAX_PAYLOAD:
+            raise ValueError(f'PGN payload must be at most {MAX_PAYLOAD} bytes, got {len(data)}')
+        can_id_key = self.J1939_CAN_IDs[(pgn, source_address)]
+        with self._data_lock:
+            signal_spec = self.tx_CAN_IDs[can_id_key]
+            signal_spec[_DATA] = bytearray(data)
+            self._publish(can_id_key)
+            if len(data) > 8:
+                self._stop_driver_task(can_id_key)
+            else:
+                self._modify_driver_task_data(can_id_key)
+
+    def _publish(self, can_id_key):
+        can_id, is_extended = can_id_key
+        signal_spec = self.tx_CAN_IDs[can_id_key]
+        signal_spec[_MESSAGE] = can.Message(arbitration_id=can_id, is_extended_id=is_extended,
+                                            data=bytearray(signal_spec[_DATA]))
@@ -0,0 +1,327 @@
+"""J1939-21 transport protocol for PGNs with more than 8 data bytes.
+
+Broadcast payloads are sent as BAM (Broadcast Announce Message) sessions and destination specific
+payloads as CMDT (Connection Mode Data Transfer, RTS/CTS) sessions. All sessions of all source
+addresses are served by one thread from a heap of due times, like the Transmitter's scheduler.
+CMDT sessions advance on CTS, EndOfMsgAck and Abort frames passed to on_message_received(),
+e.g. by a can.Notifier.
+"""
+import heapq
+import itertools
+import threading
+import time
+from collections import deque
+
+import can
+
+from . import canid
+
+
+TP_CM_PGN = 0xEC00  # 60416, connection management
+TP_DT_PGN = 0xEB00  # 60160, data transfer
+TP_PRIORITY = 7
+MAX_PAYLOAD = 1785  # 255 packets * 7 bytes
+
+_CM_RTS = 16
+_CM_CTS = 17
+_CM_EOMA = 19
+_CM_BAM = 32
+_CM_ABORT = 255
+
+_ABORT_TIMEOUT = 3
+
+_T3_SEC = 1.25  # originator waiting for CTS or EndOfMsgAck
+_T4_SEC = 1.05  # originator holding the connection after a CTS for 0 packets
+
+_STATE_ANNOUNCE = 0  # sending the BAM or RTS
+_STATE_SENDING = 1  # sending all packets of a BAM, or the packets granted by the last CTS
+_STATE_WAIT_CTS = 2
+_STATE_WAIT_EOMA = 3
+
+
+class TransportStats:
+    """Transport protocol counters of a single source address."""
+    __slots__ = ('started', 'completed', 'aborted', 'skipped', 'packets_sent', 'bytes_sent', 'errors',
+                 'session_time_total', 'session_time_max')
+
+    def __init__(self):
+        self.started = 0
+        self.completed = 0
+        self.aborted = 0  # timed out, or aborted by the receiver
+        self.skipped = 0  # not started because the same PGN was still in transfer
+        self.packets_sent = 0
+        self.bytes_sent = 0  # payload bytes of completed sessions
+        self.errors = 0  # raised by tx listeners
+        self.session_time_total = 0.0
+        self.session_time_max = 0.0
+
+    def snapshot(self) -> dict:
+        return {
+            'sessions started': self.started,
+            'sessions completed': self.completed,
+            'sessions aborted': self.aborted,
+            'sessions skipped': self.skipped,
+            'packets sent': self.packets_sent,
+            'bytes sent': self.bytes_sent,
+            'errors': self.errors,
+            'session time mean ms': round(self.session_time_total / self.completed * 1000, 3)
+            if self.completed else None,
+            'session time max ms': round(self.session_time_max * 1000, 3),
+            'throughput bytes/s': round(self.bytes_sent / self.session_time_total)
+            if self.session_time_total else None
+        }
+
+
+class _Session:
+    __slots__ = ('pgn', 'data', 'priority', 'source_address', 'destination_address', 'n_packets',
+                 'next_packet', 'last_granted', 'state', 'started', 'due', 'seq')
+
+    def __init__(self, *, pgn, data, priority, source_address, destination_address):
+        self.pgn = pgn
+        self.data = data
+        self.priority = priority
+        self.source_address = source_address
+        self.destination_address = destination_address
+        self.n_packets = (len(data) + 6) // 7
+        self.next_packet = 1
+        self.last_granted = 0
+        self.state = _STATE_ANNOUNCE
+        self.started = None
+        self.due = None
+        self.seq = None
+
+    @property
+    def is_bam(self) -> bool:
+        return self.destination_address == canid.GLOBAL_ADDRESS
+
+    def announce_message(self) -> can.Message:
+        # byte 5 of an RTS is the maximum number of packets per CTS, 0xFF: no limit
+        size = len(self.data)
+        return _message(TP_CM_PGN, self, [_CM_BAM if self.is_bam else _CM_RTS, size & 0xFF, size >> 8,
+                                          self.n_packets, 0xFF])
+
+    def dt_message(self, packet) -> can.Message:
+        chunk = self.data[(packet - 1) * 7:packet * 7]
+        return can.Message(arbitration_id=canid.can_id(priority=self.priority, pgn=TP_DT_PGN,
+                                                       source_address=self.source_address,
+                                                       destination_address=self.destination_address),
+                           is_extended_id=True, data=bytes([packet]) + chunk + b'\xFF' * (7 - len(chunk)))
+
+    def abort_message(self, reason) -> can.Message:
+        return _message(TP_CM_PGN, self, [_CM_ABORT, reason, 0xFF, 0xFF, 0xFF])
+
+
+def _message(pgn, session: _Session, first_5_bytes: list) -> can.Message:
+    return can.Message(arbitration_id=canid.can_id(priority=session.priority, pgn=pgn,
+                                                   source_address=session.source_address,
+                                                   destination_address=session.destination_address),
+                       is_extended_id=True, data=bytes(first_5_bytes) + session.pgn.to_bytes(3, 'little'))
+
+
+class TransportProtocol(can.Listener):
+    def __init__(self, *, bam_packet_gap_ms: float = 50, cmdt_packet_gap_ms: float = 0):
+        """bam_packet_gap_ms: time between BAM packets, 50 to 200 ms per J1939-21, 0 for stress tests.
+        cmdt_packet_gap_ms: time between packets granted by a CTS."""
+        self.bus: can.BusABC = None
+        self.tx_listeners = []  # callables called with every frame sent, must not block
+        # errors raised by tx listeners, the first of each source address
+        self.messages = deque(maxlen=100)
+        self._failed_source_addresses = set()
+        self.bam_packet_gap_sec = bam_packet_gap_ms / 1000
+        self.cmdt_packet_gap_sec = cmdt_packet_gap_ms / 1000
+
+        self.stats = {}  # {source address: TransportStats}
+        self._bam_queues = {}  # {source address: deque of _Session}, the head is in transfer
+        self._cmdt_sessions = {}  # {(source address, destination address): deque of _Session}, idem
+        self._in_transfer = set()  # {(source address, destination address, PGN)} queued or in transfer
+
+        self._schedule = []  # heap of (due, seq, _Session)
+        self._schedule_seq = itertools.count()
+        self._schedule_cv = threading.Condition()
+        self._thread = None
+        self._running = True
+
+    def send(self, *, pgn: int, data: bytes, priority: int = TP_PRIORITY, source_address: int,
+             destination_address: int = canid.GLOBAL_ADDRESS) -> bool:
+        """Queue a multi-packet transfer of data (9 to 1785 bytes). Returns False without queueing
+        if the same PGN is still in transfer from source_address to destination_address."""
+        if not 8 < len(data) <= MAX_PAYLOAD:
+            raise ValueError(f'transport protocol payload must be 9 to {MAX_PAYLOAD} bytes, got {len(data)}')
+        with self._schedule_cv:
+            stats = self.stats.setdefault(source_address, TransportStats())
+            transfer_key = (source_address, destination_address, pgn)
+            if transfer_key in self._in_transfer:
+                stats.skipped += 1
+                return False
+            self._in_transfer.add(transfer_key)
+
+            session = _Session(pgn=pgn, data=bytes(data), priority=priority, source_address=source_address,
+                               destination_address=destination_address)
+            # J1939-21 allows one BAM per source address and one CMDT per source/destination pair at a time
+            if destination_address == canid.GLOBAL_ADDRESS:
+                queue = self._bam_queues.setdefault(source_address, deque())
+            else:
+                queue = self._cmdt_sessions.setdefault((source_address, destination_address), deque())
+            queue.append(session)
+            if len(queue) == 1:
+                self._start(session)
+
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+        return True
+
+    def _start(self, session: _Session):
+        session.started = time.monotonic()
+        self.stats[session.source_address].started += 1
+        self._schedule_at(session, session.started)
+
+    def _schedule_at(self, session: _Session, due: float):
+        """Must be called with self._schedule_cv held."""
+        session.due = due
+        session.seq = next(self._schedule_seq)
+        heapq.heappush(self._schedule, (due, session.seq, session))
+        if self._schedule[0][1] == session.seq:
+            self._schedule_cv.notify()
+
+    def _run(self):
+        while True:
+            with self._schedule_cv:
+                while self._running:
+                    if not self._schedule:
+                        self._schedule_cv.wait()
+                        continue
+                    due, seq, session = self._schedule[0]
+                    if seq != session.seq:
+                        heapq.heappop(self._schedule)
+                        continue
+                    timeout = due - time.monotonic()
+                    if timeout > 0:
+                        self._schedule_cv.wait(timeout)
+                        continue
+                    heapq.heappop(self._schedule)
+                    session.seq = None
+                    msg = self._step(session)
+                    break
+                else:
+                    return
+
+            if msg is not None and self.bus is not None:
+                try:
+                    self.bus.send(msg)
+                except can.CanOperationError:
+                    continue
+                try:
+                    for listener in self.tx_listeners:
+                        listener(msg)
+                except Exception as e:  # the other sessions keep being served
+                    source_address = canid.source_address(msg.arbitration_id)
+                    with self._schedule_cv:
+                        self.stats[source_address].errors += 1
+                    if source_address not in self._failed_source_addresses:
+                        self._failed_source_addresses.add(source_address)
+                        self.messages.append(f'ERROR: transport protocol tx of SA {source_address} - '
+                                             f'{type(e).__name__}: {e}')
+
+    def _step(self, session: _Session):
+        """Advance a due session. Returns the frame to send, if any. Must be called with self._schedule_cv held."""
+        now = time.monotonic()
+
+        if session.state == _STATE_ANNOUNCE:
+            if session.is_bam:
+                session.state = _STATE_SENDING
+                session.last_granted = session.n_packets
+                self._schedule_at(session, now + self.bam_packet_gap_sec)
+            else:
+                session.state = _STATE_WAIT_CTS
+                self._schedule_at(session, now + _T3_SEC)
+            return session.announce_message()
+
+        if session.state == _STATE_SENDING:
+            msg = session.dt_message(session.next_packet)
+            session.next_packet += 1
+            self.stats[session.source_address].packets_sent += 1
+            if session.next_packet <= session.last_granted:
+                self._schedule_at(session, now + (self.bam_packet_gap_sec if session.is_bam
+                                                  else self.cmdt_packet_gap_sec))
+            elif session.is_bam:
+                self._finish(session, completed=True, now=now)
+            else:
+                session.state = _STATE_WAIT_EOMA if session.next_packet > session.n_packets else _STATE_WAIT_CTS
+                self._schedule_at(session, now + _T3_SEC)
+            return msg
+
+        # waiting for CTS or EndOfMsgAck timed out
+        self._finish(session, completed=False, now=now)
+        return session.abort_message(_ABORT_TIMEOUT)
+
+    def _finish(self, session: _Session, *, completed: bool, now: float):
+        """Must be called with self._schedule_cv held."""
+        stats = self.stats[session.source_address]
+        session.seq = None
+        if completed:
+            stats.completed += 1
+            stats.bytes_sent += len(session.data)
+            session_time = now - session.started
+            stats.session_time_total += session_time
+            stats.session_time_max = max(stats.session_time_max, session_time)
+        else:
+            stats.aborted += 1
+        self._in_transfer.discard((session.source_address, session.destination_address, session.pgn))
+
+        if session.is_bam:
+            queue = self._bam_queues[session.source_address]
+        else:
+            queue = self._cmdt_sessions[(session.source_address, session.destination_address)]
+        queue.popleft()
+        if queue:
+            self._start(queue[0])
+
+    def on_message_received(self, msg: can.Message):
+        """Handle CTS, EndOfMsgAck and Abort frames of CMDT sessions."""
+        if not msg.is_extended_id or canid.pgn(msg.arbitration_id) != TP_CM_PGN or len(msg.data) < 8:
+            return
+        key = (canid.destination_address(msg.arbitration_id), canid.source_address(msg.arbitration_id))
+        pgn = int.from_bytes(msg.data[5:8], 'little')
+        control_byte = msg.data[0]
+
+        with self._schedule_cv:
+            queue = self._cmdt_sessions.get(key)
+            if not queue or queue[0].pgn != pgn:
+                return
+            session = queue[0]
+            now = time.monotonic()
+
+            if control_byte == _CM_CTS and session.state == _STATE_WAIT_CTS:
+                n_packets, next_packet = msg.data[1], msg.data[2]
+                if n_packets == 0:  # receiver holds the connection open
+                    self._schedule_at(session, now + _T4_SEC)
+                elif 1 <= next_packet <= session.n_packets:
+                    session.next_packet = next_packet
+                    session.last_granted = min(session.n_packets, next_packet + n_packets - 1)
+                    session.state = _STATE_SENDING
+                    self._schedule_at(session, now)
+            elif control_byte == _CM_EOMA and session.state == _STATE_WAIT_EOMA:
+                self._finish(session, completed=True, now=now)
+            elif control_byte == _CM_ABORT:
+                self._finish(session, completed=False, now=now)
+
+    def telemetry(self) -> list[dict]:
+        with self._schedule_cv:
+            return [{'SA': source_address} | stats.snapshot() for source_address, stats in self.stats.items()]
+
+    def shutdown(self):
+        """Stop the thread and drop the queued sessions. Later sends start a new thread."""
+        with self._schedule_cv:
+            self._running = False
+            self._schedule_cv.notify()
+            thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+        with self._schedule_cv:
+            self._schedule.clear()
+            self._bam_queues.clear()
+            self._cmdt_sessions.clear()
+            self._in_transfer.clear()
+            self._thread = None
+            self._running = True
@@ -0,0 +1,250 @@
+"""Transmit engine in a separate process, so GUI rendering and callbacks never delay frames.
+
+The engine process runs a Channel: the CAN bus, a Transmitter, a Receiver answering requests and, while
+recording, a Recorder, with its own interpreter and GIL. TransmitterProcess is the proxy used in the GUI
+process, with the methods of the Channel and of the Transmitter. SPN changes are merged per SPN and sent to the
+engine process in batches, every batch_ms at most, so a dragged slider costs one pipe message per batch
+rather than one per value. Every other command is sent after the pending SPN changes, in call order.
+"""
+import multiprocessing
+import signal
+import threading
+import time
+
+from .channels import Channel
+from .telemetry import dump_telemetry_csv
+
+
+def _run_engine(conn, transmitter_options: dict, receiver_options: dict):
+    """Main function of the engine process: executes (target, method name, args, kwargs) commands on a Channel
+    until shutdown, replying with the result, or the exception raised, of each."""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # Ctrl+C is handled by the GUI process, which shuts the engine down
+    J1939 = {}  # PGN specs, received before the first registration of each PGN
+    channel = Channel(J1939, transmitter_options=transmitter_options, receiver_options=receiver_options)
+    targets = {'J1939': J1939, 'channel': channel, 'transmitter': channel.transmitter}
+    while True:
+        try:
+            target, name, args, kwargs = conn.recv()
+        except EOFError:  # the GUI process has exited
+            target, name, args, kwargs = 'channel', 'shutdown', (), {}
+        try:
+            result = getattr(targets[target], name)(*args, **kwargs)
+        except Exception as e:
+            result = e
+        if (target, name) == ('channel', 'shutdown'):
+            break
+        conn.send(result)
+    try:
+        conn.send(None)
+    except OSError:
+        pass
+
+
+class TransmitterProcess:
+    def __init__(self, J1939: dict, *, transmitter_options: dict = None, receiver_options: dict = None,
+                 batch_ms: float = 5):
+        self._J1939 = J1939
+        self._registered = set()  # (PGN, source address)
+        self._sent_specs = set()  # PGNs whose spec has been sent to the engine process
+        self.batch_sec = batch_ms / 1000
+        self.batches_sent = 0
+
+        # spawn rather than fork: the GUI process has threads and a graphics context
+        context = multiprocessing.get_context('spawn')
+        self._conn, child_conn = context.Pipe()
+        self._process = context.Process(target=_run_engine, name='akrocansim-tx', daemon=True,
+                                        args=(child_conn, transmitter_options or {}, receiver_options or {}))
+        self._process.start()
+        child_conn.close()
+
+        self._lock = threading.Lock()  # one command and its reply at a time on the pipe
+        self._pending = {}  # {(PGN, source address): {SPN: raw value}} not yet sent
+        self._pending_lock = threading.Lock()
+        self._dirty = threading.Event()
+        self._flush_error: Exception = None  # raised by a batch sent by the flusher thread, see _check_flush()
+        self._running = True
+        self._flusher = threading.Thread(target=self._run_flusher, daemon=True)
+        self._flusher.start()
+
+    def _command(self, target, name, *args, **kwargs):
+        with self._lock:
+            self._check_flush()
+            self._flush()
+            self._conn.send((target, name, args, kwargs))
+            result = self._conn.recv()
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def _call(self, name, *args, **kwargs):
+        """Call a Transmitter method in the engine process."""
+        return self._command('transmitter', name, *args, **kwargs)
+
+    def _channel_call(self, name, *args, **kwargs):
+        """Call a Channel method in the engine process."""
+        return self._command('channel', name, *args, **kwargs)
+
+    def _flush(self):
+        """Send the pending SPN changes. Must be called with self._lock held."""
+        with self._pending_lock:
+            pending, self._pending = self._pending, {}
+            self._dirty.clear()
+        if pending:
+            self._conn.send(('transmitter', 'set_values', (pending,), {}))
+            self.batches_sent += 1
+            result = self._conn.recv()
+            if isinstance(result, Exception):
+                raise result
+
+    def _check_flush(self):
+        """Raise the error of the last batch sent by the flusher thread, once."""
+        error, self._flush_error = self._flush_error, None
+        if error is not None:
+            raise error
+
+    def _run_flusher(self):
+        while True:
+            self._dirty.wait()
+            if not self._running:
+                return
+            time.sleep(self.batch_sec)  # collect the changes made meanwhile
+            with self._lock:
+                if self._running:
+                    try:
+                        self._flush()
+                    except Exception as e:  # kept for the next command, the following batches are still sent
+                        self._flush_error = e
+
+    def flush(self):
+        """Send the pending SPN changes now."""
+        with self._lock:
+            self._check_flush()
+            self._flush()
+
+    def register_tx_PGN(self, *, pgn, priority, source_address, tx_rate_ms, data_length=None):
+        if pgn not in self._sent_specs:
+            self._command('J1939', '__setitem__', pgn, self._J1939[pgn])
+            self._sent_specs.add(pgn)
+        self._call('register_tx_PGN', pgn=pgn, priority=priority, source_address=source_address,
+                   tx_rate_ms=tx_rate_ms, data_length=data_length)
+        self._registered.add((pgn, source_address))
+
+    def connect(self, can_interface: dict) -> str:
+        """Open the bus of a [CAN_INTERFACE] table in the engine process."""
+        return self._channel_call('connect', can_interface)
+
+    def disconnect(self) -> str:
+        return self._channel_call('disconnect')
+
+    def is_connected(self) -> bool:
+        return self._channel_call('is_connected')
+
+    def modify_pgn_data(self, pgn: int, spn: int, raw_value: int, source_address=0):
+        self.set_values({(pgn, source_address): {spn: raw_value}})
+
+    def set_values(self, values: dict, source_address=0):
+        """As Transmitter.set_values(), applied with the next batch. Errors of a batch are raised by the next
+        command, including set_values()."""
+        self._check_flush()
+        keys = [pgn if type(pgn) is tuple else (pgn, source_address) for pgn in values]
+        for key, spn_values in zip(keys, values.values()):
+            if key not in self._registered:
+                raise KeyError(key)
+            spn_specs = self._J1939[key[0]]['SPNs']
+            for spn in spn_values:
+                if spn not in spn_specs:
+                    raise KeyError(spn)
+        with self._pending_lock:
+            for key, spn_values in zip(keys, values.values()):
+                self._pending.setdefault(key, {}).update(spn_values)
+            self._dirty.set()
+
+    def set_pgn_payload(self, pgn: int, data: bytes, source_address=0):
+        self._call('set_pgn_payload', pgn, bytes(data), source_address)
+
+    def set_bits(self, updates: dict, source_address=0):
+        self._call('set_bits', updates, source_address)
+
+    def get_raw_value(self, pgn: int, spn: int, source_address=0) -> int:
+        return self._call('get_raw_value', pgn, spn, source_address)
+
+    def set_tx_mode_stop(self, pgn=None, source_address=0):
+        self._call('set_tx_mode_stop', pgn, source_address)
+
+    def set_tx_mode_continuous(self, pgn=None, source_address=0):
+        self._call('set_tx_mode_continuous', pgn, source_address)
+
+    def set_tx_mode_per_PGN(self):
+        self._call('set_tx_mode_per_PGN')
+
+    def set_tx_once(self, pgn=None, source_address=0):
+        self._call('set_tx_once', pgn, source_address)
+
+    def modify_pgn_tx_rate(self, pgn, tx_rate_ms, source_address=0):
+        self._call('modify_pgn_tx_rate', pgn, tx_rate_ms, source_address)
+
+    def get_tx_rate_ms(self, pgn: int, source_address=0) -> float:
+        return self._call('get_tx_rate_ms', pgn, source_address)
+
+    def expected_bus_load(self, bitrate: int = None) -> float:
+        return self._call('expected_bus_load', bitrate)
+
+    def source_addresses(self) -> list:
+        return sorted({source_address for _, source_address in self._registered})
+
+    def telemetry(self) -> list[dict]:
+        return self._call('telemetry')
+
+    def dump_telemetry_csv(self, telemetry_csv):
+        dump_telemetry_csv(telemetry=self.telemetry(), telemetry_csv=telemetry_csv)
+
+    def pop_messages(self) -> list[str]:
+        return self._call('pop_messages')
+
+    def start_recording(self, path, **options):
+        """Record the frames sent and received by the engine process, options as for Recorder()."""
+        self._channel_call('start_recording', path, **options)
+
+    def stop_recording(self) -> dict:
+        """Telemetry of the stopped Recorder, None if not recording."""
+        return self._channel_call('stop_recording')
+
+    def recorder_telemetry(self) -> dict:
+        """Telemetry of the Recorder and the file being written, None if not recording."""
+        return self._channel_call('recorder_telemetry')
+
+    def transport_telemetry(self) -> list[dict]:
+        return self._channel_call('transport_telemetry')
+
+    def receiver_telemetry(self) -> dict:
+        return self._channel_call('receiver_telemetry')
+
+    def bus_load_telemetry(self) -> dict:
+        return self._channel_call('bus_load_telemetry')
+
+    def shutdown(self, timeout: float = 5):
+        """Stop transmission, disconnect and end the engine process. An error of the pending SPN changes, or of
+        a batch not yet reported, is raised once the engine process has ended."""
+        if not self._running:
+            return
+        with self._lock:
+            error, self._flush_error = self._flush_error, None
+            try:
+                self._flush()
+            except (OSError, EOFError):
+                pass
+            except Exception as e:
+                error = e
+            try:
+                self._conn.send(('channel', 'shutdown', (), {}))
+                self._conn.recv()
+            except (OSError, EOFError):
+                pass
+            self._running = False
+        self._dirty.set()
+        self._process.join(timeout)
+        if self._process.is_alive():
+            self._process.terminate()
+        self._conn.close()
+        if error is not None:
+            raise error
@@ -1 +1,7 @@
-import akrocansim.__main__
+import multiprocessing
+
+if __name__ == '__main__':
+    # the spawned transmit engine and J1939DA normalization processes of the frozen executable start from this
+    # script too: freeze_support() runs their task instead of starting the application again
+    multiprocessing.freeze_support()
+    import akrocansim.__main__
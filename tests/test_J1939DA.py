@@ -0,0 +1,136 @@
+import json
+import tomllib
+
+import pytest
+
+openpyxl = pytest.importorskip('openpyxl')
+
+import akrocansim
+from akrocansim import J1939DA, specstore
+from akrocansim.rules import Rules
+from akrocansim.specstore import SpecStore
+from akrocansim.config import default_config_toml
+
+
+ROWS = [  # PGN, Acronym, PGN Data Length, Transmission Rate, SPN, SPN Description, Position, Length, Resolution,
+          # Offset, Data Range, Units
+    (61444, 'EEC1', 8, '20 ms', 899, '0000 = Low idle_x000D_\n0001 = High idle', '1.1', '4 bits',
+     '16 states/4 bit', '0', '0 to 15', 'bit'),
+    (61444, 'ignored', 8, '50 ms', 190, 'Engine speed', '4-5', '2 bytes', '0.125 rpm/bit', '0 rpm',
+     '0 to 8,031.875 rpm', 'rpm'),
+    (65226, 'DM1', 'Variable', 'On request', 1213, 'Malfunction indicator lamp', '1.7', '2 bits',
+     '4 states/2 bit', '0', '0 to 3', 'bit'),
+]
+
+
+def build_workbook(J1939DA_dir, last_row):
+    config = tomllib.loads(default_config_toml)['J1939DA']
+    config['filename'] = 'J1939DA_TEST.xlsx'
+    config['SPNs_to_parse']['last_row'] = last_row
+    columns = config['SPNs_and_PGNs_sheet_columns']
+    names = ('PGN', 'Acronym', 'PGN Data Length', 'Transmission Rate', 'SPN', 'SPN Description',
+             'SPN Position in PGN', 'SPN Length', 'Resolution', 'Offset', 'Data Range', 'Units')
+    wb = openpyxl.Workbook()
+    sheet = wb.active
+    sheet.title = config['SPNs_and_PGNs_sheet']
+    for n, row in enumerate(ROWS, start=config['SPNs_to_parse']['first_row']):
+        for name, value in zip(names, row):
+            sheet[f'{columns[name]}{n}'] = value
+    wb.save(J1939DA_dir / config['filename'])
+    return config
+
+
+def test_parse_J1939DA(tmp_path):
+    config = build_workbook(tmp_path, last_row=10)  # rows 8 to 10 are after the end of the sheet
+    J1939DA_store = tmp_path / 'J1939DA.sqlite'
+    assert J1939DA.parse_J1939DA(J1939DA_config=config, J1939DA_dir=tmp_path,
+                                 J1939DA_store=J1939DA_store) == 'processed 3 PGNs and 4 SPNs'
+    J1939 = SpecStore(J1939DA_store)
+
+    assert list(J1939) == [61444, 65226, None]  # empty rows are parsed as PGN None
+    eec1 = J1939[61444]
+    assert (eec1['Acronym'], eec1['Transmission Rate'], eec1['transmission_rate_ms']) == ('EEC1', '20 ms', 20)
+    assert list(eec1['SPNs']) == [899, 190]
+    assert eec1['SPNs'][899]['SPN Description'] == '0000 = Low idle\n0001 = High idle'
+    assert eec1['SPNs'][899]['discrete_values'][1] == '0001 = High idle'
+    assert {key: eec1['SPNs'][190][key] for key in ('start_byte', 'start_bit', 'length_bits', 'scale', 'offset')} \
+           == {'start_byte': 3, 'start_bit': 0, 'length_bits': 16, 'scale': 0.125, 'offset': 0}
+    assert J1939[65226]['PGN Data Length'] == 8
+    assert list(J1939[None]['SPNs']) == [None]
+    assert not list(tmp_path.glob('*.jsonl'))  # inspection files are opt-in
+
+
+def test_inspection_files(tmp_path):
+    config = build_workbook(tmp_path, last_row=7)
+    inspection = J1939DA.InspectionExport()
+    J1939DA.parse_J1939DA(J1939DA_config=config, J1939DA_dir=tmp_path, J1939DA_store=tmp_path / 'J1939DA.sqlite',
+                          inspection=inspection)
+    assert inspection.join(timeout=10)
+    assert len(inspection.files) == 10
+    assert inspection.files[0] == tmp_path / 'J1939DA_TEST.jsonl'
+    lines = inspection.files[0].read_text(encoding='utf-8').splitlines()
+    assert [json.loads(line)[0] for line in lines] == [61444, 65226]
+    assert json.loads(lines[0])[1]['SPNs']['190']['scale'] == 0.125
+    resolutions = (tmp_path / 'J1939DA_TEST_resolutions.jsonl').read_text(encoding='utf-8').splitlines()
+    assert json.loads(resolutions[1]) == ['0.125 rpm/bit', 0.125]
+    messages = list(inspection.messages)
+    assert messages[0] == 'INFO: inspection file 1 of 10 written: J1939DA_TEST.jsonl'
+    assert messages[-1].startswith('INFO: inspection files written in ')
+
+
+def test_parallel_normalization(tmp_path, monkeypatch):
+    config = build_workbook(tmp_path, last_row=7)
+    J1939 = {}
+    for workers in (1, 2):
+        monkeypatch.setattr(J1939DA, 'NORMALIZE_MIN_PARALLEL', 0)
+        monkeypatch.setattr(J1939DA, 'NORMALIZE_CHUNK_SIZE', 2)
+        J1939DA_store = tmp_path / f'J1939DA_{workers}.sqlite'
+        J1939DA.parse_J1939DA(J1939DA_config=config, J1939DA_dir=tmp_path, J1939DA_store=J1939DA_store,
+                              workers=workers)
+        J1939[workers] = SpecStore(J1939DA_store)
+    assert J1939[1] == J1939[2]
+
+    normalized = J1939DA._normalize(J1939[1], Rules(), workers=1)
+    assert normalized[('Offset', str, '0')] == 0  # once for the 3 SPNs
+    assert len([key for key in normalized if key[0] == 'Offset']) == 2
+    assert normalized[('discrete_values', tuple, (1213, 'Malfunction indicator lamp'))] == {}
+
+
+def test_cache(tmp_path, monkeypatch):
+    config = build_workbook(tmp_path, last_row=7)
+    paths = {'J1939DA_config': config, 'J1939DA_dir': tmp_path, 'J1939DA_store': tmp_path / 'J1939DA.sqlite',
+             'rules': Rules()}
+    cache = {'J1939DA_cache': tmp_path / 'J1939DA_cache.pkl'}
+    assert J1939DA.cache_outdated(**paths) == 'J1939DA.sqlite not found'
+    assert J1939DA.parse_J1939DA(**paths, **cache) == 'processed 2 PGNs and 3 SPNs'
+    assert J1939DA.cache_outdated(**paths) is None
+
+    wb = openpyxl.load_workbook(tmp_path / config['filename'])
+    wb.active['X6'] = '-500 rpm'  # offset of SPN 190
+    wb.save(tmp_path / config['filename'])
+    assert J1939DA.cache_outdated(**paths) == 'J1939DA_TEST.xlsx has changed'
+    assert J1939DA.parse_J1939DA(**paths, **cache) == ('processed 2 PGNs and 3 SPNs, '
+                                              '1 of 19 distinct field values normalized')
+    assert SpecStore(paths['J1939DA_store'])[61444]['SPNs'][190]['offset'] == -500
+    assert J1939DA.cache_outdated(**paths) is None
+
+    assert J1939DA.cache_outdated(**paths | {'J1939DA_config': config | {'SPNs_to_parse': {
+        'first_row': 5, 'last_row': 6}}}) == '[J1939DA] configuration has changed'
+    (tmp_path / 'J1939DA_rules.toml').write_text("['Transmission Rate'.exact]\n'20 ms' = 25\n")
+    user_rules = Rules(tmp_path / 'J1939DA_rules.toml')
+    assert J1939DA.cache_outdated(**paths | {'rules': user_rules}) == 'normalization rules have changed'
+    J1939DA.parse_J1939DA(**paths | cache | {'rules': user_rules})
+    assert SpecStore(paths['J1939DA_store'])[61444]['transmission_rate_ms'] == 25
+    monkeypatch.setattr(J1939DA, '__version__', '99.0.0')
+    assert J1939DA.cache_outdated(**paths) == f'parsed by akrocansim {akrocansim.__version__}'
+    assert J1939DA.parse_J1939DA(**paths, **cache) == 'processed 2 PGNs and 3 SPNs'  # nothing reused
+
+    # the store is checked without reading the value cache
+    cache['J1939DA_cache'].write_bytes(b'garbage')
+    assert J1939DA.cache_outdated(**paths) is None
+    assert J1939DA.parse_J1939DA(**paths, **cache) == 'processed 2 PGNs and 3 SPNs'
+    assert J1939DA.cache_outdated(**paths) is None
+    specstore.write(paths['J1939DA_store'], {})
+    assert J1939DA.cache_outdated(**paths) == 'J1939DA.sqlite has no cache key or is unreadable'
+    paths['J1939DA_store'].write_bytes(b'garbage')
+    assert J1939DA.cache_outdated(**paths) == 'J1939DA.sqlite has no cache key or is unreadable'
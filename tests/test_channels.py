@@ -0,0 +1,113 @@
+import time
+
+import can
+import pytest
+
+from akrocansim.busload import BusLoad, expected_bus_load, frame_bits, pgn_bits
+from akrocansim.channels import Channels
+
+
+J1939 = {
+    61444: {'PGN Data Length': 8, 'Default Priority': 3, 'SPNs': {
+        190: {'start_byte': 3, 'start_bit': 0, 'length_bits': 16, 'scale': 0.125, 'offset': 0},
+    }},
+    65262: {'PGN Data Length': 8, 'Default Priority': 6, 'SPNs': {
+        110: {'start_byte': 0, 'start_bit': 0, 'length_bits': 8, 'scale': 1, 'offset': -40},
+    }},
+}
+
+
+def receive_all(bus, duration):
+    frames, end = [], time.monotonic() + duration
+    while (msg := bus.recv(max(0.0, end - time.monotonic()))) is not None:
+        frames.append(msg)
+    return frames
+
+
+def test_frame_bits_and_bus_load():
+    assert frame_bits(8) == 131 and frame_bits(8, is_extended_id=False) == 111 and frame_bits(0) == 67
+    bus_load = BusLoad(bitrate=250000)
+    bus_load.telemetry()
+    for _ in range(100):
+        bus_load.record_tx(can.Message(arbitration_id=0x0CF00400, data=bytes(8)))
+    bus_load.on_message_received(can.Message(arbitration_id=0x18EAFF00, data=bytes(3)))
+    time.sleep(0.1)
+    telemetry = bus_load.telemetry()
+    assert telemetry['frames sent'] == 100 and telemetry['frames received'] == 1
+    assert 0 < telemetry['bus load %'] <= 100 * 13191 / 250000 / 0.1
+
+
+@pytest.mark.parametrize('engine', ['thread', 'process'])
+def test_channels(engine, tmp_path):
+    can_channels = {'default': {'interface': 'virtual', 'channel': f'test_channels_pt_{engine}', 'bitrate': 250000},
+                    'body': {'interface': 'virtual', 'channel': f'test_channels_body_{engine}', 'bitrate': 500000}}
+    channels = Channels(J1939, can_channels, {0: 'default', 0x21: 'body'}, engine=engine,
+                        receiver_options={'acceptance_filters': False})
+    pt_bus = can.Bus(interface='virtual', channel=f'test_channels_pt_{engine}')
+    body_bus = can.Bus(interface='virtual', channel=f'test_channels_body_{engine}')
+    try:
+        channels.register_tx_PGN(pgn=61444, priority=3, source_address=0, tx_rate_ms=10)
+        channels.register_tx_PGN(pgn=65262, priority=6, source_address=0x21, tx_rate_ms=10)
+        assert channels.source_addresses() == [0, 0x21]
+        assert channels.connect() == ['INFO: channel default - connected to: Virtual bus channel '
+                                      f'test_channels_pt_{engine}, bit rate: 250 kbit/s',
+                                      'INFO: channel body - connected to: Virtual bus channel '
+                                      f'test_channels_body_{engine}, bit rate: 500 kbit/s']
+        assert channels.is_connected()
+        paths = channels.start_recording(tmp_path / 'rec.csv')
+        assert paths == [tmp_path / 'rec_default.csv', tmp_path / 'rec_body.csv']
+
+        channels.set_values({61444: {190: 12000}, (65262, 0x21): {110: 80}})
+        assert channels.get_raw_value(65262, 110, source_address=0x21) == 80
+        assert channels.get_tx_rate_ms(65262, source_address=0x21) == 10
+        channels.channel_telemetry()
+        channels.set_tx_mode_continuous()
+        time.sleep(0.2)
+        channels.set_tx_mode_stop()
+        if engine == 'thread':  # the virtual buses of an engine process are not reachable from here
+            pt_bus.send(can.Message(arbitration_id=0x18EAFFF9, data=bytes([0x00, 0xF0, 0x00])))  # request of 61440
+            time.sleep(0.05)
+            assert {msg.arbitration_id for msg in receive_all(body_bus, 0.05)} == {0x18FEEE21}
+
+        telemetry = {row['channel']: row for row in channels.channel_telemetry()}
+        assert list(telemetry) == ['default', 'body', 'all']
+        assert telemetry['default']['frames sent'] > 10 and telemetry['body']['frames sent'] > 10
+        assert telemetry['default']['bus load %'] > 0 and telemetry['all']['bus load %'] is None
+        assert telemetry['all']['frames sent'] == telemetry['default']['frames sent'] + telemetry['body']['frames sent']
+        if engine == 'thread':
+            assert telemetry['default']['frames received'] == 1 and telemetry['default']['requests received'] == 1
+        assert {(row['channel'], row['SA']) for row in channels.telemetry()} == {('default', 0), ('body', 0x21)}
+
+        recording = channels.stop_recording()
+        assert recording['frames written'] == telemetry['all']['frames sent'] + telemetry['all']['frames received']
+        pt_frames = [msg for msg in can.LogReader(paths[0]) if msg.arbitration_id == 0x0CF00400]
+        body_frames = list(can.LogReader(paths[1]))
+        assert {msg.arbitration_id for msg in body_frames} == {0x18FEEE21}
+        assert pt_frames[-1].data[3:5] == bytes([0xE0, 0x2E]) and body_frames[-1].data[0] == 80
+        assert len(body_frames) == telemetry['body']['frames sent']
+    finally:
+        channels.shutdown()
+        pt_bus.shutdown()
+        body_bus.shutdown()
+
+
+def test_bus_load_warnings():
+    assert frame_bits(8, stuff_bits=True) == 160 and frame_bits(8, is_extended_id=False, stuff_bits=True) == 135
+    assert pgn_bits(0) == frame_bits(0, stuff_bits=True) and pgn_bits(12) == 3 * 160
+    assert expected_bus_load([(8, 0.01), (12, 0.1)], 250000) == pytest.approx((16000 + 4800) / 2500)
+
+    can_channels = {'default': {'interface': 'virtual', 'channel': 'test_bus_load_warnings_pt', 'bitrate': 125000},
+                    'body': {'interface': 'virtual', 'channel': 'test_bus_load_warnings_body', 'bitrate': 250000}}
+    channels = Channels(J1939, can_channels, {0x21: 'body'}, transmitter_options={'max_bus_load_pct': 50})
+    try:
+        channels.register_tx_PGN(pgn=61444, priority=3, source_address=0, tx_rate_ms=1)
+        channels.register_tx_PGN(pgn=65262, priority=6, source_address=0x21, tx_rate_ms=1)
+        assert channels.bus_load_warnings() == [
+            'WARNING: channel default - expected bus load 128.0 % at 125 kbit/s, periodic frames will be late or missed',
+            'WARNING: channel body - expected bus load 64.0 % exceeds [Transmitter] max_bus_load_pct = 50, '
+            'periodic frames will be delayed']
+        channels.modify_pgn_tx_rate(61444, 10)
+        assert len(channels.connect()) == 3
+        assert [row['expected bus load %'] for row in channels.channel_telemetry()] == [12.8, 64.0, None]
+    finally:
+        channels.shutdown()
@@ -0,0 +1,59 @@
+import pytest
+
+from akrocansim.codec import SPNCodec, PGNCodec
+from akrocansim import signaltools
+
+
+@pytest.mark.parametrize('start_byte, start_bit, length_bits', [
+    (0, 0, 1), (0, 3, 4), (1, 3, 21),  # '2.4-4'
+    (0, 7, 2), (2, 4, 9), (1, 0, 12), (0, 0, 16), (3, 0, 24), (4, 0, 32), (0, 0, 64), (0, 1, 63)
+])
+def test_pack_unpack_roundtrip(start_byte, start_bit, length_bits):
+    field = SPNCodec(start_byte=start_byte, start_bit=start_bit, length_bits=length_bits)
+    for raw_value in (0, 1, field.max_raw, 0x5A5A5A5A5A5A5A5A & field.max_raw):
+        data = bytearray(b'\xFF' * 8)
+        field.pack(data, raw_value)
+        assert field.unpack(data) == raw_value
+
+        # bits outside of the field are untouched
+        as_int = int.from_bytes(data, 'little')
+        outside = ~(field.max_raw << field.bit_offset) & (1 << 64) - 1
+        assert as_int & outside == outside
+        assert as_int >> field.bit_offset & field.max_raw == raw_value
+
+
+def test_pack_truncates_to_field_length():
+    field = SPNCodec(start_byte=0, start_bit=2, length_bits=2)
+    data = bytearray(1)
+    field.pack(data, 0b111)
+    assert data == bytearray([0b1100])
+
+
+def test_unpositioned_spn():
+    with pytest.raises(ValueError):
+        SPNCodec(start_byte=None, start_bit=None, length_bits=8)
+
+
+def test_pgn_codec():
+    pgn_spec = {'PGN Data Length': 8, 'SPNs': {
+        190: {'start_byte': 3, 'start_bit': 0, 'length_bits': 16},
+        899: {'start_byte': 0, 'start_bit': 0, 'length_bits': 4},
+        1234: {'start_byte': None, 'start_bit': None, 'length_bits': None},
+        4321: {'start_byte': 6, 'start_bit': 0, 'length_bits': 32},
+    }}
+    codec = PGNCodec(pgn_spec)
+    assert set(codec.fields) == {190, 899}
+
+    data = codec.new_buffer()
+    codec.pack(data, 190, 0x1234)
+    codec.pack(data, 899, 0x5)
+    assert data == bytearray([0x05, 0, 0, 0x34, 0x12, 0, 0, 0])
+    assert codec.unpack_all(data) == {190: 0x1234, 899: 0x5}
+
+
+def test_signaltools_pack_unpack():
+    signal_spec = {'start_byte': 1, 'start_bit': 3, 'length_bits': 10}
+    data = bytearray(8)
+    signaltools.pack(data=data, signal_spec=signal_spec, raw_value=0x2AB)
+    assert signaltools.unpack(data=data, signal_spec=signal_spec) == 0x2AB
+    assert signaltools.start_bit(signal_spec=signal_spec) == 11
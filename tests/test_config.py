@@ -0,0 +1,91 @@
+import tomllib
+
+import pytest
+
+from akrocansim import J1939DA, specstore
+from akrocansim.config import Config, default_config_toml
+from akrocansim.rules import Rules
+
+
+J1939 = {
+    61444: {'PGN Data Length': 8, 'Default Priority': 3, 'SPNs': {190: {}, 513: {}}},
+    65262: {'PGN Data Length': 8, 'Default Priority': 6, 'SPNs': {110: {}}},
+}
+
+
+@pytest.fixture
+def config_dir(tmp_path):
+    (tmp_path / 'J1939DA').mkdir()
+    (tmp_path / 'J1939DA' / 'J1939DA_TEST.xlsx').touch()
+    specstore.write(tmp_path / 'J1939DA' / 'J1939DA.sqlite', J1939)
+    return tmp_path
+
+
+def write_config(config_dir, tx_pgns_spns, nodes=''):
+    config_toml = default_config_toml.replace("filename = 'J1939DA_??????.xlsx'", "filename = 'J1939DA_TEST.xlsx'")
+    config_toml = config_toml.replace('#61444 = [513, 190]\n', tx_pgns_spns, 1)
+    (config_dir / 'config.toml').write_text(config_toml + nodes, encoding='utf-8')
+    # J1939DA.sqlite is up to date with the workbook and [J1939DA]
+    specstore.write(config_dir / 'J1939DA' / 'J1939DA.sqlite', J1939, meta={'cache_key': J1939DA.cache_key(
+        J1939DA_config=tomllib.loads(config_toml)['J1939DA'], J1939DA_dir=config_dir / 'J1939DA', rules=Rules())})
+
+
+def test_load_tx_PGNs_SPNs(config_dir):
+    write_config(config_dir, '61444 = [513, 190]\n65262 = [110, 999]\n')
+    config = Config(config_dir)
+    messages = config.load()
+    assert messages[-1] == 'ERROR: SPN 999 not found in parsed elements of J1939DA'
+    assert config.tx_PGNs_SPNs == {61444: [513, 190]}
+    assert config.tx_nodes == {0: {'name': 'default', 'channel': 'default', 'Tx_PGNs_SPNs': {61444: [513, 190]}}}
+
+
+def test_load_nodes(config_dir):
+    write_config(config_dir, '61444 = [190]\n', nodes='''
+[Nodes.engine_2]
+source_address = 0x01
+Tx_PGNs_SPNs = {61444 = [513, 190], 65262 = [110]}
+
+[Nodes.duplicate]
+source_address = 1
+Tx_PGNs_SPNs = {65262 = [110]}
+''')
+    config = Config(config_dir)
+    messages = config.load()
+    assert "ERROR: [Nodes.duplicate] source address 1 already used by node 'engine_2'" in messages
+    assert config.tx_nodes == {
+        0: {'name': 'default', 'channel': 'default', 'Tx_PGNs_SPNs': {61444: [190]}},
+        1: {'name': 'engine_2', 'channel': 'default', 'Tx_PGNs_SPNs': {61444: [513, 190], 65262: [110]}},
+    }
+
+
+def test_load_channels(config_dir):
+    write_config(config_dir, '61444 = [190]\n', nodes='''
+[Channels.body]
+interface = 'virtual'
+channel = 'body'
+
+[Nodes.body_controller]
+source_address = 0x21
+channel = 'body'
+Tx_PGNs_SPNs = {65262 = [110]}
+
+[Nodes.trailer]
+source_address = 0xC8
+channel = 'trailer'
+Tx_PGNs_SPNs = {65262 = [110]}
+''')
+    config = Config(config_dir)
+    messages = config.load()
+    assert "ERROR: [Nodes.trailer] channel 'trailer' not found in [Channels]" in messages
+    assert list(config.can_channels) == ['default', 'body']
+    assert config.can_channels['body'] == {'interface': 'virtual', 'channel': 'body'}
+    assert config.node_channels() == {0: 'default', 0x21: 'body'}
+
+
+def test_load_invalid_rules(config_dir):
+    write_config(config_dir, '61444 = [190]\n')
+    (config_dir / 'J1939DA_rules.toml').write_text("['Resolution']\n", encoding='utf-8')
+    config = Config(config_dir)
+    messages = config.load()
+    assert messages[-1].startswith("ERROR: J1939DA normalization rules - J1939DA_rules.toml: ['Resolution'] is not")
+    assert config.J1939_spec is None
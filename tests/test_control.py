@@ -0,0 +1,132 @@
+import json
+import socket
+import time
+
+import can
+import pytest
+
+from akrocansim.control import ControlClient, ControlError, ControlServer
+from akrocansim.transmitter import Transmitter
+
+
+J1939 = {
+    61444: {'PGN Data Length': 8, 'Default Priority': 3, 'SPNs': {
+        190: {'start_byte': 3, 'start_bit': 0, 'length_bits': 16, 'scale': 0.125, 'offset': 0},
+        899: {'start_byte': 0, 'start_bit': 0, 'length_bits': 4, 'scale': '', 'offset': ''},
+    }},
+    65262: {'PGN Data Length': 8, 'Default Priority': 6, 'SPNs': {
+        110: {'start_byte': 0, 'start_bit': 0, 'length_bits': 8, 'scale': 1, 'offset': -40},
+    }},
+}
+
+
+@pytest.fixture
+def transmitter():
+    transmitter = Transmitter(J1939)
+    transmitter.register_tx_PGN(pgn=61444, priority=3, source_address=0, tx_rate_ms=10)
+    transmitter.register_tx_PGN(pgn=65262, priority=6, source_address=0, tx_rate_ms=100)
+    transmitter.register_tx_PGN(pgn=65262, priority=6, source_address=0x21, tx_rate_ms=100)
+    yield transmitter
+    transmitter.shutdown()
+
+
+@pytest.fixture
+def server(transmitter):
+    server = ControlServer(J1939, transmitter, port=0)
+    assert server.start().startswith('INFO: control server listening on: 127.0.0.1:')
+    yield server
+    server.stop()
+
+
+def test_protocol(server):
+    with socket.create_connection(server.address) as sock, sock.makefile('rwb') as f:
+        f.write(b'{"id": 1, "op": "set_values", "values": {"61444": {"190": 12000}}}\n'
+                b'{"op": "get_value", "pgn": 61444, "spn": 190, "physical": true}\n'
+                b'\n'
+                b'{"id": "x", "op": "set_tx_mode", "mode": "bogus"}\n'
+                b'not json\n')
+        f.flush()
+        replies = [json.loads(f.readline()) for _ in range(4)]
+    assert replies[0] == {'id': 1, 'ok': True, 'result': None}
+    assert replies[1] == {'ok': True, 'result': 1500}
+    assert replies[2] == {'id': 'x', 'ok': False, 'error': "ValueError: unknown tx mode 'bogus'"}
+    assert replies[3]['ok'] is False and replies[3]['error'].startswith('JSONDecodeError')
+    telemetry = server.telemetry()
+    assert telemetry['requests'] == 4 and telemetry['errors'] == 2
+
+
+def test_client(server, transmitter):
+    with ControlClient(server.address) as client:
+        assert client.ping() == 'pong'
+        assert client.source_addresses() == [0, 0x21]
+        client.set_values({61444: {190: 1500, 899: 3}, 65262: {110: 80}}, physical=True)
+        assert transmitter.get_raw_value(61444, 190) == 12000 and transmitter.get_raw_value(61444, 899) == 3
+        assert client.get_value(65262, 110) == 120 and client.get_value(65262, 110, physical=True) == 80
+        client.set_values({65262: {110: 1000}}, source_address=0x21, physical=True)
+        assert client.get_value(65262, 110, source_address=0x21) == 255  # clamped
+
+        client.set_tx_rate(61444, 20)
+        assert transmitter.get_tx_rate_ms(61444) == 20
+        for tx_rate_ms in (0, -10, 5, 50_001, '20'):
+            with pytest.raises(ControlError, match='ValueError: tx_rate_ms must be 10 to 50000'):
+                client.set_tx_rate(61444, tx_rate_ms)
+        assert transmitter.get_tx_rate_ms(61444) == 20
+        client.set_tx_mode('continuous', 61444)
+        client.set_tx_mode('per_pgn')
+        with pytest.raises(ControlError, match="KeyError: \\(61444, 5\\)"):
+            client.set_tx_mode('once', 61444, source_address=5)
+        assert [row['PGN'] for row in client.telemetry()] == [61444, 65262, 65262]
+
+
+def test_pipelining(server, transmitter):
+    bus = can.Bus(interface='virtual', channel='test_control')
+    rx_bus = can.Bus(interface='virtual', channel='test_control')
+    transmitter.bus = bus
+    try:
+        with ControlClient(server.address, max_pending=100) as client:
+            client.set_tx_mode('continuous', 61444)
+            start = time.perf_counter()
+            for value in range(5000):
+                client.set_values({61444: {190: value}}, wait=False)
+            client.sync()
+            elapsed = time.perf_counter() - start
+            assert transmitter.get_raw_value(61444, 190) == 4999
+            assert elapsed < 5  # thousands of updates per second
+
+            client.set_values({61444: {190: 1}}, wait=False)
+            client.set_values({61444: {12345: 1}}, wait=False)
+            client.set_values({61444: {190: 2}}, wait=False)
+            with pytest.raises(ControlError, match='12345'):
+                client.sync()
+            client.sync()  # the error is raised once
+            assert client.get_value(61444, 190) == 2
+            time.sleep(0.05)
+            client.set_tx_mode('stop', 61444)
+
+        frames = []
+        while (msg := rx_bus.recv(0.05)) is not None:
+            frames.append(msg)
+        assert frames and frames[-1].data[3:5] == bytes([2, 0])
+    finally:
+        transmitter.bus = None
+        bus.shutdown()
+        rx_bus.shutdown()
+
+
+def test_unix_socket(transmitter, tmp_path):
+    if not hasattr(socket, 'AF_UNIX'):
+        pytest.skip('Unix domain sockets are not supported on this platform')
+    path = tmp_path / 'akrocansim.sock'
+    server = ControlServer(J1939, transmitter, unix_socket=str(path))
+    assert server.start() == f'INFO: control server listening on: {path}'
+    try:
+        with ControlClient(path) as client:
+            client.set_values({65262: {110: 70}})
+            assert client.get_value(65262, 110) == 70
+    finally:
+        server.stop()
+    assert not path.exists()
+
+
+def test_address_in_use(server, transmitter):
+    assert ControlServer(J1939, transmitter, port=server.address[1]).start().startswith('ERROR: control server - ')
@@ -0,0 +1,110 @@
+import time
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from akrocansim import generators
+from akrocansim.generators import SignalGenerator
+from akrocansim.transmitter import Transmitter, _DATA
+
+
+J1939 = {
+    61444: {'PGN Data Length': 8, 'Default Priority': 3, 'SPNs': {
+        190: {'start_byte': 3, 'start_bit': 0, 'length_bits': 16, 'scale': 0.125, 'offset': 0,
+              'min_value': 0, 'max_value': 8031.875},
+        899: {'start_byte': 0, 'start_bit': 0, 'length_bits': 4, 'scale': 'ENUM', 'offset': 0,
+              'min_value': 0, 'max_value': 15},
+        513: {'start_byte': 2, 'start_bit': 0, 'length_bits': 8, 'scale': 1, 'offset': -125,
+              'min_value': -125, 'max_value': 125},
+    }},
+    65262: {'PGN Data Length': 8, 'Default Priority': 6, 'SPNs': {
+        110: {'start_byte': 0, 'start_bit': 0, 'length_bits': 8, 'scale': 1, 'offset': -40,
+              'min_value': -40, 'max_value': 210},
+    }},
+}
+
+
+@pytest.fixture
+def transmitter():
+    transmitter = Transmitter(J1939)
+    transmitter.register_tx_PGN(pgn=61444, priority=3, source_address=0, tx_rate_ms=10)
+    transmitter.register_tx_PGN(pgn=65262, priority=6, source_address=0, tx_rate_ms=1000)
+    yield transmitter
+    transmitter.shutdown()
+
+
+def values(transmitter, pgn):
+    can_id_key = transmitter.J1939_CAN_IDs[(pgn, 0)]
+    return transmitter.tx_CAN_IDs[can_id_key][_DATA]
+
+
+def test_generators_are_encoded_and_packed(transmitter):
+    transmitter.modify_pgn_data(61444, 513, 200)  # not driven by a generator
+    signal_generator = SignalGenerator(J1939, transmitter)
+    signal_generator.add(61444, 190, generators.ramp(start=0, stop=1000, period_s=10))
+    signal_generator.add(61444, 899, generators.steps(values=[3, 5, 7], dwell_s=1))
+    signal_generator.add(65262, 110, generators.table(times_s=[0, 2, 4], values=[-40, 0, 100]))
+
+    signal_generator.tick(2.5)
+    data = values(transmitter, 61444)
+    assert int.from_bytes(data[3:5], 'little') == 250 / 0.125
+    assert data[0] & 0x0F == 7
+    assert data[2] == 200
+    assert values(transmitter, 65262)[0] == 25 + 40
+
+    signal_generator.tick(3.0)
+    assert values(transmitter, 61444)[0] & 0x0F == 3
+    assert values(transmitter, 65262)[0] == 50 + 40
+
+
+def test_values_are_clamped_to_the_spn_range(transmitter):
+    signal_generator = SignalGenerator(J1939, transmitter)
+    signal_generator.add(61444, 190, generators.sine(mean=5000, amplitude=5000, period_s=4))
+    signal_generator.add(65262, 110, generators.square(low=-100, high=500, period_s=1))
+    signal_generator.tick(1.0)
+    assert int.from_bytes(values(transmitter, 61444)[3:5], 'little') == 8031.875 / 0.125
+    assert values(transmitter, 65262)[0] == 250
+    signal_generator.tick(1.75)
+    assert values(transmitter, 65262)[0] == 0
+
+
+def test_random_walk_stays_within_range(transmitter):
+    signal_generator = SignalGenerator(J1939, transmitter, seed=1)
+    signal_generator.add(65262, 110, generators.random_walk(start=200, step_std=50))
+    seen = set()
+    for tick in range(200):
+        signal_generator.tick(tick / 100)
+        seen.add(values(transmitter, 65262)[0])
+    assert len(seen) > 10 and max(seen) <= 250
+
+
+def test_thousands_of_spns_per_tick():
+    n_pgns = 700
+    spec = {pgn: {'PGN Data Length': 8, 'Default Priority': 6, 'SPNs': {
+        pgn * 10 + i: {'start_byte': i, 'start_bit': 0, 'length_bits': 8, 'scale': 0.5, 'offset': -10,
+                       'min_value': -10, 'max_value': 117.5} for i in range(8)}} for pgn in range(n_pgns)}
+    transmitter = Transmitter(spec)
+    signal_generator = SignalGenerator(spec, transmitter)
+    for pgn, pgn_spec in spec.items():
+        transmitter.register_tx_PGN(pgn=pgn, priority=6, source_address=0, tx_rate_ms=1000)
+        for spn in pgn_spec['SPNs']:
+            signal_generator.add(pgn, spn, generators.sine(mean=50, amplitude=60, period_s=1 + spn % 7))
+    try:
+        signal_generator.tick(0)
+        started = time.perf_counter()
+        for tick in range(1, 21):
+            signal_generator.tick(tick / 100)
+        # 5600 SPNs, well within a 100 Hz tick
+        assert (time.perf_counter() - started) / 20 < 0.01
+    finally:
+        transmitter.shutdown()
+
+
+def test_background_ticks(transmitter):
+    signal_generator = SignalGenerator(J1939, transmitter, rate_hz=200)
+    signal_generator.add(65262, 110, generators.ramp(start=-40, stop=210, period_s=0.5))
+    signal_generator.start()
+    time.sleep(0.1)
+    signal_generator.stop()
+    assert signal_generator.ticks + signal_generator.missed >= 15
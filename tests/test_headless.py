@@ -0,0 +1,90 @@
+import csv
+import subprocess
+import sys
+import tomllib
+
+import can
+import pytest
+
+from akrocansim import J1939DA, specstore
+from akrocansim.config import Config, default_config_toml
+from akrocansim.rules import Rules
+from akrocansim.headless import HeadlessSimulator
+
+
+IMPORT_TIME_BUDGET_SEC = 0.5
+
+J1939 = {
+    61444: {'PGN Data Length': 8, 'Default Priority': 3, 'transmission_rate_ms': 10, 'SPNs': {
+        190: {'start_byte': 3, 'start_bit': 0, 'length_bits': 16, 'scale': 0.125, 'offset': 0},
+    }},
+}
+
+
+@pytest.fixture
+def config_dir(tmp_path):
+    (tmp_path / 'J1939DA').mkdir()
+    (tmp_path / 'J1939DA' / 'J1939DA_TEST.xlsx').touch()
+    config_toml = default_config_toml.replace("filename = 'J1939DA_??????.xlsx'", "filename = 'J1939DA_TEST.xlsx'")
+    config_toml = config_toml.replace('#61444 = [513, 190]\n', '61444 = [190]\n', 1)
+    config_toml = config_toml.replace("interface='pcan'\nchannel='PCAN_USBBUS1'",
+                                      "interface='virtual'\nchannel='test_headless'")
+    (tmp_path / 'config.toml').write_text(config_toml, encoding='utf-8')
+    # J1939DA.sqlite is up to date with the workbook and [J1939DA]
+    specstore.write(tmp_path / 'J1939DA' / 'J1939DA.sqlite', J1939, meta={'cache_key': J1939DA.cache_key(
+        J1939DA_config=tomllib.loads(config_toml)['J1939DA'], J1939DA_dir=tmp_path / 'J1939DA', rules=Rules())})
+    return tmp_path
+
+
+def test_headless_import_budget():
+    code = ('import sys, time\n'
+            't = time.perf_counter()\n'
+            'import akrocansim.headless\n'
+            'print(time.perf_counter() - t)\n'
+            "print(' '.join(m for m in ('dearpygui', 'openpyxl') if m in sys.modules))\n")
+    import_time, heavy_modules = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True,
+                                                check=True).stdout.split('\n')[:2]
+    assert heavy_modules == ''
+    assert float(import_time) < IMPORT_TIME_BUDGET_SEC
+
+
+def test_headless_simulator_transmits_configured_pgns(config_dir):
+    simulator = HeadlessSimulator(Config(config_dir))
+    rx_bus = can.Bus(interface='virtual', channel='test_headless')
+    try:
+        messages = simulator.start()
+        assert not [msg for msg in messages if msg.startswith('ERROR')]
+        msg = rx_bus.recv(0.5)
+        assert msg is not None and msg.arbitration_id == 0x0CF00400
+    finally:
+        simulator.stop()
+        rx_bus.shutdown()
+
+
+def test_headless_main(config_dir):
+    telemetry_csv = config_dir / 'telemetry.csv'
+    result = subprocess.run([sys.executable, '-m', 'akrocansim', '--headless', '--config', str(config_dir),
+                             '--duration', '0.2', '--telemetry-csv', str(telemetry_csv)],
+                            capture_output=True, text=True, timeout=30)
+    assert result.returncode == 0, result.stdout + result.stderr
+    with telemetry_csv.open(encoding='utf-8') as f:
+        rows = list(csv.DictReader(f))
+    assert rows[0]['PGN'] == '61444' and int(rows[0]['frames sent']) > 5
+
+
+def test_headless_main_fails_without_configuration(tmp_path):
+    result = subprocess.run([sys.executable, '-m', 'akrocansim', '--headless', '--config', str(tmp_path),
+                             '--duration', '0'], capture_output=True, text=True, timeout=30)
+    assert result.returncode == 1
+    assert 'configuration file created' in result.stdout
+
+
+def test_headless_main_runs_scenarios(config_dir):
+    scenario = config_dir / 'scenario.py'
+    scenario.write_text('async def scenario(sim):\n'
+                        '    await sim.ramp(61444, 190, to=1000, duration_s=0.1, start=0)\n'
+                        '    assert sim.get(61444, 190) == 1000\n', encoding='utf-8')
+    result = subprocess.run([sys.executable, '-m', 'akrocansim', '--headless', '--config', str(config_dir),
+                             '--scenario', str(scenario)], capture_output=True, text=True, timeout=30)
+    assert result.returncode == 0, result.stdout + result.stderr
+    assert 'INFO: scenario scenario completed' in result.stdout
@@ -1,4 +1,4 @@
-from .. src.akrocansim.protocols.protocols import decode, encode
+from akrocansim.signaltools import decode, encode
 
 
 def test_decode():
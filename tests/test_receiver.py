@@ -0,0 +1,82 @@
+import time
+
+import can
+import pytest
+
+from akrocansim.receiver import Receiver
+from akrocansim.transmitter import Transmitter
+
+
+J1939 = {
+    65262: {'PGN Data Length': 8, 'Default Priority': 6, 'SPNs': {
+        110: {'start_byte': 0, 'start_bit': 0, 'length_bits': 8},
+    }},
+}
+
+
+@pytest.fixture
+def buses():
+    sim_bus = can.Bus(interface='virtual', channel='test_receiver')
+    tester_bus = can.Bus(interface='virtual', channel='test_receiver')
+    yield sim_bus, tester_bus
+    sim_bus.shutdown()
+    tester_bus.shutdown()
+
+
+@pytest.fixture
+def receiver(buses):
+    transmitter = Transmitter(J1939)
+    transmitter.bus = buses[0]
+    transmitter.register_tx_PGN(pgn=65262, priority=6, source_address=0, tx_rate_ms=1000)
+    transmitter.modify_pgn_data(65262, 110, 0x5A)
+    receiver = Receiver(transmitter)
+    receiver.start(buses[0])
+    yield receiver
+    receiver.stop()
+    transmitter.shutdown()
+
+
+def request(pgn, *, destination_address, source_address=0xF9):
+    return can.Message(arbitration_id=0x18EA0000 | destination_address << 8 | source_address, is_extended_id=True,
+                       data=pgn.to_bytes(3, 'little'))
+
+
+def recv(bus, timeout=0.5):
+    msg = bus.recv(timeout)
+    assert msg is not None
+    return msg
+
+
+def test_global_request_is_answered_with_current_data(receiver, buses):
+    buses[1].send(request(65262, destination_address=0xFF))
+    response = recv(buses[1])
+    assert response.arbitration_id == 0x18FEEE00
+    assert response.data[0] == 0x5A
+
+    time.sleep(0.01)
+    telemetry = receiver.telemetry()
+    assert telemetry['requests received'] == 1 and telemetry['responses sent'] == 1
+    assert telemetry['latency max us'] is not None
+
+
+def test_destination_specific_request_of_unsupported_pgn_is_nacked(receiver, buses):
+    buses[1].send(request(65263, destination_address=0x00))
+    nack = recv(buses[1])
+    assert nack.arbitration_id == 0x18E8FF00
+    assert bytes(nack.data) == bytes([1, 0xFF, 0xFF, 0xFF, 0xF9]) + (65263).to_bytes(3, 'little')
+
+
+def test_requests_to_other_nodes_are_ignored(receiver, buses):
+    buses[1].send(request(65262, destination_address=0x17))
+    buses[1].send(request(65263, destination_address=0xFF))
+    assert buses[1].recv(0.1) is None
+    # the request to 0x17 is dropped by the acceptance filters, the global one is not answered
+    assert receiver.telemetry()['requests received'] == 1 and receiver.telemetry()['NACKs sent'] == 0
+
+
+def test_listeners_see_received_frames(receiver, buses):
+    reader = can.BufferedReader()
+    receiver.listeners.append(reader)
+    buses[1].send(request(65263, destination_address=0xFF))
+    msg = reader.get_message(0.5)
+    assert msg is not None and msg.arbitration_id == 0x18EAFFF9
@@ -0,0 +1,79 @@
+import time
+
+import can
+import pytest
+
+from akrocansim.receiver import Receiver
+from akrocansim.recorder import Recorder
+from akrocansim.transmitter import Transmitter
+
+
+J1939 = {
+    65262: {'PGN Data Length': 8, 'Default Priority': 6, 'SPNs': {
+        110: {'start_byte': 0, 'start_bit': 0, 'length_bits': 8},
+    }},
+}
+
+
+@pytest.fixture
+def buses():
+    sim_bus = can.Bus(interface='virtual', channel='test_recorder')
+    tester_bus = can.Bus(interface='virtual', channel='test_recorder')
+    yield sim_bus, tester_bus
+    sim_bus.shutdown()
+    tester_bus.shutdown()
+
+
+def frame(i):
+    return can.Message(arbitration_id=0x18FEEE00, is_extended_id=True, data=bytes([i % 256] * 8))
+
+
+@pytest.mark.parametrize('suffix', ['.blf', '.asc', '.csv'])
+def test_record_sent_and_received_frames(buses, tmp_path, suffix):
+    transmitter = Transmitter(J1939)
+    transmitter.bus = buses[0]
+    transmitter.register_tx_PGN(pgn=65262, priority=6, source_address=0, tx_rate_ms=10)
+    receiver = Receiver(transmitter, acceptance_filters=False)
+    receiver.start(buses[0])
+    recorder = Recorder(tmp_path / f'rec{suffix}')
+    recorder.start()
+    transmitter.tx_listeners.append(recorder.record_tx)
+    receiver.listeners.append(recorder)
+
+    transmitter.set_tx_mode_continuous()
+    buses[1].send(can.Message(arbitration_id=0x18FEF100, is_extended_id=True, data=bytes(8)))
+    time.sleep(0.1)
+    transmitter.shutdown()
+    receiver.stop()
+    recorder.stop()
+
+    frames = list(can.LogReader(tmp_path / f'rec{suffix}'))
+    tx_frames = [msg for msg in frames if msg.arbitration_id == 0x18FEEE00]
+    assert len(frames) == recorder.frames_written and recorder.frames_dropped == 0
+    assert len(tx_frames) >= 5
+    assert any(msg.arbitration_id == 0x18FEF100 for msg in frames)
+    if suffix != '.csv':  # the CSV format has no direction column
+        assert not any(msg.is_rx for msg in tx_frames)
+    assert all(t1.timestamp >= t0.timestamp for t0, t1 in zip(tx_frames, tx_frames[1:]))
+
+
+def test_frames_are_dropped_when_the_queue_is_full(tmp_path):
+    recorder = Recorder(tmp_path / 'rec.asc', max_queue=5)
+    for i in range(12):
+        recorder.record_tx(frame(i))
+    assert recorder.telemetry()['frames dropped'] == 7
+    recorder.start()
+    recorder.stop()
+    assert recorder.telemetry()['frames written'] == 5
+    assert [msg.data[0] for msg in can.LogReader(tmp_path / 'rec.asc')] == [0, 1, 2, 3, 4]
+
+
+def test_rotation_by_size(tmp_path):
+    recorder = Recorder(tmp_path / 'rec.csv', rotate_mb=0.001)
+    recorder.start()
+    for i in range(100):
+        recorder.record_tx(frame(i))
+    recorder.stop()
+    assert len(recorder.files) > 2
+    assert recorder.files[0].name == 'rec_000.csv'
+    assert sum(len(list(can.LogReader(path))) for path in recorder.files) == 100
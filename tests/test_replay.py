@@ -0,0 +1,91 @@
+import threading
+import time
+
+import can
+import pytest
+
+from akrocansim.replay import Replay
+
+
+J1939 = {
+    61444: {'PGN Data Length': 8, 'Default Priority': 3, 'SPNs': {
+        190: {'start_byte': 3, 'start_bit': 0, 'length_bits': 16},
+    }},
+}
+
+
+@pytest.fixture
+def buses():
+    tx_bus = can.Bus(interface='virtual', channel='test_replay')
+    rx_bus = can.Bus(interface='virtual', channel='test_replay')
+    yield tx_bus, rx_bus
+    tx_bus.shutdown()
+    rx_bus.shutdown()
+
+
+@pytest.fixture(params=['log.asc', 'log.blf', 'log.log'])
+def log_file(request, tmp_path):
+    """100 frames, 2 ms apart, alternating EEC1 from source addresses 0 and 1 and a standard 11-bit frame."""
+    path = tmp_path / request.param
+    with can.Logger(path) as logger:
+        for i in range(100):
+            if i % 3 == 2:
+                msg = can.Message(timestamp=1000 + i * 0.002, arbitration_id=0x123, is_extended_id=False,
+                                  data=bytes([i]))
+            else:
+                msg = can.Message(timestamp=1000 + i * 0.002, arbitration_id=0x0CF00400 | i % 3,
+                                  is_extended_id=True, data=bytes([i] * 8))
+            logger.on_message_received(msg)
+    return path
+
+
+def receive_all(bus, timeout=0.1):
+    frames = []
+    while (msg := bus.recv(timeout)) is not None:
+        frames.append(msg)
+    return frames
+
+
+def test_replay_real_time(log_file, buses):
+    replay = Replay(log_file)
+    replay.run(buses[0])
+    frames = receive_all(buses[1])
+    assert len(frames) == 100
+    assert frames[0].arbitration_id == 0x0CF00400 and frames[2].arbitration_id == 0x123
+    telemetry = replay.telemetry()
+    assert telemetry['frames sent'] == 100
+    assert 0.19 < telemetry['elapsed s'] < 0.5
+    assert telemetry['pacing error p50 ms'] < 5
+
+
+def test_replay_as_fast_as_possible_with_filters(log_file, buses):
+    replay = Replay(log_file, speed=0, pgns=[61444], source_addresses=[1])
+    replay.run(buses[0])
+    frames = receive_all(buses[1])
+    assert {msg.arbitration_id for msg in frames} == {0x0CF00401}
+    assert len(frames) == 33
+    telemetry = replay.telemetry()
+    assert telemetry['frames read'] == 100 and telemetry['frames filtered'] == 67
+    assert telemetry['elapsed s'] < 0.19 and telemetry['pacing error p50 ms'] is None
+
+
+def test_spn_overrides(log_file, buses):
+    replay = Replay(log_file, speed=0, J1939=J1939)
+    replay.override(61444, 190, 0xABCD, source_address=1)
+    replay.run(buses[0])
+    frames = [msg for msg in receive_all(buses[1]) if msg.is_extended_id]
+    assert all(msg.data[3:5] == (bytearray([0xCD, 0xAB]) if msg.arbitration_id & 0xFF == 1
+                                 else bytearray([msg.data[0]] * 2)) for msg in frames)
+    with pytest.raises(KeyError):
+        replay.override(61444, 999, 0)
+
+
+def test_stop(log_file, buses):
+    replay = Replay(log_file, speed=0.1)
+    thread = threading.Thread(target=replay.run, args=(buses[0],))
+    thread.start()
+    time.sleep(0.05)
+    replay.stop()
+    thread.join(1)
+    assert not thread.is_alive()
+    assert replay.frames_sent < 100
@@ -0,0 +1,70 @@
+from collections import Counter
+
+import pytest
+
+from akrocansim.rules import Rules
+
+
+def test_bundled_rules():
+    rules = Rules()
+    assert rules.files[-1].name == 'J1939DA_rules.toml'
+    assert rules.normalize('Transmission Rate', '100 ms') == 100
+    assert rules.normalize('Transmission Rate', 'On request') == 5000
+    assert rules.normalize('Transmission Rate', '15 ms') == 15  # not in the exact texts
+    assert rules.normalize('Transmission Rate', 'Every 2.5 s and on change') == 2500
+    assert rules.normalize('Transmission Rate', 'Unknown') is None
+    assert rules.normalize('Transmission Rate', '0 ms') is None  # rejected by Transmitter.register_tx_PGN
+    assert rules.normalize('Transmission Rate', 'Every 0.0 s') is None
+    assert rules.normalize('Transmission Rate', '0.5 s') == 500 and rules.normalize('Transmission Rate', '05 ms') == 5
+    assert rules.normalize('Transmission Rate', ' 100 ms ') == 100  # exact, once stripped
+    assert rules.normalize('Transmission Rate', None) is None
+    assert rules.normalize('SPN Position in PGN', '4-5') == (3, 0)
+    assert rules.normalize('SPN Position in PGN', '1 ') == (0, 0)
+    assert rules.normalize('SPN Position in PGN', ' 1.5 ') == (0, 4)
+    assert rules.normalize('SPN Position in PGN', '1.7') == (0, 6)
+    assert rules.normalize('SPN Position in PGN', '2.4-4') == (1, 3)
+    assert rules.normalize('SPN Position in PGN', 'x1') == (None, None)  # not a number
+    assert rules.normalize('Operational Range', '0 % to 100 %') == (0, 100)
+    assert rules.normalize('Operational Range', '0 to 64,255.5 rpm') == (0, 64255.5)
+    assert rules.normalize('Operational Range', 'Up to 63 Characters') == (None, None)
+    assert rules.normalize('Operational Range', 'Not a range') == (None, None)
+
+
+def test_user_rules(tmp_path):
+    user_rules = tmp_path / 'J1939DA_rules.toml'
+    assert Rules(user_rules).files == Rules().files  # optional
+    user_rules.write_text('''
+['Transmission Rate']
+exact = {'100 ms' = 20}
+patterns = [{name = 'minutes', regex = '(\\d+) min', value = '$1', scale = 60000}]
+''', encoding='utf-8')
+    rules = Rules(user_rules)
+    assert rules.sha256 != Rules().sha256
+    assert rules.normalize('Transmission Rate', '100 ms') == 20 and rules.normalize('Transmission Rate', '50 ms') == 50
+    assert rules.normalize('Transmission Rate', '2 min') == 120000
+
+    rules.count({'Transmission Rate': Counter({'100 ms': 3, '2 min': 1, '5 ms': 2, 'Often': 4, None: 1}),
+                 'Operational Range': Counter({'0 to 5': 7})})
+    assert rules.hits == {('Transmission Rate', 'exact'): 3, ('Transmission Rate', 'minutes'): 1,
+                          ('Transmission Rate', 'N ms'): 2, ('Operational Range', 'min to max'): 7}
+    assert rules.unmatched == {('Transmission Rate', 'Often'): 4}
+    assert rules.report() == [
+        'INFO: Transmission Rate rules - rows matched: 3 exact, 2 N ms, 1 minutes, unmatched: 4',
+        "WARNING: no Transmission Rate rule for 'Often' (4 rows)",
+        'INFO: SPN Position in PGN rules - rows matched: none, unmatched: 0',
+        'INFO: Operational Range rules - rows matched: 7 min to max, unmatched: 0',
+    ]
+
+
+@pytest.mark.parametrize('content, error', [
+    ("['Resolution']\nexact = {}\n", 'is not one of the fields'),
+    ("['Units']\n", 'is not one of the fields'),
+    ("['Transmission Rate']\nbogus = 1\n", 'unknown keys'),
+    ("['Transmission Rate']\npatterns = [{regex = '('}]\n", 'must have the keys'),
+    ("['Transmission Rate']\npatterns = [{regex = '(', value = 1}]\n", 'missing \\)'),
+    ("['Transmission Rate'\n", 'Expected'),
+])
+def test_invalid_rules(tmp_path, content, error):
+    (tmp_path / 'J1939DA_rules.toml').write_text(content, encoding='utf-8')
+    with pytest.raises(ValueError, match=error):
+        Rules(tmp_path / 'J1939DA_rules.toml')
@@ -0,0 +1,122 @@
+import asyncio
+import time
+
+import can
+import pytest
+
+from akrocansim.receiver import Receiver
+from akrocansim.scenario import Simulation, load_scenarios, run_scenarios
+from akrocansim.transmitter import Transmitter
+
+
+J1939 = {
+    61444: {'PGN Data Length': 8, 'Default Priority': 3, 'SPNs': {
+        190: {'start_byte': 3, 'start_bit': 0, 'length_bits': 16, 'scale': 0.125, 'offset': 0},
+        899: {'start_byte': 0, 'start_bit': 0, 'length_bits': 4, 'scale': 'ENUM', 'offset': 0},
+    }},
+    65262: {'PGN Data Length': 8, 'Default Priority': 6, 'SPNs': {
+        110: {'start_byte': 0, 'start_bit': 0, 'length_bits': 8, 'scale': 1, 'offset': -40},
+    }},
+}
+
+
+@pytest.fixture
+def transmitter():
+    transmitter = Transmitter(J1939)
+    transmitter.register_tx_PGN(pgn=61444, priority=3, source_address=0, tx_rate_ms=10)
+    transmitter.register_tx_PGN(pgn=65262, priority=6, source_address=0, tx_rate_ms=10)
+    yield transmitter
+    transmitter.shutdown()
+
+
+def test_set_and_ramp(transmitter):
+    sim = Simulation(J1939, transmitter)
+
+    async def scenario():
+        await sim.set(61444, 190, 1500)
+        await sim.set(61444, 899, 3)
+        await sim.set(65262, 110, 500)  # clamped to the field
+        assert sim.get(65262, 110) == 215
+        await sim.ramp(65262, 110, to=110, duration_s=0.2, start=10)
+        return sim.time()
+
+    elapsed = asyncio.run(scenario())
+    assert transmitter.get_raw_value(61444, 190) == 12000
+    assert sim.get(61444, 190) == 1500 and sim.get(61444, 899) == 3
+    assert sim.get(65262, 110) == 110
+    assert 0.2 <= elapsed < 0.25
+
+
+def test_hundreds_of_concurrent_scenarios(transmitter):
+    sim = Simulation(J1939, transmitter)
+    woke = []
+
+    async def scenario(i):
+        for step in range(1, 11):
+            await sim.wait_until(0.01 * step + i / 10000)
+        woke.append(sim.time() - 0.1 - i / 10000)
+
+    async def main():
+        await asyncio.gather(*(scenario(i) for i in range(300)))
+
+    started = time.monotonic()
+    asyncio.run(main())
+    assert len(woke) == 300
+    assert time.monotonic() - started < 0.3
+    telemetry = sim.telemetry()
+    assert telemetry['waits'] == 3000
+    assert telemetry['lateness p50 ms'] < 2
+
+
+def test_wait_for_frame():
+    sim_bus = can.Bus(interface='virtual', channel='test_scenario')
+    tester_bus = can.Bus(interface='virtual', channel='test_scenario')
+    transmitter = Transmitter(J1939)
+    receiver = Receiver(transmitter, acceptance_filters=False)
+    receiver.start(sim_bus)
+    sim = Simulation(J1939, transmitter, receiver)
+
+    async def scenario():
+        asyncio.get_running_loop().call_later(0.05, tester_bus.send, can.Message(
+            arbitration_id=0x18FECA17, is_extended_id=True, data=bytes([0x04, 0xFF, 1, 2, 3, 4, 0xFF, 0xFF])))
+        msg = await sim.wait_for_frame(pgn=65226, source_address=0x17, predicate=lambda msg: msg.data[0] == 0x04,
+                                       timeout=1)
+        with pytest.raises(asyncio.TimeoutError):
+            await sim.wait_for_frame(pgn=65226, timeout=0.05)
+        return msg
+
+    try:
+        msg = asyncio.run(scenario())
+        assert msg.arbitration_id == 0x18FECA17
+        assert sim._waiters == []
+    finally:
+        receiver.stop()
+        transmitter.shutdown()
+        sim_bus.shutdown()
+        tester_bus.shutdown()
+
+
+def test_load_and_run_scenarios(transmitter, tmp_path):
+    path = tmp_path / 'engine.py'
+    path.write_text('''
+async def scenario(sim):
+    await sim.set(61444, 190, 800)
+    await sim.wait(0.01)
+
+async def scenario_fails(sim):
+    await sim.set(61444, 12345, 0)
+
+def scenario_not_a_coroutine(sim):
+    pass
+''', encoding='utf-8')
+    scenarios = load_scenarios(path)
+    assert [scenario.__name__ for scenario in scenarios] == ['scenario', 'scenario_fails']
+    sim = Simulation(J1939, transmitter)
+    messages = asyncio.run(run_scenarios(sim, scenarios))
+    assert messages[0] == 'INFO: scenario scenario completed'
+    assert messages[1] == 'ERROR: scenario scenario_fails failed - KeyError: 12345'
+    assert sim.get(61444, 190) == 800
+
+    (tmp_path / 'empty.py').write_text('x = 1\n', encoding='utf-8')
+    with pytest.raises(ValueError):
+        load_scenarios(tmp_path / 'empty.py')
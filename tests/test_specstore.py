@@ -0,0 +1,54 @@
+import pickle
+
+import pytest
+
+from akrocansim.codec import PGNCodec
+from akrocansim.specstore import SpecStore, read_meta, write
+
+
+J1939 = {
+    61444: {'Parameter Group Label': 'Electronic Engine Controller 1', 'Acronym': 'EEC1',
+            'PGN Description': 'Engine related parameters', 'PGN Data Length': 8, 'Default Priority': 3,
+            'transmission_rate_ms': 20, 'SPNs': {
+                190: {'SPN Name': 'Engine Speed', 'SPN Description': 'Actual engine speed',
+                      'start_byte': 3, 'start_bit': 0, 'length_bits': 16, 'scale': 0.125, 'offset': 0},
+                899: {'SPN Name': 'Engine Torque Mode', 'SPN Description': None, 'start_byte': 0, 'start_bit': 0,
+                      'length_bits': 4, 'scale': 'ENUM', 'offset': '',
+                      'discrete_values': {0: 'Low idle', 1: 'High idle'}},
+            }},
+    65262: {'PGN Data Length': 8, 'Default Priority': 6, 'SPNs': {110: {}}},
+    None: {'SPNs': {None: {}}},
+}
+
+
+def test_spec_store(tmp_path):
+    write(tmp_path / 'J1939DA.sqlite', J1939)
+    write(tmp_path / 'J1939DA.sqlite', J1939, meta={'cache_key': {'version': '1.0', 'J1939DA': {'last_row': None}}})
+    assert read_meta(tmp_path / 'J1939DA.sqlite') == {'cache_key': {'version': '1.0', 'J1939DA': {'last_row': None}}}
+    write(tmp_path / 'J1939DA.sqlite', J1939)  # replaced
+    assert read_meta(tmp_path / 'J1939DA.sqlite') == {} and read_meta(tmp_path / 'missing.sqlite') == {}
+    store = SpecStore(tmp_path / 'J1939DA.sqlite')
+    assert list(store) == [61444, 65262, None] and len(store) == 3
+    assert 65262 in store and 12345 not in store and store.loaded_PGNs == []
+
+    eec1 = store[61444]
+    assert store.loaded_PGNs == [61444] and store[61444] is eec1
+    assert eec1['Acronym'] == 'EEC1' and eec1['PGN Description'] == 'Engine related parameters'
+    assert 'Transmission Rate' not in eec1 and list(eec1['SPNs']) == [190, 899]
+    assert eec1['SPNs'][899]['discrete_values'] == {0: 'Low idle', 1: 'High idle'}
+    assert eec1['SPNs'][899]['SPN Description'] is None
+    assert list(PGNCodec(eec1).fields) == [190, 899]
+    assert dict(store[65262]) == {'PGN Data Length': 8, 'Default Priority': 6, 'SPNs': {110: {}}}
+    assert store == J1939
+    with pytest.raises(KeyError):
+        store[12345]
+    with pytest.raises(KeyError):
+        eec1['SPNs'][190]['discrete_values']
+
+    copy = pickle.loads(pickle.dumps(eec1))  # as sent to transmitter engine processes
+    assert type(copy) is dict and type(copy['SPNs'][190]) is dict and copy == J1939[61444]
+
+    with pytest.raises(FileNotFoundError):
+        SpecStore(tmp_path / 'missing.sqlite')
+    with pytest.raises(ValueError, match='unknown'):
+        write(tmp_path / 'bad.sqlite', {1: {'SPNs': {2: {'bogus': 1}}}})
@@ -0,0 +1,316 @@
+import threading
+import time
+
+import can
+import pytest
+from can.broadcastmanager import ThreadBasedCyclicSendTask
+from can.interfaces.virtual import VirtualBus
+
+from akrocansim.telemetry import TxStats
+from akrocansim.transmitter import Transmitter, driver_periodic_supported
+
+
+J1939 = {
+    61444: {'PGN Data Length': 8, 'Default Priority': 3, 'SPNs': {
+        190: {'start_byte': 3, 'start_bit': 0, 'length_bits': 16},
+        899: {'start_byte': 0, 'start_bit': 0, 'length_bits': 4},
+    }},
+    65262: {'PGN Data Length': 8, 'Default Priority': 6, 'SPNs': {
+        110: {'start_byte': 0, 'start_bit': 0, 'length_bits': 8},
+    }},
+}
+
+
+@pytest.fixture
+def buses():
+    tx_bus = can.Bus(interface='virtual', channel='test_transmitter')
+    rx_bus = can.Bus(interface='virtual', channel='test_transmitter')
+    yield tx_bus, rx_bus
+    tx_bus.shutdown()
+    rx_bus.shutdown()
+
+
+@pytest.fixture
+def transmitter(buses):
+    transmitter = Transmitter(J1939)
+    transmitter.bus = buses[0]
+    transmitter.register_tx_PGN(pgn=61444, priority=3, source_address=0, tx_rate_ms=10)
+    transmitter.register_tx_PGN(pgn=65262, priority=6, source_address=0, tx_rate_ms=20)
+    yield transmitter
+    transmitter.shutdown()
+
+
+def receive_all(bus, duration):
+    frames = []
+    end = time.monotonic() + duration
+    while (timeout := end - time.monotonic()) > 0:
+        msg = bus.recv(timeout)
+        if msg is not None:
+            frames.append(msg)
+    return frames
+
+
+def test_global_tx_modes(transmitter, buses):
+    assert receive_all(buses[1], 0.1) == []
+
+    transmitter.set_tx_mode_continuous()
+    frames = receive_all(buses[1], 0.2)
+    ids = [msg.arbitration_id for msg in frames]
+    assert 10 <= ids.count(0x0CF00400) <= 25
+    assert 5 <= ids.count(0x18FEEE00) <= 13
+
+    transmitter.set_tx_mode_stop()
+    receive_all(buses[1], 0.05)
+    assert receive_all(buses[1], 0.1) == []
+
+
+def test_tx_once_and_per_pgn_mode(transmitter, buses):
+    transmitter.set_tx_once(65262)
+    frames = receive_all(buses[1], 0.15)
+    assert [msg.arbitration_id for msg in frames] == [0x18FEEE00]
+
+    transmitter.set_tx_mode_per_PGN()
+    transmitter.set_tx_mode_continuous(61444)
+    frames = receive_all(buses[1], 0.1)
+    assert frames and {msg.arbitration_id for msg in frames} == {0x0CF00400}
+
+
+def test_modify_pgn_tx_rate(transmitter, buses):
+    transmitter.modify_pgn_tx_rate(65262, 50000)
+    transmitter.set_tx_mode_continuous(65262)
+    assert receive_all(buses[1], 0.1) == []
+
+    transmitter.modify_pgn_tx_rate(65262, 10)
+    frames = receive_all(buses[1], 0.2)
+    assert len(frames) >= 10
+
+    with pytest.raises(ValueError, match='greater than 0'):
+        transmitter.modify_pgn_tx_rate(65262, 0)
+    with pytest.raises(ValueError):
+        transmitter.register_tx_PGN(pgn=65262, priority=6, source_address=1, tx_rate_ms=-10)
+    assert transmitter.get_tx_rate_ms(65262) == 10
+
+
+def test_send_error_does_not_stop_the_scheduler(transmitter, buses):
+    def listener(msg):
+        if msg.arbitration_id == 0x0CF00400:
+            raise RuntimeError('listener failure')
+
+    transmitter.tx_listeners.append(listener)
+    transmitter.set_tx_mode_continuous()
+    frames = receive_all(buses[1], 0.2)
+    assert [msg.arbitration_id for msg in frames].count(0x18FEEE00) >= 5  # still served
+    telemetry = {row['PGN']: row for row in transmitter.telemetry()}
+    assert telemetry[61444]['CAN errors'] >= 10 and telemetry[65262]['CAN errors'] == 0
+    assert transmitter.pop_messages() == ['ERROR: tx of CAN ID 0CF00400 - RuntimeError: listener failure']
+    assert transmitter.pop_messages() == []
+
+
+def test_register_after_shutdown(transmitter, buses):
+    transmitter.set_tx_mode_continuous()
+    transmitter.shutdown()
+    receive_all(buses[1], 0.05)
+    assert receive_all(buses[1], 0.1) == []  # registered PGNs are no longer transmitted
+
+    transmitter.register_tx_PGN(pgn=65262, priority=6, source_address=0, tx_rate_ms=10)
+    ids = [msg.arbitration_id for msg in receive_all(buses[1], 0.2)]
+    assert ids.count(0x18FEEE00) >= 10 and 0x0CF00400 not in ids
+
+
+def test_modify_pgn_data(transmitter, buses):
+    transmitter.modify_pgn_data(61444, 190, 0x1234)
+    transmitter.modify_pgn_data(61444, 899, 0x5)
+    transmitter.set_tx_once(61444)
+    frames = receive_all(buses[1], 0.05)
+    assert bytes(frames[0].data) == bytes([0x05, 0, 0, 0x34, 0x12, 0, 0, 0])
+
+
+def test_telemetry(transmitter, buses, tmp_path):
+    transmitter.set_tx_mode_continuous(61444)
+    frames = receive_all(buses[1], 0.5)
+    transmitter.set_tx_mode_stop(61444)
+    frames += receive_all(buses[1], 0.05)
+
+    telemetry = {row['PGN']: row for row in transmitter.telemetry()}
+    assert telemetry[61444]['CAN ID'] == '0CF00400'
+    assert telemetry[61444]['frames sent'] == len(frames)
+    assert telemetry[61444]['achieved period ms'] == pytest.approx(10, abs=1)
+    assert telemetry[61444]['CAN errors'] == 0
+    assert telemetry[65262]['frames sent'] == 0
+
+    telemetry_csv = tmp_path / 'Tx_telemetry.csv'
+    transmitter.dump_telemetry_csv(telemetry_csv)
+    lines = telemetry_csv.read_text().splitlines()
+    assert lines[0].startswith('CAN ID,PGN,SA,nominal period ms,tx backend,frames sent')
+    assert len(lines) == 3
+
+
+def test_tx_stats():
+    stats = TxStats()
+    assert stats.snapshot()['achieved period ms'] is None and stats.snapshot()['jitter p50 ms'] is None
+    sent = 0.0
+    for n in range(1001):  # jitter 0.1 ms, except 20 periods of 5 ms
+        sent += 0.0101 if n % 50 else 0.015
+        stats.record_sent(sent, 0.01)
+    snapshot = stats.snapshot()
+    assert snapshot['frames sent'] == 1001
+    assert snapshot['achieved period ms'] == pytest.approx(10.198, abs=0.001)
+    assert (snapshot['period min ms'], snapshot['period max ms']) == (pytest.approx(10.1), pytest.approx(15))
+    assert snapshot['period std ms'] == pytest.approx(0.686, abs=0.001)
+    assert 0.1 <= snapshot['jitter p50 ms'] < 0.13 and 0.1 <= snapshot['jitter p95 ms'] < 0.13
+    assert 5 <= snapshot['jitter p99 ms'] < 6.3 and snapshot['jitter max ms'] == pytest.approx(5)
+
+    stats.restart()
+    assert stats.snapshot()['jitter max ms'] is None and stats.snapshot()['frames sent'] == 1001
+
+
+class DriverPeriodicBus(VirtualBus):
+    """Stand-in for an interface whose driver implements cyclic transmission."""
+    def _send_periodic_internal(self, msgs, period, duration=None, modifier_callback=None):
+        return ThreadBasedCyclicSendTask(self, threading.Lock(), msgs, period, duration)
+
+
+def test_driver_tx_backend(buses):
+    assert not driver_periodic_supported(buses[0])
+    driver_bus = DriverPeriodicBus(channel='test_transmitter')
+    assert driver_periodic_supported(driver_bus)
+
+    transmitter = Transmitter(J1939, tx_backend='driver')
+    transmitter.register_tx_PGN(pgn=61444, priority=3, source_address=0, tx_rate_ms=10)
+    transmitter.bus = driver_bus
+    try:
+        transmitter.set_tx_mode_continuous(61444)
+        transmitter.modify_pgn_data(61444, 190, 0x1234)
+        receive_all(buses[1], 0.05)
+        frames = receive_all(buses[1], 0.1)
+        assert len(frames) >= 5
+        assert bytes(frames[-1].data) == bytes([0, 0, 0, 0x34, 0x12, 0, 0, 0])
+        assert transmitter.telemetry()[0]['tx backend'] == 'driver'
+        assert transmitter.telemetry()[0]['frames sent'] == 0
+
+        transmitter.set_tx_mode_stop(61444)
+        receive_all(buses[1], 0.05)
+        assert receive_all(buses[1], 0.1) == []
+        assert transmitter.telemetry()[0]['tx backend'] == 'software'
+    finally:
+        transmitter.shutdown()
+        driver_bus.shutdown()
+
+
+def test_set_values_publishes_whole_frames(transmitter, buses):
+    transmitter.modify_pgn_tx_rate(61444, 1)
+    transmitter.set_tx_mode_continuous(61444)
+
+    stop = threading.Event()
+
+    def writer():
+        value = 0
+        while not stop.is_set():
+            value = (value + 1) % 16
+            transmitter.set_values({61444: {899: value, 190: value * 0x1111}, 65262: {110: value}})
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    frames = receive_all(buses[1], 0.3)
+    stop.set()
+    thread.join()
+
+    assert len(frames) > 20
+    for msg in frames:
+        value = msg.data[0]
+        assert int.from_bytes(msg.data[3:5], 'little') == value * 0x1111
+
+
+def test_failed_set_values_changes_nothing(transmitter, buses):
+    with pytest.raises(KeyError):
+        transmitter.set_values({61444: {190: 0x1234, 12345: 1}})
+    with pytest.raises(KeyError):
+        transmitter.set_values({65262: {110: 1}, 12345: {1: 1}})
+    with pytest.raises(KeyError):
+        transmitter.set_bits({65262: (0xFF, 1), 12345: (0xFF, 1)})
+    transmitter.set_values({61444: {899: 1}})  # unrelated update of the same PGN
+    assert transmitter.get_raw_value(61444, 190) == 0 and transmitter.get_raw_value(65262, 110) == 0
+    transmitter.set_tx_once(61444)
+    frames = receive_all(buses[1], 0.05)
+    assert bytes(frames[0].data) == bytes([1, 0, 0, 0, 0, 0, 0, 0])
+
+
+def test_same_pgn_from_several_source_addresses(transmitter, buses):
+    transmitter.register_tx_PGN(pgn=61444, priority=3, source_address=1, tx_rate_ms=10)
+    transmitter.set_values({(61444, 0): {190: 0x1111}, (61444, 1): {190: 0x2222}})
+    transmitter.set_tx_once(61444, source_address=1)
+    transmitter.set_tx_once(61444)
+    frames = {msg.arbitration_id: msg for msg in receive_all(buses[1], 0.05)}
+    assert frames[0x0CF00400].data[3:5] == bytearray([0x11, 0x11])
+    assert frames[0x0CF00401].data[3:5] == bytearray([0x22, 0x22])
+    assert {(row['PGN'], row['SA']) for row in transmitter.telemetry()} == {(61444, 0), (61444, 1), (65262, 0)}
+
+
+def test_variable_length_pgn_is_sent_with_bam(transmitter, buses):
+    transmitter.transport.bam_packet_gap_sec = 0
+    transmitter.set_pgn_payload(65262, bytes(range(12)))
+    transmitter.set_tx_once(65262)
+    frames = receive_all(buses[1], 0.1)
+    assert [msg.arbitration_id for msg in frames] == [0x1CECFF00, 0x1CEBFF00, 0x1CEBFF00]
+    assert bytes(frames[0].data) == bytes([32, 12, 0, 2, 0xFF]) + (65262).to_bytes(3, 'little')
+    assert transmitter.telemetry()[1]['frames sent'] == 1
+
+    with pytest.raises(ValueError, match='at most 1785 bytes'):
+        transmitter.set_pgn_payload(65262, bytes(2000))
+    assert transmitter.get_raw_value(65262, 110) == 0  # the 12 byte payload is kept
+
+
+def test_phase_stagger(buses):
+    transmitter = Transmitter(J1939)
+    transmitter.bus = buses[0]
+    try:
+        for source_address in range(4):
+            transmitter.register_tx_PGN(pgn=61444, priority=3, source_address=source_address, tx_rate_ms=100)
+        transmitter.set_tx_mode_continuous()
+        frames = receive_all(buses[1], 0.45)
+    finally:
+        transmitter.shutdown()
+    # first slots at 50, 25, 75 and 12.5 ms: one frame every 25 ms rather than 4 frames at once
+    assert [msg.arbitration_id & 0xFF for msg in frames[:4]] == [3, 1, 0, 2]
+    gaps = [b.timestamp - a.timestamp for a, b in zip(frames, frames[1:])]
+    assert min(gaps) > 0.002  # without stagger, the 4 frames of a period are sent within microseconds
+
+
+def test_bus_load_ceiling(buses):
+    transmitter = Transmitter(J1939, max_bus_load_pct=10)
+    transmitter.bus = buses[0]
+    try:
+        transmitter.register_tx_PGN(pgn=61444, priority=3, source_address=0, tx_rate_ms=1)
+        assert transmitter.expected_bus_load() is None
+        assert transmitter.expected_bus_load(250000) == pytest.approx(64)  # 160 bits per ms
+        transmitter.bitrate = 250000  # ceiling: 25 kbit/s, 156 frames/s
+        transmitter.set_tx_mode_continuous()
+        frames = receive_all(buses[1], 0.3)
+        transmitter.set_tx_mode_stop()
+        telemetry = transmitter.telemetry()[0]
+    finally:
+        transmitter.shutdown()
+    assert 30 <= len(frames) <= 60
+    assert telemetry['shaped'] > 0 and telemetry['missed'] > 0
+
+
+def test_bus_load_ceiling_does_not_block_the_scheduler(buses):
+    transmitter = Transmitter(J1939, max_bus_load_pct=10, tp_bam_packet_gap_ms=0)
+    transmitter.bus = buses[0]
+    try:
+        transmitter.register_tx_PGN(pgn=61444, priority=3, source_address=0, tx_rate_ms=10)
+        transmitter.register_tx_PGN(pgn=65262, priority=6, source_address=0, tx_rate_ms=10)
+        transmitter.set_pgn_payload(65262, bytes(12))  # transport protocol sessions are not shaped
+        transmitter.bitrate = 250000
+        transmitter._shaper.tokens = -transmitter._shaper.rate * 0.3  # the next frame is delayed by 300 ms
+        transmitter.set_tx_mode_continuous()
+        ids = [msg.arbitration_id for msg in receive_all(buses[1], 0.2)]
+        assert 0x0CF00400 not in ids  # waiting for the bus load ceiling
+        assert ids.count(0x1CECFF00) >= 10  # BAM sessions keep being started meanwhile
+        ids = [msg.arbitration_id for msg in receive_all(buses[1], 0.3)]
+        transmitter.set_tx_mode_stop()
+        telemetry = {row['PGN']: row for row in transmitter.telemetry()}
+    finally:
+        transmitter.shutdown()
+    assert 0x0CF00400 in ids
+    assert telemetry[61444]['shaped'] > 0 and telemetry[61444]['late'] > 0 and telemetry[65262]['shaped'] == 0
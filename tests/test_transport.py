@@ -0,0 +1,138 @@
+import time
+
+import can
+import pytest
+
+from akrocansim.transport import TransportProtocol
+
+
+@pytest.fixture
+def buses():
+    tx_bus = can.Bus(interface='virtual', channel='test_transport')
+    rx_bus = can.Bus(interface='virtual', channel='test_transport')
+    yield tx_bus, rx_bus
+    tx_bus.shutdown()
+    rx_bus.shutdown()
+
+
+@pytest.fixture
+def transport(buses):
+    transport = TransportProtocol(bam_packet_gap_ms=0, cmdt_packet_gap_ms=0)
+    transport.bus = buses[0]
+    notifier = can.Notifier(buses[0], [transport], timeout=0.05)
+    yield transport
+    notifier.stop()
+    transport.shutdown()
+
+
+def recv(bus, timeout=0.5):
+    msg = bus.recv(timeout)
+    assert msg is not None
+    return msg
+
+
+def reassemble(dt_frames, size):
+    return b''.join(bytes(msg.data[1:]) for msg in sorted(dt_frames, key=lambda msg: msg.data[0]))[:size]
+
+
+def test_bam(transport, buses):
+    transport.bam_packet_gap_sec = 0.005
+    payload = bytes(range(20))
+    assert transport.send(pgn=65226, data=payload, source_address=0x00)
+    assert not transport.send(pgn=65226, data=payload, source_address=0x00)  # still in transfer
+
+    bam = recv(buses[1])
+    assert bam.arbitration_id == 0x1CECFF00
+    assert bytes(bam.data) == bytes([32, 20, 0, 3, 0xFF]) + (65226).to_bytes(3, 'little')
+
+    dt_frames = [recv(buses[1]) for _ in range(3)]
+    assert {msg.arbitration_id for msg in dt_frames} == {0x1CEBFF00}
+    assert [msg.data[0] for msg in dt_frames] == [1, 2, 3]
+    assert dt_frames[-1].data[7] == 0xFF
+    assert reassemble(dt_frames, 20) == payload
+
+    time.sleep(0.01)
+    stats = transport.telemetry()[0]
+    assert stats['SA'] == 0
+    assert stats['sessions completed'] == 1 and stats['sessions skipped'] == 1
+    assert stats['packets sent'] == 3 and stats['bytes sent'] == 20
+
+
+def test_concurrent_bam_sessions_of_a_source_address_are_serialised(transport, buses):
+    transport.bam_packet_gap_sec = 0.005
+    transport.send(pgn=65226, data=bytes(10), source_address=0x00)
+    transport.send(pgn=65260, data=bytes(17), source_address=0x00)
+    transport.send(pgn=65260, data=bytes(17), source_address=0x01)
+
+    frames = [recv(buses[1]) for _ in range(3 + 4 + 4)]
+    sa_0 = [msg for msg in frames if msg.arbitration_id & 0xFF == 0x00]
+    # the second BAM of SA 0 is announced only after the last packet of the first one
+    assert [msg.data[0] for msg in sa_0] == [32, 1, 2, 32, 1, 2, 3]
+
+
+def test_cmdt(transport, buses):
+    payload = bytes(range(100, 125))
+    transport.send(pgn=65259, data=payload, source_address=0x00, destination_address=0xF9)
+
+    rts = recv(buses[1])
+    assert rts.arbitration_id == 0x1CECF900
+    assert bytes(rts.data[:4]) == bytes([16, 25, 0, 4])
+
+    def cm_from_peer(data):
+        buses[1].send(can.Message(arbitration_id=0x1CEC00F9, data=bytes(data) + (65259).to_bytes(3, 'little')))
+
+    cm_from_peer([17, 2, 1, 0xFF, 0xFF])  # CTS packets 1-2
+    dt_frames = [recv(buses[1]) for _ in range(2)]
+    assert {msg.arbitration_id for msg in dt_frames} == {0x1CEBF900}
+    assert buses[1].recv(0.05) is None  # waits for the next CTS
+
+    cm_from_peer([17, 5, 3, 0xFF, 0xFF])  # CTS packets 3-4
+    dt_frames += [recv(buses[1]) for _ in range(2)]
+    assert reassemble(dt_frames, 25) == payload
+
+    cm_from_peer([19, 25, 0, 4, 0xFF])  # EndOfMsgAck
+    time.sleep(0.01)
+    assert transport.telemetry()[0]['sessions completed'] == 1
+
+
+def test_cmdt_timeout(transport, buses, monkeypatch):
+    monkeypatch.setattr('akrocansim.transport._T3_SEC', 0.05)
+    transport.send(pgn=65259, data=bytes(9), source_address=0x00, destination_address=0xF9)
+    recv(buses[1])  # RTS
+    abort = recv(buses[1])
+    assert abort.arbitration_id == 0x1CECF900
+    assert bytes(abort.data[:2]) == bytes([255, 3])
+    assert transport.telemetry()[0]['sessions aborted'] == 1
+
+
+def test_payload_length():
+    with pytest.raises(ValueError):
+        TransportProtocol().send(pgn=65226, data=bytes(8), source_address=0)
+
+
+def test_send_after_shutdown(transport, buses):
+    transport.bam_packet_gap_sec = 0.5
+    assert transport.send(pgn=65226, data=bytes(20), source_address=0x00)
+    assert recv(buses[1]).data[0] == 32  # BAM
+    transport.shutdown()
+    assert buses[1].recv(0.1) is None  # queued packets dropped
+
+    transport.bam_packet_gap_sec = 0
+    assert transport.send(pgn=65226, data=bytes(20), source_address=0x00)
+    assert [recv(buses[1]).data[0] for _ in range(4)] == [32, 1, 2, 3]
+
+
+def test_listener_error_does_not_stop_the_sessions(transport, buses):
+    def listener(msg):
+        if msg.data[0] == 2:
+            raise RuntimeError('listener failure')
+
+    transport.tx_listeners.append(listener)
+    assert transport.send(pgn=65226, data=bytes(20), source_address=0x00)
+    assert [recv(buses[1]).data[0] for _ in range(4)] == [32, 1, 2, 3]
+    assert transport.send(pgn=65227, data=bytes(9), source_address=0x00)
+    assert [recv(buses[1]).data[0] for _ in range(3)] == [32, 1, 2]
+    time.sleep(0.01)
+    stats = transport.telemetry()[0]
+    assert stats['errors'] == 2 and stats['sessions completed'] == 2
+    assert list(transport.messages) == ['ERROR: transport protocol tx of SA 0 - RuntimeError: listener failure']
@@ -0,0 +1,100 @@
+import time
+
+import can
+import pytest
+
+from akrocansim.txprocess import TransmitterProcess
+
+
+J1939 = {
+    61444: {'PGN Data Length': 8, 'Default Priority': 3, 'SPNs': {
+        190: {'start_byte': 3, 'start_bit': 0, 'length_bits': 16, 'scale': 0.125, 'offset': 0},
+    }},
+    65262: {'PGN Data Length': 8, 'Default Priority': 6, 'SPNs': {
+        110: {'start_byte': 0, 'start_bit': 0, 'length_bits': 8, 'scale': 1, 'offset': -40},
+    }},
+}
+
+
+@pytest.fixture(scope='module')
+def tx_process():
+    tx_process = TransmitterProcess(J1939, receiver_options={'acceptance_filters': False})
+    tx_process.register_tx_PGN(pgn=61444, priority=3, source_address=0, tx_rate_ms=10)
+    tx_process.register_tx_PGN(pgn=65262, priority=6, source_address=0, tx_rate_ms=10)
+    tx_process.register_tx_PGN(pgn=61444, priority=3, source_address=1, tx_rate_ms=10)
+    yield tx_process
+    tx_process.shutdown()
+    assert not tx_process._process.is_alive()
+
+
+def test_updates_are_batched(tx_process):
+    batches_sent = tx_process.batches_sent
+    for raw_value in range(1000):
+        tx_process.modify_pgn_data(61444, 190, raw_value)
+    tx_process.set_values({(61444, 1): {190: 7}, 65262: {110: 80}})
+    assert tx_process.get_raw_value(61444, 190) == 999
+    assert tx_process.get_raw_value(61444, 190, source_address=1) == 7
+    assert tx_process.get_raw_value(65262, 110) == 80
+    assert tx_process.batches_sent - batches_sent < 100
+
+    tx_process.modify_pgn_data(65262, 110, 81)
+    time.sleep(0.1)  # sent by the flusher thread
+    assert tx_process._pending == {}
+    assert tx_process.get_raw_value(65262, 110) == 81
+
+
+def test_errors(tx_process):
+    with pytest.raises(KeyError):
+        tx_process.modify_pgn_data(65262, 190, 1)
+    with pytest.raises(KeyError):
+        tx_process.modify_pgn_data(61444, 190, 1, source_address=2)
+    with pytest.raises(KeyError):  # raised in the engine process
+        tx_process.modify_pgn_tx_rate(65265, 100)
+    assert tx_process.connect({'interface': 'no_such_interface'}).startswith('ERROR')
+
+
+def test_batch_errors_are_raised_by_the_next_command(tx_process):
+    tx_process.modify_pgn_data(65262, 110, 'not an integer')  # rejected by the engine process
+    time.sleep(0.1)  # sent by the flusher thread
+    with pytest.raises(TypeError):
+        tx_process.get_raw_value(65262, 110)
+    tx_process.modify_pgn_data(65262, 110, 82)
+    time.sleep(0.1)  # the flusher thread still sends batches
+    assert tx_process._pending == {}
+    assert tx_process.get_raw_value(65262, 110) == 82
+
+
+def test_transmission_and_recording(tx_process, tmp_path):
+    message = tx_process.connect({'interface': 'virtual', 'channel': 'test_txprocess', 'bitrate': 250000})
+    assert message.startswith('INFO: connected to:')
+    assert tx_process.source_addresses() == [0, 1]
+    recording = tmp_path / 'rec.csv'
+    tx_process.start_recording(recording, max_queue=1000)
+    assert tx_process.recorder_telemetry()['file'] == str(recording)
+    tx_process.modify_pgn_data(61444, 190, 12000)
+    tx_process.set_tx_mode_continuous(61444)
+    tx_process.set_tx_mode_per_PGN()
+    time.sleep(0.2)
+    tx_process.set_tx_mode_stop(61444)
+    recorder_telemetry = tx_process.stop_recording()
+    assert tx_process.stop_recording() is None
+    assert tx_process.disconnect() == 'INFO: Virtual bus channel test_txprocess disconnected'
+
+    frames_sent = {row['PGN']: row['frames sent'] for row in tx_process.telemetry() if row['SA'] == 0}
+    assert frames_sent[61444] > 5 and frames_sent[65262] == 0
+    assert tx_process.receiver_telemetry()['requests received'] == 0
+    assert tx_process.transport_telemetry() == []
+    assert recorder_telemetry['frames written'] >= frames_sent[61444]
+    frames = list(can.LogReader(recording))
+    assert frames and all(msg.arbitration_id == 0x0CF00400 and msg.data[3:5] == bytes([0xE0, 0x2E]) for msg in frames)
+
+
+def test_shutdown_with_a_failing_batch():
+    tx_process = TransmitterProcess(J1939, batch_ms=1000)
+    tx_process.register_tx_PGN(pgn=65262, priority=6, source_address=0, tx_rate_ms=10)
+    tx_process.modify_pgn_data(65262, 110, 'not an integer')  # pending, sent by shutdown()
+    with pytest.raises(TypeError):
+        tx_process.shutdown()
+    tx_process._flusher.join(2)  # ends after its batch_ms wait
+    assert not tx_process._process.is_alive() and not tx_process._flusher.is_alive()
+    tx_process.shutdown()  # already shut down